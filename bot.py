@@ -1,10 +1,12 @@
 import discord
 from discord.ext import commands
-import asyncio
-import os
-import mysql.connector
+import time
 from dotenv import load_dotenv
 from config import ADMIN_USER_ID, GUILD_ID
+from database import Database
+from services.notifier import AdminNotifier
+from services.event_metrics import EventMetrics
+import migrations
 
 # .envファイルを読み込む
 load_dotenv()
@@ -13,6 +15,7 @@ load_dotenv()
 COGS = [
     "cogs.filter",
     "cogs.mass_mute",
+    "cogs.metrics",
     "cogs.survey",
     "cogs.voice_keeper"
 ]
@@ -26,10 +29,48 @@ class MyBot(commands.Bot):
         intents.voice_states = True #20260120:寝落ち切断機能
         super().__init__(command_prefix='!', intents=intents)
 
+        # 全Cogで共有するDB接続プール（setup_hook で接続）
+        self.db = Database()
+        # 管理者へのDM通知（送信はバックグラウンド。setup_hook で開始）
+        self.notifier = AdminNotifier(self, int(ADMIN_USER_ID) if ADMIN_USER_ID.isdigit() else None)
+        # イベント処理の計測と、Cog が登録する事前フィルタ（/metrics で確認）
+        self.metrics = EventMetrics()
+
+    def dispatch(self, event_name, /, *args, **kwargs):
+        self.metrics.events[event_name] += 1
+        super().dispatch(event_name, *args, **kwargs)
+
+    def _schedule_event(self, coro, event_name, *args, **kwargs):
+        """
+        リスナーの実行をタスクにする（discord.py の実装を置き換え）。
+        事前フィルタで弾いたイベントはコルーチンもタスクも作らず、それ以外は処理時間を計測する。
+        非公開メソッドなので discord.py は requirements.txt で固定し、
+        更新で引数や呼ばれ方が変わったら tests/test_event_scheduling.py が落ちるようにしている。
+        """
+        if not self.metrics.accepts(coro, event_name, args):
+            return None
+        return self.loop.create_task(
+            self.metrics.run_timed(self._run_event, time.perf_counter(), coro, event_name, *args, **kwargs),
+            name=f'discord.py: {event_name}',
+        )
+
     async def setup_hook(self):
         """
         Bot起動時に一度だけ実行される初期化処理。
         """
+        # Cogの cog_load で使えるよう、先にDBプールを作成してスキーマを最新にしておく
+        try:
+            await self.db.connect()
+            print("✅ Database connection pool created.")
+            applied = await migrations.migrate(self.db)
+            if applied:
+                print(f"✅ Applied schema migrations: {applied}")
+        except Exception as e:
+            print(f"❌ Failed to initialize database: {e}")
+
+        self.notifier.start()
+        self.metrics.start()
+
         for cog_name in COGS:
             try:
                 await self.load_extension(cog_name)
@@ -56,15 +97,12 @@ class MyBot(commands.Bot):
             except Exception as e:
                 print(f"Failed to global sync: {e}")
 
-    # --- 追加: DB接続用メソッド ---
-    def get_db_connection(self):
-        """MySQLへの接続オブジェクトを返す"""
-        return mysql.connector.connect(
-            host=os.getenv('DB_HOST'),
-            database=os.getenv('DB_NAME'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASS')
-        )
+    async def close(self):
+        """Bot停止時に未送信の通知を送り、Cogをアンロードしてから DBプールを閉じる"""
+        await self.notifier.stop()
+        await self.metrics.stop()
+        await super().close()
+        await self.db.close()
 
 # Botインスタンスの作成
 bot = MyBot()
@@ -92,39 +130,21 @@ async def on_ready():
     print('-------------------------------------')
     
     # --- DB接続テスト (起動時に一度だけ確認) ---
-    try:
-        conn = bot.get_db_connection()
-        if conn.is_connected():
-            print("✅ Database connection successful!")
-            conn.close()
-    except Exception as e:
-        print(f"❌ Database connection failed: {e}")
+    if await bot.db.ping():
+        print("✅ Database connection successful!")
+    else:
+        print("❌ Database connection failed.")
 
     # --- 1. 起動/再接続DMを管理者へ送信 ---
-    owner = None
-    try:
-        owner_id_int = int(ADMIN_USER_ID)
-        owner = await bot.fetch_user(owner_id_int) 
-    except Exception as e:
-        print(f"Error fetching owner user: {e}")
+    status = "再起動/再接続" if bot.is_ready() else "起動完了"
+    embed = discord.Embed(
+        title=f"Bot {status}",
+        description=f"Bot **{bot.user.name}** がオンラインになりました。",
+        color=0x4caf50 
+    )
+    bot.notifier.send('system', embed=embed)
 
-    if owner:
-        try:
-            status = "再起動/再接続" if bot.is_ready() else "起動完了"
-            embed = discord.Embed(
-                title=f"Bot {status}",
-                description=f"Bot **{bot.user.name}** がオンラインになりました。",
-                color=0x4caf50 
-            )
-            await owner.send(embed=embed)
-        except Exception as e:
-            print(f"Failed to send status DM to owner: {e}")
-    
-    # --- 2. mass_mute の実行 ---
-    if 'cogs.mass_mute' in bot.extensions:
-        mass_mute_cog = bot.get_cog("MassMuteCog")
-        if mass_mute_cog:
-            asyncio.create_task(mass_mute_cog.execute_mute_logic("Startup/Reconnected"))
+    # --- 2. 通知抑制の確認は MassMuteCog が起動時に1回だけ行う（再接続のたびには行わない）
 
 
 if __name__ == '__main__':
@@ -0,0 +1,5 @@
+from discord.ext import commands
+from .main import FilterCog
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(FilterCog(bot))
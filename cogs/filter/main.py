@@ -0,0 +1,226 @@
+import os
+import asyncio
+import importlib
+import aiomysql
+import discord
+from discord import app_commands
+from discord.ext import commands
+import config
+from config import CODE_CHANNEL_ID, ADMIN_USER_ID
+from typing import Dict, List, Optional, Set
+
+from .rules import RuleEngine, RuleSpec, spec_from_row, specs_from_config
+from .services import BurstGuard, DeletionPipeline
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+class FilterCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        # IDをconfigから文字列として取得し、整数に変換
+        self.code_channel_id = self._get_id_int(CODE_CHANNEL_ID, "CODE_CHANNEL_ID")
+        self.owner_id = self._get_id_int(ADMIN_USER_ID, "ADMIN_USER_ID")
+
+        # 削除はチャンネルごとに短時間まとめて一括削除する
+        self.pipeline = DeletionPipeline(window=_env_float("FILTER_DELETE_WINDOW", 1.0))
+
+        # 違反が集中したら一時的にスローモード -> 送信禁止へ段階的に切り替える
+        self.guard = BurstGuard(
+            per=_env_float("FILTER_BURST_WINDOW", 10),
+            slowmode_threshold=int(_env_float("FILTER_SLOWMODE_THRESHOLD", 10)),
+            lock_threshold=int(_env_float("FILTER_LOCK_THRESHOLD", 30)),
+        )
+        self.slowmode_seconds = int(_env_float("FILTER_SLOWMODE_SECONDS", 30))
+        self.escalation_cooldown = _env_float("FILTER_ESCALATION_COOLDOWN", 300)
+        self._restore: Dict[int, Dict] = {}             # channel_id -> 変更前のスローモード・権限
+        self._restore_tasks: Dict[int, asyncio.Task] = {}
+        self._escalations: Set[asyncio.Task] = set()    # 実行中の _escalate（参照を持たないと途中で回収される）
+
+        # チャンネルごとのルール（cog_load と /filter reload で読み込む）
+        self.engine = RuleEngine()
+
+    async def cog_load(self):
+        await self.reload_rules()
+        # ルールのないチャンネル・Botの発言はタスクを作る前に捨てる
+        self.bot.metrics.add_prefilter(
+            self.on_message, lambda message: not message.author.bot and self.engine.handles(message.channel.id)
+        )
+
+    async def cog_unload(self):
+        self.bot.metrics.remove_prefilters(self)
+        await self.pipeline.flush_all()
+        for task in self._restore_tasks.values():
+            task.cancel()
+        for task in self._escalations:
+            task.cancel()
+        # 制限をかけている途中のタスクが止まってから元に戻す
+        await asyncio.gather(*self._escalations, return_exceptions=True)
+        for channel_id in list(self._restore):
+            channel = self.bot.get_channel(channel_id)
+            if channel:
+                await self._restore_channel(channel)
+
+    def _get_id_int(self, id_str: str, name: str) -> Optional[int]:
+        """設定ファイルから読み込んだID文字列を整数に変換するヘルパー"""
+        try:
+            return int(id_str)
+        except ValueError:
+            print(f"[INIT FATAL] Config Error: {name} '{id_str}' is not a valid integer string. Check config.py.")
+            return None
+
+    # --- ルールの読み込み ---
+    async def _load_specs(self) -> List[RuleSpec]:
+        """config.py の FILTER_RULES（未設定なら CODE_CHANNEL_ID の添付必須）と filter_rules テーブルを合わせる"""
+        importlib.reload(config)
+        rules = getattr(config, 'FILTER_RULES', None)
+        if rules is None and self.code_channel_id is not None:
+            rules = {self.code_channel_id: [{"type": "require_attachment"}]}
+        specs = specs_from_config(rules)
+
+        try:
+            async with self.bot.db.acquire() as conn:
+                async with conn.cursor(aiomysql.DictCursor) as cur:
+                    await cur.execute("SELECT channel_id, rule_type, params FROM filter_rules WHERE enabled = 1")
+                    rows = await cur.fetchall()
+            specs.extend(s for s in map(spec_from_row, rows) if s is not None)
+        except Exception as e:
+            print(f"[FILTER ERROR] Failed to load rules from DB: {e}")
+        return specs
+
+    async def reload_rules(self) -> List[str]:
+        errors = self.engine.load(await self._load_specs())
+        print(f"[Filter] Rules loaded for {self.engine.channel_count} channel(s), errors={len(errors)}")
+        return errors
+
+    # --- /filter コマンド（管理者のみ） ---
+    filter_group = app_commands.Group(name="filter", description="メッセージフィルタの管理")
+
+    @filter_group.command(name="reload", description="【管理者】フィルタルールを再読み込みします")
+    async def cmd_reload(self, interaction: discord.Interaction):
+        if interaction.user.id != self.owner_id:
+            await interaction.response.send_message("このコマンドは管理者のみ実行できます。", ephemeral=True)
+            return
+        errors = await self.reload_rules()
+        msg = f"✅ {self.engine.channel_count} チャンネル分のルールを読み込みました。"
+        if errors:
+            msg += "\n⚠️ 読み込めなかったルール:\n" + "\n".join(errors[:10])
+        await interaction.response.send_message(msg, ephemeral=True)
+
+    @filter_group.command(name="stats", description="【管理者】ルールごとの評価時間と違反数を表示します")
+    async def cmd_stats(self, interaction: discord.Interaction):
+        if interaction.user.id != self.owner_id:
+            await interaction.response.send_message("このコマンドは管理者のみ実行できます。", ephemeral=True)
+            return
+        lines = [
+            f"<#{r['channel_id']}> `{r['rule']}` 評価 {r['calls']} 回 / 違反 {r['hits']} 件 / 平均 {r['avg_us']}µs / 最大 {r['max_us']}µs"
+            for r in self.engine.stats()
+        ]
+        d = self.pipeline.stats()
+        lines.append(f"削除: {d['deleted']} 件（API呼び出し {d['api_calls']} 回、失敗 {d['failed']} 件）")
+        await interaction.response.send_message("\n".join(lines)[:2000], ephemeral=True)
+
+    # --- DM送信ヘルパー ---
+    def _send_dm_log(self, channel: discord.abc.GuildChannel, line: str):
+        """
+        削除の通知を bot.notifier に積む（送信は待たない）。
+        同じチャンネルの通知は一定時間まとめて1通にする。
+        """
+        if self.owner_id is None:
+            return
+        self.bot.notifier.notify(
+            'filter',
+            f"⚠️ メッセージ削除警告 #{channel.name}",
+            line,
+            key=channel.id,
+        )
+
+    # ----------------------------------------------------
+    # イベント: メッセージ受信時のフィルタリング処理
+    # ----------------------------------------------------
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        
+        # 1. フィルタリング不要なメッセージを無視（ルールのないチャンネルは辞書引き1回で終わる）
+        if message.author.bot:
+            return 
+
+        # 2. チャンネルのルールで評価
+        violation = self.engine.evaluate(message)
+        if violation is not None:
+            # 削除はパイプラインに積むだけ（まとめて一括削除される）
+            self.pipeline.submit(message)
+
+            # DMでの警告を管理者へ送信
+            self._send_dm_log(message.channel, f"送信者: {message.author.name}（{violation.reason}）")
+
+            level = self.guard.record(message.channel.id)
+            if level:
+                task = asyncio.create_task(self._escalate(message.channel, level))
+                self._escalations.add(task)
+                task.add_done_callback(self._escalation_done)
+
+    # ----------------------------------------------------
+    # 違反集中時の一時的な制限
+    # ----------------------------------------------------
+    async def _escalate(self, channel: discord.TextChannel, level: str):
+        everyone = channel.guild.default_role
+        # 元に戻すため、最初の段階に入る前の状態を覚えておく
+        self._restore.setdefault(channel.id, {
+            'slowmode': channel.slowmode_delay,
+            'overwrite': channel.overwrites_for(everyone),
+        })
+        try:
+            if level == 'slowmode':
+                await channel.edit(slowmode_delay=self.slowmode_seconds, reason="FilterCog: 違反の集中")
+            else:
+                overwrite = channel.overwrites_for(everyone)
+                overwrite.send_messages = False
+                await channel.set_permissions(everyone, overwrite=overwrite, reason="FilterCog: 違反の集中")
+        except discord.Forbidden:
+            print(f"[FILTER ERROR] Bot lacks permission to restrict #{channel.name}.")
+            return
+        except Exception as e:
+            print(f"[FILTER ERROR] Failed to restrict #{channel.name}: {e}")
+            return
+
+        action = f"スローモード {self.slowmode_seconds} 秒" if level == 'slowmode' else "送信禁止"
+        self.bot.notifier.send('filter', embed=discord.Embed(
+            title=f"🚨 違反が集中しています #{channel.name}",
+            description=f"一時的に **{action}** に切り替えました（{int(self.escalation_cooldown)} 秒後に自動解除）。",
+            color=0xf44336,
+        ))
+
+        # 段階が上がったら解除までの時間を延長する
+        old = self._restore_tasks.pop(channel.id, None)
+        if old is not None:
+            old.cancel()
+        self._restore_tasks[channel.id] = asyncio.create_task(self._restore_later(channel))
+
+    def _escalation_done(self, task: asyncio.Task):
+        self._escalations.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[FILTER ERROR] Escalation failed: {task.exception()!r}")
+
+    async def _restore_later(self, channel: discord.TextChannel):
+        await asyncio.sleep(self.escalation_cooldown)
+        self._restore_tasks.pop(channel.id, None)
+        await self._restore_channel(channel)
+
+    async def _restore_channel(self, channel: discord.TextChannel):
+        original = self._restore.pop(channel.id, None)
+        self.guard.reset(channel.id)
+        if original is None:
+            return
+        try:
+            if channel.slowmode_delay != original['slowmode']:
+                await channel.edit(slowmode_delay=original['slowmode'], reason="FilterCog: 制限の自動解除")
+            everyone = channel.guild.default_role
+            if channel.overwrites_for(everyone) != original['overwrite']:
+                overwrite = None if original['overwrite'].is_empty() else original['overwrite']
+                await channel.set_permissions(everyone, overwrite=overwrite, reason="FilterCog: 制限の自動解除")
+        except Exception as e:
+            print(f"[FILTER ERROR] Failed to restore #{channel.name}: {e}")
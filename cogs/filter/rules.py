@@ -0,0 +1,352 @@
+"""
+FilterCog のルールエンジン
+- ルールは config.py の FILTER_RULES と DB の filter_rules テーブルから読み込む
+- channel_id -> RuleChain の辞書に組み立てて差し替える（ホットリロード）
+- チャンネル内の正規表現ルールは1つの選択（a|b|c）にまとめて1回で照合する
+  （後方参照・インラインフラグ・名前付きグループを含むパターンは番号やフラグが変わるので単独で照合する）
+- ルールごとの評価回数・時間・違反数を記録する
+
+ルールの書式（config.py の例）:
+    FILTER_RULES = {
+        "123456789012345678": [
+            {"type": "require_attachment"},
+            {"type": "attachment_types", "extensions": ["py", "txt"], "mime_types": ["image/*"]},
+            {"type": "regex", "pattern": "discord\\.gg/", "name": "invite", "reason": "招待リンク", "ignore_case": True},
+            {"type": "max_length", "max_chars": 1500},
+            {"type": "link_allowlist", "domains": ["github.com", "pastebin.com"]},
+        ],
+    }
+"""
+
+import re
+import json
+import time
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+URL_RE = re.compile(r"https?://([^/\s:?#]+)", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class RuleSpec:
+    """読み込んだ1ルール（まだコンパイルしていないもの）"""
+    channel_id: int
+    kind: str
+    params: Dict[str, Any]
+    source: str = "config"  # config / db
+
+
+@dataclass
+class Violation:
+    rule: str
+    reason: str
+
+
+@dataclass
+class RuleStats:
+    calls: int = 0
+    hits: int = 0
+    total_ns: int = 0
+    max_ns: int = 0
+
+    def record(self, elapsed_ns: int, hit: bool) -> None:
+        self.calls += 1
+        self.total_ns += elapsed_ns
+        self.max_ns = max(self.max_ns, elapsed_ns)
+        if hit:
+            self.hits += 1
+
+
+# ------------------------------------------------------------------
+#  ルール
+# ------------------------------------------------------------------
+class Rule:
+    name = "rule"
+
+    def __init__(self):
+        self.stats = RuleStats()
+
+    def check(self, message) -> Optional[Violation]:
+        raise NotImplementedError
+
+
+class RequireAttachment(Rule):
+    name = "require_attachment"
+
+    def check(self, message) -> Optional[Violation]:
+        if not message.attachments:
+            return Violation(self.name, "添付ファイルなし")
+        return None
+
+
+class AttachmentTypes(Rule):
+    name = "attachment_types"
+
+    def __init__(self, extensions: Iterable[str] = (), mime_types: Iterable[str] = ()):
+        super().__init__()
+        self.extensions = {e.lower().lstrip('.') for e in extensions}
+        self.mime_exact = {m.lower() for m in mime_types if not m.endswith('/*')}
+        self.mime_prefix = tuple(m.lower()[:-1] for m in mime_types if m.endswith('/*'))
+
+    def _allowed(self, attachment) -> bool:
+        ext = attachment.filename.rsplit('.', 1)[-1].lower() if '.' in attachment.filename else ''
+        if ext in self.extensions:
+            return True
+        ctype = (attachment.content_type or '').split(';')[0].strip().lower()
+        if not ctype:
+            return False
+        return ctype in self.mime_exact or any(ctype.startswith(p) for p in self.mime_prefix)
+
+    def check(self, message) -> Optional[Violation]:
+        for a in message.attachments:
+            if not self._allowed(a):
+                return Violation(self.name, f"許可されていない形式の添付ファイル（{a.filename}）")
+        return None
+
+
+class MaxLength(Rule):
+    name = "max_length"
+
+    def __init__(self, max_chars: int):
+        super().__init__()
+        self.max_chars = int(max_chars)
+
+    def check(self, message) -> Optional[Violation]:
+        if len(message.content) > self.max_chars:
+            return Violation(self.name, f"{self.max_chars} 文字を超えるメッセージ")
+        return None
+
+
+class LinkAllowlist(Rule):
+    name = "link_allowlist"
+
+    def __init__(self, domains: Iterable[str]):
+        super().__init__()
+        self.domains = tuple(d.lower().lstrip('.') for d in domains)
+
+    def _allowed(self, host: str) -> bool:
+        host = host.lower()
+        return any(host == d or host.endswith('.' + d) for d in self.domains)
+
+    def check(self, message) -> Optional[Violation]:
+        if 'http' not in message.content:
+            return None
+        for m in URL_RE.finditer(message.content):
+            if not self._allowed(m.group(1)):
+                return Violation(self.name, f"許可されていないリンク（{m.group(1)}）")
+        return None
+
+
+@dataclass(frozen=True)
+class RegexEntry:
+    name: str
+    pattern: str
+    reason: str
+    flags: int = 0
+
+
+# 結合すると意味が変わる書き方: 後方参照（\1, (?P=name)）・グループ番号の条件分岐 (?(1)...)
+_UNCOMBINABLE_RE = re.compile(r"\\[1-9]|\(\?P=|\(\?\(")
+
+def combinable(entry: RegexEntry) -> bool:
+    """
+    1つの選択にまとめても同じ意味になるか。
+    グループ番号を参照するもの・名前付きグループ（結合後の名前と衝突しうる）・
+    パターン全体にかかるインラインフラグ（(?i) などは先頭以外に置けない）は単独で照合する。
+    """
+    compiled = re.compile(entry.pattern, entry.flags)
+    if compiled.groupindex or _UNCOMBINABLE_RE.search(entry.pattern):
+        return False
+    return compiled.flags & ~re.UNICODE == entry.flags
+
+
+class RegexRule(Rule):
+    """単独で照合する regex ルール"""
+
+    def __init__(self, entry: RegexEntry):
+        super().__init__()
+        self.entry = entry
+        self.pattern = re.compile(entry.pattern, entry.flags)
+        self.name = f"regex:{entry.name}"
+
+    def check(self, message) -> Optional[Violation]:
+        if self.pattern.search(message.content) is None:
+            return None
+        return Violation(self.name, self.entry.reason)
+
+
+class CombinedRegex(Rule):
+    """チャンネル内の regex ルールをまとめた1つの選択パターン（entries はすべて combinable なもの）"""
+    name = "regex"
+
+    def __init__(self, entries: List[RegexEntry]):
+        super().__init__()
+        self._names: Dict[str, RegexEntry] = {}
+        parts = []
+        for i, entry in enumerate(entries):
+            group = f"_r{i}"
+            # フラグはルールごとにその範囲だけにかける
+            body = f"(?i:{entry.pattern})" if entry.flags & re.IGNORECASE else entry.pattern
+            parts.append(f"(?P<{group}>{body})")
+            self._names[group] = entry
+        self.pattern = re.compile("|".join(parts))
+        self.name = f"regex[{len(entries)}]"
+
+    def check(self, message) -> Optional[Violation]:
+        m = self.pattern.search(message.content)
+        if m is None:
+            return None
+        entry = self._names[m.lastgroup]
+        return Violation(f"regex:{entry.name}", entry.reason)
+
+
+class RuleChain:
+    """1チャンネル分のルール。先頭から評価し、最初の違反を返す"""
+
+    def __init__(self, rules: List[Rule]):
+        self.rules = rules
+
+    def evaluate(self, message) -> Optional[Violation]:
+        for rule in self.rules:
+            t0 = time.perf_counter_ns()
+            violation = rule.check(message)
+            rule.stats.record(time.perf_counter_ns() - t0, violation is not None)
+            if violation is not None:
+                return violation
+        return None
+
+
+# ------------------------------------------------------------------
+#  読み込み・コンパイル
+# ------------------------------------------------------------------
+def specs_from_config(rules: Dict[Any, List[Dict[str, Any]]]) -> List[RuleSpec]:
+    specs = []
+    for channel_id, entries in (rules or {}).items():
+        for entry in entries:
+            params = dict(entry)
+            kind = params.pop('type', None)
+            if not kind:
+                continue
+            specs.append(RuleSpec(int(channel_id), kind, params, "config"))
+    return specs
+
+def spec_from_row(row: Dict[str, Any]) -> Optional[RuleSpec]:
+    """filter_rules テーブルの1行を RuleSpec にする（params が壊れていれば None）"""
+    try:
+        params = json.loads(row['params']) if row.get('params') else {}
+    except ValueError:
+        return None
+    return RuleSpec(int(row['channel_id']), row['rule_type'], params, "db")
+
+def _regex_entry(spec: RuleSpec) -> RegexEntry:
+    pattern = spec.params['pattern']
+    flags = re.IGNORECASE if spec.params.get('ignore_case') else 0
+    re.compile(pattern, flags)  # 1件ずつ検証してから結合する
+    return RegexEntry(spec.params.get('name') or pattern[:20], pattern, spec.params.get('reason', '禁止パターン'), flags)
+
+def _regex_rules(entries: List[RegexEntry]) -> Tuple[List[Rule], Optional[str]]:
+    """
+    まとめられるものは CombinedRegex に、残りは1件ずつの RegexRule にする。
+    結合したパターンがコンパイルできなければ全件を単独で照合する（エラーも返す）。
+    """
+    combined = [e for e in entries if combinable(e)]
+    rules: List[Rule] = []
+    error = None
+    if len(combined) > 1:
+        try:
+            rules.append(CombinedRegex(combined))
+        except re.error as err:
+            error = str(err)
+            rules.extend(RegexRule(e) for e in combined)
+    else:
+        rules.extend(RegexRule(e) for e in combined)
+    rules.extend(RegexRule(e) for e in entries if e not in combined)
+    return rules, error
+
+def _build_rule(spec: RuleSpec) -> Rule:
+    p = spec.params
+    if spec.kind == 'require_attachment':
+        return RequireAttachment()
+    if spec.kind == 'attachment_types':
+        return AttachmentTypes(p.get('extensions', ()), p.get('mime_types', ()))
+    if spec.kind == 'max_length':
+        return MaxLength(p['max_chars'])
+    if spec.kind == 'link_allowlist':
+        return LinkAllowlist(p.get('domains', ()))
+    raise ValueError(f"unknown rule type: {spec.kind}")
+
+# 安いルールから評価する（正規表現は最後）
+_ORDER = {'require_attachment': 0, 'attachment_types': 1, 'max_length': 2, 'link_allowlist': 3}
+
+def compile_rules(specs: Iterable[RuleSpec]) -> Tuple[Dict[int, RuleChain], List[str]]:
+    """channel_id -> RuleChain の辞書と、読み込めなかったルールのエラー一覧を返す"""
+    per_channel: Dict[int, List[Rule]] = {}
+    regexes: Dict[int, List[RegexEntry]] = {}
+    errors: List[str] = []
+
+    for spec in specs:
+        try:
+            if spec.kind == 'regex':
+                regexes.setdefault(spec.channel_id, []).append(_regex_entry(spec))
+            else:
+                per_channel.setdefault(spec.channel_id, []).append(_build_rule(spec))
+        except (KeyError, ValueError, TypeError, re.error) as e:
+            errors.append(f"{spec.source} channel={spec.channel_id} {spec.kind}: {e}")
+
+    table: Dict[int, RuleChain] = {}
+    for channel_id in set(per_channel) | set(regexes):
+        rules = sorted(per_channel.get(channel_id, []), key=lambda r: _ORDER.get(r.name, 9))
+        if channel_id in regexes:
+            regex_rules, error = _regex_rules(regexes[channel_id])
+            rules.extend(regex_rules)
+            if error:
+                errors.append(f"channel={channel_id} combined regex (matched one by one instead): {error}")
+        if rules:
+            table[channel_id] = RuleChain(rules)
+    return table, errors
+
+
+class RuleEngine:
+    def __init__(self):
+        self._table: Dict[int, RuleChain] = {}
+        self.loaded_at: Optional[float] = None
+
+    def load(self, specs: Iterable[RuleSpec]) -> List[str]:
+        """ルールを組み立て直して丸ごと差し替える（評価中の呼び出しには影響しない）"""
+        table, errors = compile_rules(specs)
+        self._table = table
+        self.loaded_at = time.time()
+        for e in errors:
+            logger.warning("[Filter] invalid rule skipped: %s", e)
+        return errors
+
+    def evaluate(self, message) -> Optional[Violation]:
+        chain = self._table.get(message.channel.id)
+        if chain is None:
+            return None
+        return chain.evaluate(message)
+
+    def handles(self, channel_id: int) -> bool:
+        return channel_id in self._table
+
+    @property
+    def channel_count(self) -> int:
+        return len(self._table)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        rows = []
+        for channel_id, chain in self._table.items():
+            for rule in chain.rules:
+                s = rule.stats
+                rows.append({
+                    'channel_id': channel_id,
+                    'rule': rule.name,
+                    'calls': s.calls,
+                    'hits': s.hits,
+                    'avg_us': round(s.total_ns / s.calls / 1000, 2) if s.calls else 0.0,
+                    'max_us': round(s.max_ns / 1000, 2),
+                })
+        return rows
@@ -0,0 +1,158 @@
+import time
+import asyncio
+import logging
+import datetime
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# 一括削除できるのは作成から14日未満のメッセージのみ（境界は余裕を持たせる）
+BULK_DELETE_MAX_AGE = datetime.timedelta(days=14) - datetime.timedelta(minutes=5)
+BULK_DELETE_MAX = 100
+
+
+def _log_task_error(task: asyncio.Task) -> None:
+    """バックグラウンドの削除タスクが落ちたらログに残す（"Task exception was never retrieved" にしない）"""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("[Filter] deletion task failed", exc_info=task.exception())
+
+
+class DeletionPipeline:
+    """
+    削除対象のメッセージをチャンネルごとに window 秒だけ溜め、まとめて削除する。
+    - 2件以上かつ14日未満 -> TextChannel.delete_messages（最大100件/回）
+    - 1件だけ・14日以上前 -> message.delete()
+    一括削除が失敗した場合はそのチャンクだけ1件ずつ削除し直す。
+    """
+
+    def __init__(self, *, window: float = 1.0):
+        self.window = window
+        self._pending: Dict[int, List[discord.Message]] = {}
+        self._timers: Dict[int, asyncio.Task] = {}
+        self._flushes: Set[asyncio.Task] = set()  # 上限到達で即時に流している削除（参照を持たないと途中で回収される）
+
+        self.deleted = 0
+        self.failed = 0
+        self.bulk_calls = 0
+        self.single_calls = 0
+
+    def submit(self, message: discord.Message) -> None:
+        """削除対象として積む（削除は待たない）"""
+        channel_id = message.channel.id
+        pending = self._pending.setdefault(channel_id, [])
+        pending.append(message)
+
+        if len(pending) >= BULK_DELETE_MAX:
+            # 1回で消せる上限に達したら待たずに流す
+            timer = self._timers.pop(channel_id, None)
+            if timer is not None:
+                timer.cancel()
+            task = asyncio.create_task(self.flush(channel_id))
+            self._flushes.add(task)
+            task.add_done_callback(self._flush_done)
+        elif channel_id not in self._timers:
+            timer = asyncio.create_task(self._flush_later(channel_id))
+            timer.add_done_callback(_log_task_error)
+            self._timers[channel_id] = timer
+
+    async def flush_all(self) -> None:
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        await asyncio.gather(*(self.flush(cid) for cid in list(self._pending)))
+        # 即時に流している分も終わるのを待つ（失敗は _flush_done で記録済み）
+        await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'pending': sum(len(v) for v in self._pending.values()),
+            'deleted': self.deleted,
+            'failed': self.failed,
+            'api_calls': self.bulk_calls + self.single_calls,
+            'bulk_calls': self.bulk_calls,
+            'single_calls': self.single_calls,
+        }
+
+    def _flush_done(self, task: asyncio.Task) -> None:
+        self._flushes.discard(task)
+        _log_task_error(task)
+
+    async def _flush_later(self, channel_id: int) -> None:
+        await asyncio.sleep(self.window)
+        self._timers.pop(channel_id, None)
+        await self.flush(channel_id)
+
+    async def flush(self, channel_id: int) -> None:
+        messages = self._pending.pop(channel_id, [])
+        if not messages:
+            return
+
+        cutoff = discord.utils.utcnow() - BULK_DELETE_MAX_AGE
+        recent = [m for m in messages if m.created_at > cutoff]
+        old = [m for m in messages if m.created_at <= cutoff]
+
+        for i in range(0, len(recent), BULK_DELETE_MAX):
+            chunk = recent[i:i + BULK_DELETE_MAX]
+            if len(chunk) == 1:
+                old.extend(chunk)
+                continue
+            try:
+                self.bulk_calls += 1
+                await chunk[0].channel.delete_messages(chunk, reason="FilterCog: チャンネルルール違反")
+                self.deleted += len(chunk)
+            except discord.HTTPException as e:
+                logger.warning("[Filter] bulk delete failed (%s msgs), falling back to single deletes: %s", len(chunk), e)
+                old.extend(chunk)
+
+        for m in old:
+            await self._delete_one(m)
+
+    async def _delete_one(self, message: discord.Message) -> None:
+        try:
+            self.single_calls += 1
+            await message.delete()
+            self.deleted += 1
+        except discord.NotFound:
+            pass  # 既に消えている
+        except discord.HTTPException as e:
+            self.failed += 1
+            logger.warning("[Filter] Failed to delete message %s: %s", message.id, e)
+
+
+class BurstGuard:
+    """
+    チャンネルごとの違反件数を直近 per 秒の範囲で数え、段階的な対応を返す。
+    - slowmode_threshold 件以上 -> 'slowmode'
+    - lock_threshold 件以上     -> 'lock'
+    同じ段階は解除されるまで1回だけ返す。
+    """
+
+    def __init__(self, *, per: float = 10.0, slowmode_threshold: int = 10, lock_threshold: int = 30):
+        self.per = per
+        self.slowmode_threshold = slowmode_threshold
+        self.lock_threshold = lock_threshold
+        self._hits: Dict[int, Deque[float]] = {}
+        self._level: Dict[int, str] = {}
+
+    def record(self, channel_id: int, now: Optional[float] = None) -> Optional[str]:
+        now = time.monotonic() if now is None else now
+        hits = self._hits.setdefault(channel_id, deque())
+        hits.append(now)
+        while hits and now - hits[0] > self.per:
+            hits.popleft()
+
+        level = self._level.get(channel_id)
+        if len(hits) >= self.lock_threshold and level != 'lock':
+            self._level[channel_id] = 'lock'
+            return 'lock'
+        if len(hits) >= self.slowmode_threshold and level is None:
+            self._level[channel_id] = 'slowmode'
+            return 'slowmode'
+        return None
+
+    def reset(self, channel_id: int) -> None:
+        self._level.pop(channel_id, None)
+        self._hits.pop(channel_id, None)
@@ -0,0 +1,5 @@
+from discord.ext import commands
+from .main import MassMuteCog
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(MassMuteCog(bot))
@@ -0,0 +1,196 @@
+import discord
+from discord.ext import commands, tasks
+import datetime
+from typing import List
+from config import MUTE_ONLY_CHANNEL_NAMES, READ_ONLY_MUTE_CHANNEL_NAMES
+
+from common.types import PermissionSyncResult
+
+from .services import ManagedChannelIndex, PermissionSyncService, SyncTargets
+
+# 権限オブジェクトの定義 (変更なし)
+SEND_OK_OVERWRITE = discord.PermissionOverwrite(
+    read_messages=True, send_messages=True, mention_everyone=False, manage_webhooks=False
+)
+SEND_NG_OVERWRITE = discord.PermissionOverwrite(
+    read_messages=True, send_messages=False, mention_everyone=False, manage_webhooks=False
+)
+
+# 埋め込みフィールドの文字数上限
+EMBED_FIELD_LIMIT = 1024
+
+def build_targets() -> SyncTargets:
+    """チャンネル名ごとの望ましい設定（両方のリストにある名前は後勝ちで「禁止」）"""
+    targets: SyncTargets = {}
+    for name in MUTE_ONLY_CHANNEL_NAMES:
+        targets[name] = (SEND_OK_OVERWRITE, "許可")
+    for name in READ_ONLY_MUTE_CHANNEL_NAMES:
+        targets[name] = (SEND_NG_OVERWRITE, "禁止")
+    return targets
+
+def _field_value(lines: List[str]) -> str:
+    """上限を超える分は件数だけ表示する"""
+    out, size = [], 0
+    for i, line in enumerate(lines):
+        if size + len(line) + 1 > EMBED_FIELD_LIMIT - 20:
+            out.append(f"…ほか {len(lines) - i} 件")
+            break
+        out.append(line)
+        size += len(line) + 1
+    return "\n".join(out)
+
+class MassMuteCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.sync_service = PermissionSyncService()
+        self.targets = build_targets()
+        self.index = ManagedChannelIndex(self.targets)
+        self._startup_audited = False
+        self.daily_mute_check.start()
+
+    async def cog_load(self):
+        # 管理対象の名前に関係しないチャンネルのイベントはタスクを作る前に捨てる
+        names = self.index.names
+        self.bot.metrics.add_prefilter(self.on_guild_channel_create, lambda channel: channel.name in names)
+        self.bot.metrics.add_prefilter(self.on_guild_channel_delete, lambda channel: channel.name in names)
+        self.bot.metrics.add_prefilter(
+            self.on_guild_channel_update, lambda before, after: before.name in names or after.name in names
+        )
+
+    def cog_unload(self):
+        self.bot.metrics.remove_prefilters(self)
+        self.daily_mute_check.cancel()
+
+    def _send_admin_dm(self, embed: discord.Embed):
+        """管理者へのDMは bot.notifier に積むだけ（送信を待たない）"""
+        self.bot.notifier.send('mass_mute', embed=embed)
+
+    # --- イベント駆動: ずれたチャンネルだけをその場で直す ---
+    @commands.Cog.listener()
+    async def on_ready(self):
+        for guild in self.bot.guilds:
+            self.index.rebuild(guild)
+        print(f"[MassMute] Managed channels indexed: {len(self.index)}")
+
+        # 停止中に起きたずれは起動時に1回だけ確認する（再接続時は不要）
+        if not self._startup_audited:
+            self._startup_audited = True
+            await self.execute_mute_logic("Startup Audit", quiet_if_clean=True)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild):
+        self.index.rebuild(guild)
+        await self.execute_mute_logic(f"Guild Join ({guild.name})", quiet_if_clean=True)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.index.forget(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel):
+        if not isinstance(channel, discord.TextChannel) or channel.name not in self.index.names:
+            return
+        self.index.rebuild(channel.guild)
+        await self._enforce(channel, "Channel Create")
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before, after):
+        # 権限上書きの変更もこのイベントで届く
+        if not isinstance(after, discord.TextChannel):
+            return
+        if before.name != after.name and (before.name in self.index.names or after.name in self.index.names):
+            self.index.rebuild(after.guild)
+        if self.index.is_managed(after):
+            await self._enforce(after, "Channel Update")
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        if isinstance(channel, discord.TextChannel) and channel.name in self.index.names:
+            self.index.rebuild(channel.guild)
+
+    async def _enforce(self, channel: discord.TextChannel, trigger: str):
+        """管理対象の1チャンネルを確認し、ずれていた場合だけ修正して報告する"""
+        result = await self.sync_service.enforce(channel, self.targets)
+        if not result.updated and not result.errors:
+            return  # 一致していた（自分の修正による更新イベントもここで止まる）
+
+        print(f"[MassMute] {trigger}: guild={channel.guild.name} ch=#{channel.name} "
+              f"updated={len(result.updated)} errors={len(result.errors)}")
+        await self._save_log(trigger, result)
+
+        embed = discord.Embed(
+            title="🛡️ 権限のずれを修正",
+            description=f"実行トリガー: **{trigger}**\nサーバー: {channel.guild.name}",
+            color=0x4caf50 if not result.errors else 0xf44336,
+            timestamp=discord.utils.utcnow()
+        )
+        if result.updated:
+            embed.add_field(name="✅ 変更", value=_field_value(result.updated), inline=False)
+        if result.errors:
+            embed.add_field(name="❌ エラー", value=_field_value(result.errors), inline=False)
+        self._send_admin_dm(embed)
+
+    async def _save_log(self, trigger: str, result: PermissionSyncResult):
+        try:
+            status = "SUCCESS" if not result.errors else "WARNING"
+            details = f"Updated: {len(result.updated)}, Unchanged: {len(result.unchanged)}, Errors: {len(result.errors)}"
+
+            async with self.bot.db.acquire() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(
+                        "INSERT INTO mute_logs (trigger_name, executed_at, status, details) VALUES (%s, %s, %s, %s)",
+                        (trigger, datetime.datetime.now(), status, details)
+                    )
+        except Exception as e:
+            print(f"[DB ERROR] Failed to save log: {e}")
+
+    async def execute_mute_logic(self, trigger: str, *, quiet_if_clean: bool = False):
+        if not self.bot.guilds: return
+
+        # 現在の設定と差分があるチャンネルだけを全サーバー分まとめて更新
+        result = await self.sync_service.sync_all(self.bot.guilds, self.targets)
+        print(f"[MassMute] {trigger}: updated={len(result.updated)} unchanged={len(result.unchanged)} "
+              f"errors={len(result.errors)} api_calls_avoided={result.api_calls_avoided}")
+
+        # --- DBへのログ保存 ---
+        await self._save_log(trigger, result)
+
+        # 定期監査などで、ずれも失敗もなければ通知しない
+        if quiet_if_clean and not result.updated and not result.errors:
+            return
+
+        # --- 管理者への完了通知DM ---
+        embed = discord.Embed(
+            title="🛡️ 通知抑制処理 完了報告",
+            description=f"実行トリガー: **{trigger}**",
+            color=0x4caf50 if not result.errors else 0xff9800,
+            timestamp=discord.utils.utcnow()
+        )
+
+        if result.updated:
+            embed.add_field(name="✅ 変更", value=_field_value(result.updated), inline=False)
+
+        if result.unchanged:
+            embed.add_field(
+                name="⏭️ 変更なし",
+                value=f"{len(result.unchanged)} チャンネル（API呼び出し {result.api_calls_avoided} 回を省略）",
+                inline=False
+            )
+
+        if result.errors:
+            embed.add_field(name="❌ エラー", value=_field_value(result.errors), inline=False)
+            embed.color = 0xf44336
+
+        if not result.updated and not result.unchanged and not result.errors:
+            embed.description += "\n対象のチャンネルが見つかりませんでした。"
+
+        self._send_admin_dm(embed)
+
+    # 通常はイベントで直すため、取りこぼし確認の監査を1日1回だけ行う
+    @tasks.loop(time=datetime.time(0, 0, tzinfo=datetime.timezone.utc))
+    async def daily_mute_check(self):
+        await self.execute_mute_logic("Daily Audit", quiet_if_clean=True)
+
+    @daily_mute_check.before_loop
+    async def before_daily_mute_check(self):
+        await self.bot.wait_until_ready()
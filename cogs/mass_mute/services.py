@@ -0,0 +1,114 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+import discord
+
+from common.types import PermissionSyncResult
+
+logger = logging.getLogger(__name__)
+
+# チャンネル名 -> (望ましい @everyone の上書き設定, 表示用ラベル)
+SyncTargets = Dict[str, Tuple[discord.PermissionOverwrite, str]]
+
+
+class PermissionSyncService:
+    """
+    @everyone の権限上書きを「望ましい状態」に揃える。
+    - 現在の上書きと比較し、一致しているチャンネルには API を呼ばない
+    - 変更が必要な分だけ Semaphore で同時実行数を絞って並行に適用する
+      （ルートごとのレート制限の待ち合わせは discord.py の HTTP クライアントが行う）
+    """
+
+    def __init__(self, max_concurrency: int = 5):
+        self._sem = asyncio.Semaphore(max_concurrency)
+
+    @staticmethod
+    def plan(guild: discord.Guild, targets: SyncTargets) -> Tuple[List[Tuple[discord.TextChannel, discord.PermissionOverwrite, str]], List[str]]:
+        """変更が必要なチャンネルと、既に一致しているチャンネルのラベルに分ける"""
+        # 同名チャンネルは先頭のもの（discord.utils.get と同じ）を対象にする
+        by_name: Dict[str, discord.TextChannel] = {}
+        for ch in guild.text_channels:
+            by_name.setdefault(ch.name, ch)
+
+        everyone = guild.default_role
+        changes, unchanged = [], []
+        for name, (overwrite, label) in targets.items():
+            channel = by_name.get(name)
+            if channel is None:
+                continue
+            if channel.overwrites_for(everyone) == overwrite:
+                unchanged.append(f"#{name} ({label})")
+            else:
+                changes.append((channel, overwrite, label))
+        return changes, unchanged
+
+    async def sync_guild(self, guild: discord.Guild, targets: SyncTargets, *, prefix: str = "") -> PermissionSyncResult:
+        changes, unchanged = self.plan(guild, targets)
+        result = PermissionSyncResult(unchanged=[prefix + u for u in unchanged])
+
+        await asyncio.gather(*(self._apply(ch, ow, label, result, prefix) for ch, ow, label in changes))
+        return result
+
+    async def enforce(self, channel: discord.TextChannel, targets: SyncTargets) -> PermissionSyncResult:
+        """1チャンネルだけ確認し、ずれていれば直す（イベント駆動用）"""
+        result = PermissionSyncResult()
+        target = targets.get(channel.name)
+        if target is None:
+            return result
+        overwrite, label = target
+        if channel.overwrites_for(channel.guild.default_role) == overwrite:
+            result.unchanged.append(f"#{channel.name} ({label})")
+        else:
+            await self._apply(channel, overwrite, label, result)
+        return result
+
+    async def _apply(self, channel: discord.TextChannel, overwrite: discord.PermissionOverwrite, label: str,
+                     result: PermissionSyncResult, prefix: str = "") -> None:
+        guild = channel.guild
+        async with self._sem:
+            try:
+                await channel.set_permissions(guild.default_role, overwrite=overwrite)
+                result.updated.append(f"{prefix}#{channel.name} ({label})")
+            except Exception as e:
+                logger.warning("[MassMute] set_permissions failed guild=%s(%s) ch=%s: %s", guild.name, guild.id, channel.name, e)
+                result.errors.append(f"{prefix}#{channel.name}: {e}")
+
+    async def sync_all(self, guilds: Sequence[discord.Guild], targets: SyncTargets) -> PermissionSyncResult:
+        """Botが参加している全サーバーを同期する（同時実行数はサーバーをまたいで共通）"""
+        multi = len(guilds) > 1
+        results = await asyncio.gather(*(
+            self.sync_guild(g, targets, prefix=f"[{g.name}] " if multi else "") for g in guilds
+        ))
+        total = PermissionSyncResult()
+        for r in results:
+            total.merge(r)
+        return total
+
+
+class ManagedChannelIndex:
+    """
+    サーバーごとの「管理対象のチャンネル名 -> チャンネルID」
+    同名チャンネルが複数ある場合は plan と同じく先頭のものだけを管理対象とする。
+    チャンネルの作成・削除・名前変更のときだけ該当サーバー分を作り直す。
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self.names: Set[str] = set(names)
+        self._by_guild: Dict[int, Dict[str, int]] = {}
+
+    def rebuild(self, guild: discord.Guild) -> None:
+        mapping: Dict[str, int] = {}
+        for ch in guild.text_channels:
+            if ch.name in self.names:
+                mapping.setdefault(ch.name, ch.id)
+        self._by_guild[guild.id] = mapping
+
+    def forget(self, guild: discord.Guild) -> None:
+        self._by_guild.pop(guild.id, None)
+
+    def is_managed(self, channel: discord.abc.GuildChannel) -> bool:
+        return self._by_guild.get(channel.guild.id, {}).get(channel.name) == channel.id
+
+    def __len__(self) -> int:
+        return sum(len(m) for m in self._by_guild.values())
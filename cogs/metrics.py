@@ -0,0 +1,56 @@
+import discord
+from discord import app_commands
+from discord.ext import commands
+from config import ADMIN_USER_ID
+
+# 表示するリスナー・イベントの件数
+TOP_N = 10
+
+class MetricsCog(commands.Cog):
+    """bot.metrics（イベント処理の計測）と DB・通知キューの状態を表示する"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.owner_id = int(ADMIN_USER_ID) if ADMIN_USER_ID.isdigit() else None
+
+    @app_commands.command(name="metrics", description="【管理者】イベント処理時間・ループ遅延・DB/通知の状態を表示します")
+    async def cmd_metrics(self, interaction: discord.Interaction):
+        if interaction.user.id != self.owner_id:
+            await interaction.response.send_message("このコマンドは管理者のみ実行できます。", ephemeral=True)
+            return
+
+        m = self.bot.metrics.stats()
+        embed = discord.Embed(title="📊 Bot メトリクス", color=0x2196f3, timestamp=discord.utils.utcnow())
+
+        lines = [
+            f"`{r['listener']}` {r['calls']} 回（除外 {r['filtered']}）p50 {r['p50_ms']}ms / p99 {r['p99_ms']}ms / 最大 {r['max_ms']}ms / 待ち p99 {r['delay_p99_ms']}ms"
+            for r in m['listeners'][:TOP_N]
+        ]
+        embed.add_field(name="リスナー（p99 の遅い順）", value="\n".join(lines)[:1024] or "記録なし", inline=False)
+
+        events = list(m['events'].items())[:TOP_N]
+        embed.add_field(name="イベント件数", value="\n".join(f"`{name}` {n}" for name, n in events)[:1024] or "記録なし", inline=False)
+
+        embed.add_field(
+            name="イベントループ遅延",
+            value=f"p50 {m['loop_lag_p50_ms']}ms / p99 {m['loop_lag_p99_ms']}ms / 最大 {m['loop_lag_max_ms']}ms",
+            inline=False,
+        )
+
+        db = self.bot.db.stats()
+        embed.add_field(
+            name="DBプール",
+            value=f"{db['size'] - db['free']}/{db['size']} 使用中（最大 {db['maxsize']}）acquire p99 {db['acquire_p99_ms']}ms",
+            inline=False,
+        )
+
+        n = self.bot.notifier.stats()
+        embed.add_field(
+            name="管理者通知",
+            value=f"送信 {n['sent']} / 待ち {n['queued']} / まとめ {n['coalesced']} / 破棄 {n['dropped']} / 失敗 {n['failed']}",
+            inline=False,
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+async def setup(bot):
+    await bot.add_cog(MetricsCog(bot))
@@ -8,27 +8,8 @@ import json
 class SurveyCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.pool = None
         self.dashboard_url = os.getenv('DASHBOARD_URL', 'https://dashboard.awajiempire.net')
 
-    async def cog_load(self):
-        try:
-            self.pool = await aiomysql.create_pool(
-                host=os.getenv('DB_HOST', '127.0.0.1'),
-                user=os.getenv('DB_USER', 'root'),
-                password=os.getenv('DB_PASS', ''),
-                db=os.getenv('DB_NAME', 'bot_db'),
-                autocommit=True
-            )
-            print("✅ SurveyCog: DB Connected")
-        except Exception as e:
-            print(f"❌ SurveyCog DB Error: {e}")
-
-    async def cog_unload(self):
-        if self.pool:
-            self.pool.close()
-            await self.pool.wait_closed()
-
     # --- グループコマンド /survey ---
     survey_group = app_commands.Group(name="survey", description="アンケート関連コマンド")
 
@@ -51,7 +32,7 @@ class SurveyCog(commands.Cog):
     async def cmd_list(self, interaction: discord.Interaction):
         await interaction.response.defer()
 
-        async with self.pool.acquire() as conn:
+        async with self.bot.db.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cur:
                 # 全員の「稼働中」を取得
                 await cur.execute("SELECT * FROM surveys WHERE is_active = 1 ORDER BY created_at DESC")
@@ -89,7 +70,7 @@ class SurveyCog(commands.Cog):
 
         user_id = str(interaction.user.id)
 
-        async with self.pool.acquire() as conn:
+        async with self.bot.db.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cur:
                 # 自分がオーナー かつ is_active=1 のものを検索
                 await cur.execute("SELECT * FROM surveys WHERE owner_id = %s AND is_active = 1 ORDER BY created_at DESC", (user_id,))
@@ -121,7 +102,7 @@ class SurveyCog(commands.Cog):
     async def cmd_announce(self, interaction: discord.Interaction, survey_id: int):
         await interaction.response.defer()
 
-        async with self.pool.acquire() as conn:
+        async with self.bot.db.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cur:
                 await cur.execute("SELECT * FROM surveys WHERE id=%s", (survey_id,))
                 survey = await cur.fetchone()
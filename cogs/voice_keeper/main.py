@@ -1,23 +1,27 @@
 """
 VoiceKeeper main module
 - Discordイベント監視（on_voice_state_update）
-- タスク管理（タイマー開始/キャンセル）
+- サーバーごとの設定（settings.py。ホスト判定は guild_id の辞書とホストIDの集合で O(1)）
+- タイマー管理（scheduler.py の単一スケジューラ + DB 永続化、on_ready で復元・照合）
 - 実処理は services.py に委譲
 """
 
 import os
-import asyncio
+import time
 import logging
 from zoneinfo import ZoneInfo
-from typing import Dict, Optional
+from typing import Optional
 
 import discord
 from discord.ext import commands
 
-from common.time_utils import is_active_time
+import config
+from common.time_utils import ActiveWindow
 from common.types import WatchKey
 
+from .scheduler import WatchScheduler, WatchStore
 from .services import VoiceKeeperService
+from .settings import ChannelPolicy, GuildPolicy, build_registry
 
 logger = logging.getLogger(__name__)
 
@@ -34,96 +38,165 @@ def _env_bool(name: str, default: str = "0") -> bool:
 
 class VoiceKeeper(commands.Cog):
     """
-    - TARGET_USER_ID が VC 退出/移動 -> 元VCを AFK_TIMEOUT_SECONDS 後に再チェック
-    - ホストが戻ってなければ bot以外を切断して人数を報告
+    - ホスト（サーバーごとに複数可）が VC 退出/移動 -> 元VCをチャンネルごとの猶予時間後に再チェック
+    - ホストが誰も戻ってなければ bot以外を切断して人数を報告
+    - 期限は DB に保存し、再起動・再接続後の on_ready で現在のVC状態と照合して復元する
     """
 
     def __init__(self, bot: commands.Bot):
         self.bot = bot
 
-        # .env（ここで直接読む）
-        self.target_user_id = _env_int("TARGET_USER_ID", 0)
-        self.active_start_hour = _env_int("ACTIVE_START_HOUR", 1)
-        self.active_end_hour = _env_int("ACTIVE_END_HOUR", 6)
-        self.timeout_seconds = _env_int("AFK_TIMEOUT_SECONDS", 300)
-        self.report_channel_name = os.getenv("REPORT_CHANNEL_NAME", "配信コメント")
+        # .env（ここで直接読む）。VOICE_KEEPER_GUILDS が無いときの全サーバー共通設定
+        target_user_id = _env_int("TARGET_USER_ID", 0)
+        env_default = GuildPolicy(
+            hosts=frozenset([target_user_id]) if target_user_id else frozenset(),
+            default=ChannelPolicy(
+                timeout_seconds=_env_int("AFK_TIMEOUT_SECONDS", 300),
+                window=ActiveWindow.from_hours(
+                    _env_int("ACTIVE_START_HOUR", 1), _env_int("ACTIVE_END_HOUR", 6), ZoneInfo("Asia/Tokyo")
+                ),
+            ),
+            report_channel_name=os.getenv("REPORT_CHANNEL_NAME", "配信コメント"),
+        )
         self.debug_log = _env_bool("VK_DEBUG_LOG", "0")  # 任意（無ければ0でOK）
 
-        self.service = VoiceKeeperService(self.report_channel_name)
+        # config.py の VOICE_KEEPER_GUILDS（サーバーごとのホスト・猶予時間・稼働時間・報告先）
+        self.registry, errors = build_registry(getattr(config, "VOICE_KEEPER_GUILDS", None), env_default)
+        for e in errors:
+            logger.warning("[VoiceKeeper] invalid guild config skipped: %s", e)
 
-        self._tasks: Dict[WatchKey, asyncio.Task] = {}
-        self._tz = ZoneInfo("Asia/Tokyo")
+        self.service = VoiceKeeperService()
 
-    def _active_now(self) -> bool:
-        return is_active_time(self.active_start_hour, self.active_end_hour, self._tz)
+        self.scheduler = WatchScheduler(self._on_deadline)
+        self.store = WatchStore(bot.db)
 
-    def _get_member_current_vc_id(self, member: discord.Member) -> Optional[int]:
-        if member.voice and member.voice.channel:
-            return member.voice.channel.id
+    async def cog_load(self):
+        self.scheduler.start()
+        # ホスト以外のボイス状態の変化はタスクを作る前に捨てる
+        self.bot.metrics.add_prefilter(
+            self.on_voice_state_update, lambda member, before, after: self.registry.is_host(member.guild.id, member.id)
+        )
+
+    async def cog_unload(self):
+        self.bot.metrics.remove_prefilters(self)
+        # DB の行は残す（次回起動時に復元する）
+        await self.scheduler.stop()
+
+    def _active_now(self, policy: ChannelPolicy) -> bool:
+        return policy.window.is_active()
+
+    def _host_in(self, policy: GuildPolicy, channel) -> Optional[discord.Member]:
+        """ホストの誰かがそのVCにいれば返す"""
+        for m in channel.members:
+            if m.id in policy.hosts:
+                return m
         return None
 
-    def _cancel_task(self, key: WatchKey) -> None:
-        task = self._tasks.pop(key, None)
-        if task and not task.done():
-            task.cancel()
+    async def _start_watch(self, key: WatchKey, policy: ChannelPolicy) -> None:
+        deadline = time.time() + policy.timeout_seconds
+        self.scheduler.schedule(key, deadline)
+        await self.store.save(key, deadline)
+
+    async def _drop_watch(self, key: WatchKey) -> None:
+        self.scheduler.cancel(key)
+        await self.store.delete(key)
+
+    def _stale_reason(self, key: WatchKey) -> Optional[str]:
+        """
+        現在のVC状態から見て不要になった監視なら理由を返す（停止・切断中に見逃したイベントの補正）
+        """
+        policy = self.registry.get(key.guild_id)
+        if policy is None:
+            return "not configured"
+        guild = self.bot.get_guild(key.guild_id)
+        if guild is None:
+            return "guild not found"
+        channel = guild.get_channel(key.channel_id)
+        if channel is None or not isinstance(channel, (discord.VoiceChannel, discord.StageChannel)):
+            return "channel not found"
+        if self._host_in(policy, channel) is not None:
+            return "host returned"
+        if not any(not m.bot for m in channel.members):
+            return "channel empty"
+        return None
 
-    async def _watch_and_execute(self, guild_id: int, channel_id: int):
-        key = WatchKey(guild_id=guild_id, channel_id=channel_id)
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """保存済みの監視を読み込み、メモリ上の監視と合わせて現在のVC状態と照合する"""
+        if not self.registry.enabled:
+            return
 
+        restored = 0
+        for key, deadline in await self.store.load_all():
+            if key not in self.scheduler:
+                self.scheduler.schedule(key, deadline)
+                restored += 1
+
+        dropped = 0
+        for key in self.scheduler.keys():
+            reason = self._stale_reason(key)
+            if reason is None:
+                continue
+            await self._drop_watch(key)
+            dropped += 1
+            if self.debug_log:
+                logger.debug("[VoiceKeeper] drop watch on ready: %s guild=%s vc=%s", reason, key.guild_id, key.channel_id)
+
+        if restored or dropped:
+            logger.info("[VoiceKeeper] watches restored=%s dropped=%s pending=%s", restored, dropped, len(self.scheduler))
+
+    async def _on_deadline(self, key: WatchKey, deadline: float):
         try:
-            await asyncio.sleep(self.timeout_seconds)
-
-            guild = self.bot.get_guild(guild_id)
-            if guild is None:
-                return
-
-            channel = guild.get_channel(channel_id)
-            if channel is None or not isinstance(channel, (discord.VoiceChannel, discord.StageChannel)):
-                return
-
-            host = guild.get_member(self.target_user_id)
-
-            # ホストが元VCに戻ってるなら何もしない
-            if host is not None and self._get_member_current_vc_id(host) == channel_id:
-                if self.debug_log:
-                    logger.debug("[VoiceKeeper] skip: host returned guild=%s(%s) vc=%s(%s)", guild.name, guild.id, channel.name, channel.id)
-                return
-
-            # 待ってる間に時間外になったら何もしない（安全側）
-            if not self._active_now():
-                if self.debug_log:
-                    logger.debug("[VoiceKeeper] skip: out of active time after delay guild=%s(%s) vc=%s(%s)", guild.name, guild.id, channel.name, channel.id)
-                return
-
-            kicked_count = await self.service.kick_all_non_bots(channel)
-            report_sent = await self.service.send_report(guild, kicked_count)
-
-            self.service.log_summary(
-                reason="executed",
-                guild=guild,
-                voice_channel=channel,
-                host=host,
-                kicked_count=kicked_count,
-                report_sent=report_sent,
-            )
+            await self._execute(key)
+        finally:
+            # 実行中に張り替えられた新しい期限の行は残す
+            await self.store.delete(key, deadline)
 
-        except asyncio.CancelledError:
+    async def _execute(self, key: WatchKey):
+        policy = self.registry.get(key.guild_id)
+        if policy is None:
             return
-        finally:
-            self._tasks.pop(key, None)
 
-    @commands.Cog.listener()
-    async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
-        # 無効設定
-        if self.target_user_id == 0:
+        guild = self.bot.get_guild(key.guild_id)
+        if guild is None:
+            return
+
+        channel = guild.get_channel(key.channel_id)
+        if channel is None or not isinstance(channel, (discord.VoiceChannel, discord.StageChannel)):
+            return
+
+        # ホストの誰かが元VCに戻ってるなら何もしない
+        returned = self._host_in(policy, channel)
+        if returned is not None:
+            if self.debug_log:
+                logger.debug("[VoiceKeeper] skip: host returned guild=%s(%s) vc=%s(%s) host=%s(%s)", guild.name, guild.id, channel.name, channel.id, returned.name, returned.id)
             return
 
-        # 監視対象のみ
-        if member.id != self.target_user_id:
+        # 待ってる間に時間外になったら何もしない（安全側）
+        if not self._active_now(policy.for_channel(channel.id)):
+            if self.debug_log:
+                logger.debug("[VoiceKeeper] skip: out of active time after delay guild=%s(%s) vc=%s(%s)", guild.name, guild.id, channel.name, channel.id)
             return
 
-        # 稼働時間外は無視
-        if not self._active_now():
+        result = await self.service.kick_all_non_bots(channel)
+        report_sent = await self.service.send_report(
+            guild, result.kicked_count,
+            channel_id=policy.report_channel_id, channel_name=policy.report_channel_name,
+        )
+
+        self.service.log_summary(
+            reason="executed",
+            guild=guild,
+            voice_channel=channel,
+            result=result,
+            report_sent=report_sent,
+        )
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
+        # 監視対象（そのサーバーのホスト）のみ。辞書と集合の参照だけで弾く
+        policy = self.registry.get(member.guild.id)
+        if policy is None or member.id not in policy.hosts:
             return
 
         before_ch = before.channel
@@ -132,6 +205,12 @@ class VoiceKeeper(commands.Cog):
         if before_ch is None and after_ch is None:
             return
 
+        # 元VCに戻ってきたら、そのVCの監視は不要
+        if after_ch is not None:
+            back_key = WatchKey(guild_id=member.guild.id, channel_id=after_ch.id)
+            if back_key in self.scheduler:
+                await self._drop_watch(back_key)
+
         # 同一VC内の変化（ミュート等）は無視
         if before_ch is not None and after_ch is not None and before_ch.id == after_ch.id:
             return
@@ -140,11 +219,19 @@ class VoiceKeeper(commands.Cog):
         if before_ch is None:
             return
 
+        # 稼働時間外は無視（チャンネルごとの設定）
+        channel_policy = policy.for_channel(before_ch.id)
+        if not self._active_now(channel_policy):
+            return
+
+        # 他のホストがまだ元VCに残っていれば配信は続いている
+        if self._host_in(policy, before_ch) is not None:
+            return
+
         key = WatchKey(guild_id=member.guild.id, channel_id=before_ch.id)
 
         # 張り替え（最新を優先）
-        self._cancel_task(key)
-        self._tasks[key] = asyncio.create_task(self._watch_and_execute(member.guild.id, before_ch.id))
+        await self._start_watch(key, channel_policy)
 
         if self.debug_log:
             logger.debug(
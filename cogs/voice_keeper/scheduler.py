@@ -0,0 +1,164 @@
+"""
+VoiceKeeper のタイマー管理
+- WatchScheduler: WatchKey ごとの期限を1つのタスクでまとめて待つ（キーごとに sleep タスクを作らない）
+- WatchStore: 期限を DB（voice_keeper_watches）に保存し、再起動・再接続後に復元できるようにする
+
+期限は再起動をまたいで使うため、time.monotonic() ではなく UNIX 時刻（time.time()）で持つ。
+"""
+
+import time
+import heapq
+import asyncio
+import logging
+import datetime
+import itertools
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from common.types import WatchKey
+
+logger = logging.getLogger(__name__)
+
+WatchCallback = Callable[[WatchKey, float], Awaitable[None]]
+
+
+class WatchScheduler:
+    """
+    期限を heap (deadline, seq, key) で持ち、最も早い期限まで眠るだけの単一タスク。
+    - 張り替え・取り消しは辞書を更新するだけ（heap に残った古い要素は取り出し時に捨てる）
+    - 今より早い期限が入ったときだけ Event で起こして眠り直す
+    - 期限が来たキーは callback(key, deadline) を別タスクで実行する（切断処理で他の期限を遅らせない）
+    """
+
+    def __init__(self, callback: WatchCallback):
+        self._callback = callback
+        self._deadlines: Dict[WatchKey, float] = {}
+        self._heap: List[Tuple[float, int, WatchKey]] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        tasks = [t for t in [self._task, *self._running] if t is not None]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._running.clear()
+
+    def schedule(self, key: WatchKey, deadline: float) -> None:
+        """key の期限を設定する（既にあれば張り替え）"""
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._seq), key))
+        if self._heap[0][2] == key:
+            self._wakeup.set()
+
+    def cancel(self, key: WatchKey) -> bool:
+        if self._deadlines.pop(key, None) is None:
+            return False
+        # 取り消しが溜まったら heap を作り直す
+        if len(self._heap) > 4 * len(self._deadlines) + 64:
+            self._heap = [e for e in self._heap if self._deadlines.get(e[2]) == e[0]]
+            heapq.heapify(self._heap)
+        return True
+
+    def deadline(self, key: WatchKey) -> Optional[float]:
+        return self._deadlines.get(key)
+
+    def keys(self) -> List[WatchKey]:
+        return list(self._deadlines)
+
+    def __contains__(self, key: WatchKey) -> bool:
+        return key in self._deadlines
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                deadline, _, key = heapq.heappop(self._heap)
+                if self._deadlines.get(key) != deadline:
+                    continue  # 張り替え・取り消し済み
+                del self._deadlines[key]
+                task = asyncio.create_task(self._fire(key, deadline))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, key: WatchKey, deadline: float) -> None:
+        try:
+            await self._callback(key, deadline)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("[VoiceKeeper] watch callback failed guild=%s vc=%s", key.guild_id, key.channel_id)
+
+
+def _to_utc_datetime(ts: float) -> datetime.datetime:
+    # DATETIME 列は秒単位・タイムゾーンなし（UTC）で保存する
+    return datetime.datetime.fromtimestamp(int(ts), datetime.timezone.utc).replace(tzinfo=None)
+
+def _from_utc_datetime(dt: datetime.datetime) -> float:
+    return dt.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+class WatchStore:
+    """
+    voice_keeper_watches テーブル。DBに繋がっていなくても VoiceKeeper 自体は動くよう、
+    失敗は警告ログだけにして呼び出し元には例外を返さない。
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    async def save(self, key: WatchKey, deadline: float) -> None:
+        try:
+            async with self.db.acquire() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(
+                        "INSERT INTO voice_keeper_watches (guild_id, channel_id, deadline) VALUES (%s, %s, %s) "
+                        "ON DUPLICATE KEY UPDATE deadline = VALUES(deadline)",
+                        (key.guild_id, key.channel_id, _to_utc_datetime(deadline))
+                    )
+        except Exception as e:
+            logger.warning("[VoiceKeeper] failed to save watch guild=%s vc=%s: %s", key.guild_id, key.channel_id, e)
+
+    async def delete(self, key: WatchKey, deadline: Optional[float] = None) -> None:
+        """
+        deadline を指定した場合はその期限の行だけを消す
+        （実行中に張り替えられた新しい期限を消さないため）
+        """
+        sql = "DELETE FROM voice_keeper_watches WHERE guild_id = %s AND channel_id = %s"
+        params: tuple = (key.guild_id, key.channel_id)
+        if deadline is not None:
+            sql += " AND deadline = %s"
+            params += (_to_utc_datetime(deadline),)
+        try:
+            async with self.db.acquire() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(sql, params)
+        except Exception as e:
+            logger.warning("[VoiceKeeper] failed to delete watch guild=%s vc=%s: %s", key.guild_id, key.channel_id, e)
+
+    async def load_all(self) -> List[Tuple[WatchKey, float]]:
+        try:
+            async with self.db.acquire() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute("SELECT guild_id, channel_id, deadline FROM voice_keeper_watches")
+                    rows = await cur.fetchall()
+        except Exception as e:
+            logger.warning("[VoiceKeeper] failed to load watches: %s", e)
+            return []
+        return [(WatchKey(guild_id=int(g), channel_id=int(c)), _from_utc_datetime(d)) for g, c, d in rows]
@@ -1,46 +1,124 @@
+import time
+import asyncio
 import logging
-from typing import Optional
+from typing import Optional, Set
 
 import discord
 
+from common.types import KickResult
+
 logger = logging.getLogger(__name__)
 
 class VoiceKeeperService:
-    def __init__(self, report_channel_name: str):
-        self.report_channel_name = report_channel_name
-
-    async def find_report_channel(self, guild: discord.Guild) -> Optional[discord.TextChannel]:
-        return discord.utils.get(guild.text_channels, name=self.report_channel_name)
+    async def find_report_channel(
+        self,
+        guild: discord.Guild,
+        *,
+        channel_id: Optional[int] = None,
+        channel_name: Optional[str] = None,
+    ) -> Optional[discord.abc.Messageable]:
+        """報告先はIDを優先し、無ければ名前で探す"""
+        if channel_id is not None:
+            channel = guild.get_channel(channel_id)
+            if isinstance(channel, discord.abc.Messageable):
+                return channel
+            return None
+        if channel_name:
+            return discord.utils.get(guild.text_channels, name=channel_name)
+        return None
 
-    async def kick_all_non_bots(self, channel: discord.abc.GuildChannel) -> int:
+    async def kick_all_non_bots(
+        self,
+        channel: discord.abc.GuildChannel,
+        *,
+        max_concurrency: int = 5,
+        max_passes: int = 2,
+        recheck_delay: float = 1.0,
+    ) -> KickResult:
+        """
+        bot以外を並行して切断する（同時実行数は max_concurrency まで）。
+        切断中に入り直した人がいれば、少し待ってから次のパスで再度切断する。
+        """
+        result = KickResult()
         if not isinstance(channel, (discord.VoiceChannel, discord.StageChannel)):
-            return 0
+            return result
+
+        t0 = time.monotonic()
+        sem = asyncio.Semaphore(max_concurrency)
+        kicked: Set[int] = set()
+        failed: Set[int] = set()   # 権限エラー（次のパスでも再試行しない）
+        errored: Set[int] = set()  # それ以外の API エラー（次のパスで再試行する）
+        skipped: Set[int] = set()
+
+        async def kick(m: discord.Member):
+            async with sem:
+                outcome = await self._move_out(channel, m)
+            if outcome == "kicked":
+                kicked.add(m.id)
+                errored.discard(m.id)
+            elif outcome == "failed":
+                failed.add(m.id)
+            elif outcome == "error":
+                errored.add(m.id)
+            elif m.id not in kicked:
+                skipped.add(m.id)
 
-        victims = [m for m in channel.members if not m.bot]
-        count = 0
+        for n in range(max_passes):
+            # 権限エラーで失敗した人は再試行しない
+            victims = [m for m in channel.members if not m.bot and m.id not in failed]
+            if not victims:
+                break
+            if n > 0:
+                logger.info("[VoiceKeeper] %s member(s) still in vc=%s(%s), pass %s", len(victims), channel.name, channel.id, n + 1)
+            result.passes += 1
+            await asyncio.gather(*(kick(m) for m in victims))
+            if n + 1 < max_passes:
+                await asyncio.sleep(recheck_delay)
 
-        for m in victims:
-            try:
-                await m.move_to(None, reason="VoiceKeeper: 寝落ち切断")
-                count += 1
-            except discord.Forbidden:
-                logger.warning(
-                    "[VoiceKeeper] Missing permission to move members. vc=%s(%s)",
-                    getattr(channel, "name", "?"), channel.id
-                )
-            except discord.HTTPException as e:
-                logger.warning(
-                    "[VoiceKeeper] Failed to move member in vc=%s(%s): %s",
-                    getattr(channel, "name", "?"), channel.id, e
-                )
-        return count
+        result.kicked = sorted(kicked)
+        result.failed = sorted(failed | (errored - kicked))
+        result.skipped = sorted(skipped - kicked)
+        result.elapsed = time.monotonic() - t0
+        return result
+
+    async def _move_out(self, channel: discord.abc.GuildChannel, m: discord.Member) -> str:
+        """
+        1人を切断する。kicked / failed（権限エラー）/ error / skipped を返す。
+        429 と一時的な 5xx は discord.py の HTTP クライアントが Retry-After を守って再試行するので、
+        ここまで届いた HTTPException は error とし、まだ VC に残っていれば次のパスで再試行する。
+        """
+        # 既に自分で抜けていれば何もしない
+        if m.voice is None or m.voice.channel is None or m.voice.channel.id != channel.id:
+            return "skipped"
+        try:
+            await m.move_to(None, reason="VoiceKeeper: 寝落ち切断")
+            return "kicked"
+        except discord.Forbidden:
+            logger.warning(
+                "[VoiceKeeper] Missing permission to move members. vc=%s(%s)",
+                getattr(channel, "name", "?"), channel.id
+            )
+            return "failed"
+        except discord.HTTPException as e:
+            logger.warning(
+                "[VoiceKeeper] Failed to move member in vc=%s(%s): %s",
+                getattr(channel, "name", "?"), channel.id, e
+            )
+            return "error"
 
-    async def send_report(self, guild: discord.Guild, kicked_count: int) -> bool:
-        report_ch = await self.find_report_channel(guild)
+    async def send_report(
+        self,
+        guild: discord.Guild,
+        kicked_count: int,
+        *,
+        channel_id: Optional[int] = None,
+        channel_name: Optional[str] = None,
+    ) -> bool:
+        report_ch = await self.find_report_channel(guild, channel_id=channel_id, channel_name=channel_name)
         if not report_ch:
             logger.info(
-                "[VoiceKeeper] Report channel not found name=%s guild=%s(%s)",
-                self.report_channel_name, guild.name, guild.id
+                "[VoiceKeeper] Report channel not found id=%s name=%s guild=%s(%s)",
+                channel_id, channel_name, guild.name, guild.id
             )
             return False
 
@@ -64,18 +142,19 @@ class VoiceKeeperService:
         reason: str,
         guild: discord.Guild,
         voice_channel: discord.abc.GuildChannel,
-        host: Optional[discord.Member],
-        kicked_count: int,
+        result: KickResult,
         report_sent: bool,
     ) -> None:
         # 犠牲者情報は出さない（人数のみ）
         logger.info(
-            "[VoiceKeeper] %s guild=%s(%s) vc=%s(%s) host=%s(%s) kicked=%s report_sent=%s",
+            "[VoiceKeeper] %s guild=%s(%s) vc=%s(%s) kicked=%s failed=%s skipped=%s passes=%s elapsed=%.2fs report_sent=%s",
             reason,
             guild.name, guild.id,
             getattr(voice_channel, "name", "?"), voice_channel.id,
-            (host.name if host else "None"),
-            (host.id if host else "None"),
-            kicked_count,
+            result.kicked_count,
+            len(result.failed),
+            len(result.skipped),
+            result.passes,
+            result.elapsed,
             report_sent,
         )
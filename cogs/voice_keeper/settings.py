@@ -0,0 +1,136 @@
+"""
+VoiceKeeper のサーバーごとの設定
+- config.py の VOICE_KEEPER_GUILDS（任意）から読み込む
+- 未設定の場合は従来どおり .env の TARGET_USER_ID などを全サーバー共通の設定として使う
+- on_voice_state_update から毎回引くため、guild_id -> GuildPolicy の辞書とホストIDの集合で O(1) に判定する
+
+書式（config.py の例）:
+    VOICE_KEEPER_GUILDS = {
+        "123456789012345678": {
+            "hosts": ["111111111111111111", "222222222222222222"],
+            "report_channel_id": "333333333333333333",
+            "timeout_seconds": 300,
+            "active_hours": [1, 6],                  # 複数なら [[1, 6], [22, 24]]
+            "weekdays": {"sat": [[0, 24]], "sun": []},  # 曜日ごとの差し替え（空リストは停止）
+            "holidays": {"2026-12-31": [[0, 24]]},     # 日付ごとの差し替え
+            "timezone": "Asia/Tokyo",
+            "channels": {
+                "444444444444444444": {"timeout_seconds": 600, "active_hours": [0, 24]},
+            },
+        },
+    }
+"""
+
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from common.time_utils import ActiveWindow
+
+WEEKDAY_NAMES = {"mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6}
+
+
+@dataclass(frozen=True)
+class ChannelPolicy:
+    timeout_seconds: int
+    window: ActiveWindow
+
+
+@dataclass(frozen=True)
+class GuildPolicy:
+    hosts: FrozenSet[int]
+    default: ChannelPolicy
+    report_channel_id: Optional[int] = None
+    report_channel_name: Optional[str] = None  # report_channel_id が無いときだけ名前で探す
+    channels: Dict[int, ChannelPolicy] = field(default_factory=dict)
+
+    def for_channel(self, channel_id: int) -> ChannelPolicy:
+        return self.channels.get(channel_id, self.default)
+
+
+class VoiceKeeperRegistry:
+    """guild_id -> GuildPolicy。default はどのサーバーにも当てはまる共通設定（.env の従来設定）"""
+
+    def __init__(self, guilds: Dict[int, GuildPolicy], default: Optional[GuildPolicy] = None):
+        self._guilds = guilds
+        self._default = default
+
+    def get(self, guild_id: int) -> Optional[GuildPolicy]:
+        return self._guilds.get(guild_id, self._default)
+
+    def is_host(self, guild_id: int, user_id: int) -> bool:
+        policy = self.get(guild_id)
+        return policy is not None and user_id in policy.hosts
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._guilds) or self._default is not None
+
+    def __len__(self) -> int:
+        return len(self._guilds)
+
+
+def _hours_list(value: Any) -> List[Tuple[int, int]]:
+    """[1, 6] と [[1, 6], [22, 24]] の両方を受け付ける"""
+    if len(value) == 2 and all(isinstance(v, int) for v in value):
+        return [(value[0], value[1])]
+    return [(int(a), int(b)) for a, b in value]
+
+def _window(raw: Dict[str, Any], base: ActiveWindow) -> ActiveWindow:
+    """稼働時間の項目が1つも無ければ base をそのまま使う（判定結果のキャッシュも共有する）"""
+    keys = ("active_hours", "weekdays", "holidays", "timezone")
+    if not any(k in raw for k in keys):
+        return base
+    weekdays = base.weekdays
+    if "weekdays" in raw:
+        weekdays = {}
+        for k, v in raw["weekdays"].items():
+            wd = WEEKDAY_NAMES.get(str(k).lower())
+            weekdays[int(k) if wd is None else wd] = _hours_list(v)
+    holidays = base.holidays
+    if "holidays" in raw:
+        holidays = {date.fromisoformat(str(k)): _hours_list(v) for k, v in raw["holidays"].items()}
+    return ActiveWindow(
+        _hours_list(raw["active_hours"]) if "active_hours" in raw else base.ranges,
+        ZoneInfo(raw["timezone"]) if raw.get("timezone") else base.tz,
+        weekdays=weekdays,
+        holidays=holidays,
+    )
+
+def _channel_policy(raw: Dict[str, Any], base: ChannelPolicy) -> ChannelPolicy:
+    return ChannelPolicy(int(raw.get("timeout_seconds", base.timeout_seconds)), _window(raw, base.window))
+
+def build_registry(
+    raw: Optional[Dict[Any, Dict[str, Any]]],
+    env_default: GuildPolicy,
+) -> Tuple[VoiceKeeperRegistry, List[str]]:
+    """
+    VOICE_KEEPER_GUILDS から registry を組み立てる。
+    - 未設定なら env_default（.env の従来設定）を全サーバー共通で使う（hosts が空なら無効）
+    - 設定があればそれだけを使い、省略した項目は env_default の値を引き継ぐ
+    - 読めないサーバー設定はスキップしてエラー一覧に入れる
+    """
+    if not raw:
+        return VoiceKeeperRegistry({}, env_default if env_default.hosts else None), []
+
+    guilds: Dict[int, GuildPolicy] = {}
+    errors: List[str] = []
+    for guild_id, entry in raw.items():
+        try:
+            hosts = frozenset(int(h) for h in entry.get("hosts", ()))
+            if not hosts:
+                raise ValueError("hosts is empty")
+            default = _channel_policy(entry, env_default.default)
+            channels = {int(cid): _channel_policy(c, default) for cid, c in (entry.get("channels") or {}).items()}
+            report_id = entry.get("report_channel_id")
+            guilds[int(guild_id)] = GuildPolicy(
+                hosts=hosts,
+                default=default,
+                report_channel_id=int(report_id) if report_id else None,
+                report_channel_name=entry.get("report_channel_name", env_default.report_channel_name),
+                channels=channels,
+            )
+        except (KeyError, ValueError, TypeError) as e:
+            errors.append(f"guild={guild_id}: {e}")
+    return VoiceKeeperRegistry(guilds), errors
@@ -1,14 +1,19 @@
-from datetime import datetime
+import time
+from datetime import date, datetime, timedelta, timezone
+from datetime import time as dtime
 from zoneinfo import ZoneInfo
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
 
-def is_active_time(start_hour: int, end_hour: int, tz: ZoneInfo) -> bool:
+Hours = Tuple[int, int]
+
+def is_active_time(start_hour: int, end_hour: int, tz: ZoneInfo, now: Optional[datetime] = None) -> bool:
     """
     稼働時間判定（深夜帯・日跨ぎ対応）
     - start_hour: 0〜24
     - end_hour: 0〜24（24は“24時”として扱う）
     判定は [start, end) の半開区間
     """
-    now = datetime.now(tz)
+    now = datetime.now(tz) if now is None else now.astimezone(tz)
     h = now.hour  # 0-23
 
     # 正規化（end=24 を保持）
@@ -35,3 +40,119 @@ def is_active_time(start_hour: int, end_hour: int, tz: ZoneInfo) -> bool:
     else:
         # 日跨ぎ（例: 22〜6）
         return (h >= start) or (h < end)
+
+
+def normalize_hours(start_hour: int, end_hour: int) -> Optional[Hours]:
+    """
+    is_active_time と同じ規則で (start, end) を正規化する
+    - 負の値は0、24を超える値は24で割った余り
+    - start==end と 0〜24 は全時間 (0, 24)
+    - start > end は日跨ぎ（start の日の start 時〜翌日の end 時）
+    - 24〜0 は一度も稼働しないので None
+    """
+    start, end = int(start_hour), int(end_hour)
+    start = 0 if start < 0 else (start % 24 if start > 24 else start)
+    end = 0 if end < 0 else (end % 24 if end > 24 else end)
+    if start == end or (start == 0 and end == 24):
+        return (0, 24)
+    if start == 24:
+        return (0, end) if end > 0 else None
+    return (start, end)
+
+# 次の切り替わりを探す範囲（日）と、判定結果を使い回す最大秒数（時計の補正に追従するため）
+_LOOKAHEAD_DAYS = 8
+_MAX_CACHE_SECONDS = 3600.0
+
+
+class ActiveWindow:
+    """
+    前もって組み立てた稼働時間帯。
+    - ranges: 毎日の時間帯（複数可）。weekdays（0=月曜）で曜日ごとに、holidays で日付ごとに差し替える（空リストなら終日停止）
+    - 日跨ぎの時間帯は開始した日の設定として扱う（例: 金曜の 22〜6 は土曜 6時まで）
+    - is_active() は次の切り替わり時刻までの結果を使い回し、通常は time.monotonic() の比較1回で返す
+    """
+
+    def __init__(
+        self,
+        ranges: Iterable[Sequence[int]] = ((0, 24),),
+        tz: ZoneInfo = ZoneInfo("Asia/Tokyo"),
+        *,
+        weekdays: Optional[Mapping[int, Iterable[Sequence[int]]]] = None,
+        holidays: Optional[Mapping[date, Iterable[Sequence[int]]]] = None,
+    ):
+        self.tz = tz
+        self.ranges: Tuple[Hours, ...] = self._compile(ranges)
+        self.weekdays: Dict[int, Tuple[Hours, ...]] = {}
+        for wd, rs in (weekdays or {}).items():
+            if not 0 <= int(wd) <= 6:
+                raise ValueError(f"weekday must be 0-6: {wd}")
+            self.weekdays[int(wd)] = self._compile(rs)
+        self.holidays: Dict[date, Tuple[Hours, ...]] = {d: self._compile(rs) for d, rs in (holidays or {}).items()}
+
+        self._active = False
+        self._valid_until = 0.0  # time.monotonic() がこの値になるまで _active を返す
+
+    @classmethod
+    def from_hours(cls, start_hour: int, end_hour: int, tz: ZoneInfo) -> "ActiveWindow":
+        """is_active_time(start_hour, end_hour, tz) と同じ判定をする窓"""
+        return cls([(start_hour, end_hour)], tz)
+
+    @staticmethod
+    def _compile(ranges: Iterable[Sequence[int]]) -> Tuple[Hours, ...]:
+        out = set()
+        for start, end in ranges:
+            hours = normalize_hours(start, end)
+            if hours is not None:
+                out.add(hours)
+        return tuple(sorted(out))
+
+    def ranges_for(self, day: date) -> Tuple[Hours, ...]:
+        if day in self.holidays:
+            return self.holidays[day]
+        return self.weekdays.get(day.weekday(), self.ranges)
+
+    def _local(self, day: date, hour: int) -> datetime:
+        if hour == 24:
+            day, hour = day + timedelta(days=1), 0
+        return datetime.combine(day, dtime(hour), tzinfo=self.tz).astimezone(timezone.utc)
+
+    def _spans(self, first: date, last: date) -> List[Tuple[datetime, datetime]]:
+        """first〜last に始まる時間帯を UTC の区間にして、重なり・隣接をまとめて返す"""
+        spans = []
+        day = first
+        while day <= last:
+            for start, end in self.ranges_for(day):
+                end_day = day + timedelta(days=1) if start >= end else day
+                spans.append((self._local(day, start), self._local(end_day, end)))
+            day += timedelta(days=1)
+        spans.sort()
+
+        merged: List[Tuple[datetime, datetime]] = []
+        for s, e in spans:
+            if merged and s <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+            else:
+                merged.append((s, e))
+        return merged
+
+    def evaluate(self, at: datetime) -> Tuple[bool, datetime]:
+        """at 時点で稼働中か、と次に状態が切り替わる時刻（UTC）を返す（キャッシュは使わない）"""
+        at = at.astimezone(timezone.utc)
+        today = at.astimezone(self.tz).date()
+        spans = self._spans(today - timedelta(days=1), today + timedelta(days=_LOOKAHEAD_DAYS))
+        for s, e in spans:
+            if e <= at:
+                continue
+            if s <= at:
+                return True, e
+            return False, s
+        # 先まで稼働予定が無い：探した範囲の終わりで見直す
+        return False, at + timedelta(days=_LOOKAHEAD_DAYS)
+
+    def is_active(self) -> bool:
+        if time.monotonic() < self._valid_until:
+            return self._active
+        now = datetime.now(timezone.utc)
+        self._active, until = self.evaluate(now)
+        self._valid_until = time.monotonic() + min((until - now).total_seconds(), _MAX_CACHE_SECONDS)
+        return self._active
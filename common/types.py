@@ -1,6 +1,36 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import List
 
 @dataclass(frozen=True)
 class WatchKey:
     guild_id: int
     channel_id: int  # ホストが抜けた元のVC
+
+@dataclass
+class PermissionSyncResult:
+    """チャンネル権限の同期結果（表示用のラベル文字列を保持）"""
+    updated: List[str] = field(default_factory=list)    # 上書きした
+    unchanged: List[str] = field(default_factory=list)  # 既に一致していたので API を呼ばなかった
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def api_calls_avoided(self) -> int:
+        return len(self.unchanged)
+
+    def merge(self, other: "PermissionSyncResult") -> None:
+        self.updated.extend(other.updated)
+        self.unchanged.extend(other.unchanged)
+        self.errors.extend(other.errors)
+
+@dataclass
+class KickResult:
+    """VC一括切断の結果（メンバーIDのみ保持）"""
+    kicked: List[int] = field(default_factory=list)
+    failed: List[int] = field(default_factory=list)
+    skipped: List[int] = field(default_factory=list)  # 切断前に自分で抜けた等
+    passes: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def kicked_count(self) -> int:
+        return len(self.kicked)
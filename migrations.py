@@ -0,0 +1,288 @@
+# migrations.py
+"""
+DBスキーマのバージョン管理
+- MIGRATIONS に (version, name, [SQL...]) を追記していく（番号は増やすだけで書き換えない）
+  データ移行が必要な場合は SQL の代わりに async 関数（カーソルを受け取る）を置ける
+- 適用済みの番号は schema_migrations テーブルに記録し、未適用分だけを順に実行する
+- bot.py（setup_hook）と webapp.py（before_serving）の起動時に実行される
+  同時起動に備えて GET_LOCK で排他する
+- MySQL/MariaDB の DDL は暗黙コミットされるため、各SQLは IF NOT EXISTS 付きで再実行しても安全にしておく
+
+使い方:
+    python migrations.py           # 未適用のマイグレーションを実行
+    python migrations.py status    # 適用状況を表示
+    python migrations.py explain   # ホットクエリの実行計画を確認（フルスキャンがあれば終了コード1）
+"""
+
+import sys
+import asyncio
+import logging
+from typing import Any, Dict, List, Tuple
+
+import aiomysql
+
+from services import answer_store
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = 'awaji_schema_migrations'
+
+MIGRATIONS: List[Tuple[int, str, List[Any]]] = [
+    (1, "baseline tables", [
+        """
+        CREATE TABLE IF NOT EXISTS surveys (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            owner_id VARCHAR(32) NOT NULL,
+            title VARCHAR(255),
+            questions LONGTEXT,
+            is_active BOOLEAN NOT NULL DEFAULT FALSE,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ) DEFAULT CHARSET=utf8mb4
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS survey_responses (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            survey_id INT NOT NULL,
+            user_id VARCHAR(32),
+            user_name VARCHAR(255),
+            answers LONGTEXT,
+            submitted_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ) DEFAULT CHARSET=utf8mb4
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS operation_logs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id VARCHAR(32),
+            user_name VARCHAR(255),
+            command VARCHAR(50),
+            detail TEXT,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ) DEFAULT CHARSET=utf8mb4
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS mute_logs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            trigger_name VARCHAR(50),
+            executed_at DATETIME,
+            status VARCHAR(20),
+            details TEXT
+        )
+        """,
+    ]),
+    (2, "survey aggregate store", [
+        """
+        CREATE TABLE IF NOT EXISTS survey_answer_counts (
+            survey_id INT NOT NULL,
+            q_idx INT NOT NULL,
+            answer VARCHAR(191) NOT NULL,
+            cnt INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (survey_id, q_idx, answer)
+        ) DEFAULT CHARSET=utf8mb4
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS survey_stats (
+            survey_id INT NOT NULL PRIMARY KEY,
+            response_count INT NOT NULL DEFAULT 0
+        ) DEFAULT CHARSET=utf8mb4
+        """,
+    ]),
+    (3, "survey_responses.submission_id", [
+        "ALTER TABLE survey_responses ADD COLUMN IF NOT EXISTS submission_id CHAR(32) NULL",
+        "ALTER TABLE survey_responses ADD UNIQUE INDEX IF NOT EXISTS uq_survey_responses_submission (submission_id)",
+    ]),
+    (4, "surveys.version", [
+        "ALTER TABLE surveys ADD COLUMN IF NOT EXISTS version INT NOT NULL DEFAULT 1",
+    ]),
+    (5, "indexes for hot queries", [
+        # ダッシュボード: WHERE owner_id=? ORDER BY created_at DESC, id DESC
+        "CREATE INDEX IF NOT EXISTS idx_surveys_owner_created ON surveys (owner_id, created_at, id)",
+        # /survey list: WHERE is_active=1 ORDER BY created_at DESC
+        "CREATE INDEX IF NOT EXISTS idx_surveys_active_created ON surveys (is_active, created_at, id)",
+        # 集計・CSV: WHERE survey_id=? ORDER BY submitted_at
+        "CREATE INDEX IF NOT EXISTS idx_responses_survey_submitted ON survey_responses (survey_id, submitted_at, id)",
+        # ダッシュボードの操作ログ: ORDER BY created_at DESC, id DESC
+        "CREATE INDEX IF NOT EXISTS idx_operation_logs_created ON operation_logs (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_mute_logs_executed ON mute_logs (executed_at)",
+    ]),
+    (6, "filter_rules", [
+        """
+        CREATE TABLE IF NOT EXISTS filter_rules (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            channel_id BIGINT NOT NULL,
+            rule_type VARCHAR(32) NOT NULL,
+            params TEXT,
+            enabled BOOLEAN NOT NULL DEFAULT TRUE,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ) DEFAULT CHARSET=utf8mb4
+        """,
+    ]),
+    (7, "voice_keeper_watches", [
+        # deadline は UTC
+        """
+        CREATE TABLE IF NOT EXISTS voice_keeper_watches (
+            guild_id BIGINT NOT NULL,
+            channel_id BIGINT NOT NULL,
+            deadline DATETIME NOT NULL,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (guild_id, channel_id)
+        ) DEFAULT CHARSET=utf8mb4
+        """,
+    ]),
+    (8, "normalized survey answers", [
+        # option_id は設問の options の添字。定義外の値と自由記述は survey_answer_texts へ
+        """
+        CREATE TABLE IF NOT EXISTS survey_answers (
+            survey_id INT NOT NULL,
+            response_id INT NOT NULL,
+            q_idx SMALLINT NOT NULL,
+            seq SMALLINT NOT NULL DEFAULT 0,
+            option_id SMALLINT NOT NULL,
+            PRIMARY KEY (survey_id, response_id, q_idx, seq),
+            INDEX idx_survey_answers_option (survey_id, q_idx, option_id)
+        ) DEFAULT CHARSET=utf8mb4
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS survey_answer_texts (
+            survey_id INT NOT NULL,
+            response_id INT NOT NULL,
+            q_idx SMALLINT NOT NULL,
+            seq SMALLINT NOT NULL DEFAULT 0,
+            body TEXT NOT NULL,
+            PRIMARY KEY (survey_id, response_id, q_idx, seq),
+            INDEX idx_survey_answer_texts_page (survey_id, q_idx, response_id, seq)
+        ) DEFAULT CHARSET=utf8mb4
+        """,
+        answer_store.backfill,
+    ]),
+    (9, "one response per user", [
+        "ALTER TABLE surveys ADD COLUMN IF NOT EXISTS one_response_per_user BOOLEAN NOT NULL DEFAULT FALSE",
+        # 1人1回答のアンケートだけ user_id を入れる（NULL は一意制約の対象外）
+        "ALTER TABLE survey_responses ADD COLUMN IF NOT EXISTS dedupe_user_id VARCHAR(32) NULL",
+        "ALTER TABLE survey_responses ADD UNIQUE INDEX IF NOT EXISTS uq_survey_responses_dedupe (survey_id, dedupe_user_id)",
+    ]),
+    (10, "operation logs per user", [
+        # ダッシュボードの操作ログ: WHERE user_id=? ORDER BY created_at DESC, id DESC
+        "CREATE INDEX IF NOT EXISTS idx_operation_logs_user_created ON operation_logs (user_id, created_at, id)",
+    ]),
+]
+
+# フルスキャンになってはいけないクエリ（explain コマンドで確認する）
+HOT_QUERIES: List[Tuple[str, str, tuple]] = [
+    ("dashboard surveys",
+     "SELECT id, title, is_active, created_at FROM surveys "
+     "WHERE owner_id = %s AND (created_at < %s OR (created_at = %s AND id < %s)) "
+     "ORDER BY created_at DESC, id DESC LIMIT 21", ('0', '2100-01-01', '2100-01-01', 0)),
+    ("active surveys",
+     "SELECT * FROM surveys WHERE is_active = 1 ORDER BY created_at DESC", ()),
+    ("my active surveys",
+     "SELECT * FROM surveys WHERE owner_id = %s AND is_active = 1 ORDER BY created_at DESC", ('0',)),
+    ("csv export",
+     "SELECT submitted_at, user_name, answers FROM survey_responses "
+     "WHERE survey_id = %s AND submitted_at >= %s ORDER BY submitted_at DESC", (0, '2000-01-01')),
+    ("free-text page",
+     "SELECT response_id, seq, body FROM survey_answer_texts "
+     "WHERE survey_id = %s AND q_idx = %s AND (response_id < %s OR (response_id = %s AND seq < %s)) "
+     "ORDER BY response_id DESC, seq DESC LIMIT 51", (0, 0, 2**31 - 1, 2**31 - 1, 0)),
+    ("operation logs",
+     "SELECT id, user_name, command, detail, created_at FROM operation_logs "
+     "WHERE user_id = %s AND (created_at < %s OR (created_at = %s AND id < %s)) "
+     "ORDER BY created_at DESC, id DESC LIMIT 31", ('0', '2100-01-01', '2100-01-01', 0)),
+    ("answer counts",
+     "SELECT q_idx, answer, cnt FROM survey_answer_counts WHERE survey_id = %s AND cnt > 0", (0,)),
+    ("option counts",
+     "SELECT q_idx, option_id, COUNT(*) FROM survey_answers WHERE survey_id = %s GROUP BY q_idx, option_id", (0,)),
+]
+
+
+async def migrate(pool) -> List[int]:
+    """未適用のマイグレーションを順に実行し、適用した番号のリストを返す"""
+    applied_now = []
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT GET_LOCK(%s, 60)", (LOCK_NAME,))
+            (locked,) = await cur.fetchone()
+            if locked != 1:
+                raise RuntimeError("could not acquire schema migration lock")
+            try:
+                await cur.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INT PRIMARY KEY,
+                        name VARCHAR(100) NOT NULL,
+                        applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+                    ) DEFAULT CHARSET=utf8mb4
+                """)
+                await cur.execute("SELECT version FROM schema_migrations")
+                applied = {row[0] for row in await cur.fetchall()}
+
+                for version, name, statements in MIGRATIONS:
+                    if version in applied:
+                        continue
+                    for sql in statements:
+                        if callable(sql):
+                            await sql(cur)
+                        else:
+                            await cur.execute(sql)
+                    await cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+                    applied_now.append(version)
+                    logger.info("[Migrate] applied %s: %s", version, name)
+            finally:
+                await cur.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+                await cur.fetchone()
+    return applied_now
+
+async def status(pool) -> List[Dict[str, Any]]:
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            try:
+                await cur.execute("SELECT version, applied_at FROM schema_migrations")
+                applied = {r['version']: r['applied_at'] for r in await cur.fetchall()}
+            except Exception:
+                applied = {}
+    return [{'version': v, 'name': n, 'applied_at': applied.get(v)} for v, n, _ in MIGRATIONS]
+
+async def explain_hot_queries(pool) -> List[Dict[str, Any]]:
+    """
+    ホットクエリを EXPLAIN し、type=ALL（フルスキャン）の行を返す。
+    データが数件しかないとオプティマイザがあえてフルスキャンを選ぶことがあるため、
+    本番相当のデータが入ったDBで実行すること。
+    """
+    problems = []
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            for label, sql, params in HOT_QUERIES:
+                await cur.execute("EXPLAIN " + sql, params)
+                for row in await cur.fetchall():
+                    if (row.get('type') or '').upper() == 'ALL':
+                        problems.append({'query': label, 'table': row.get('table'), 'possible_keys': row.get('possible_keys')})
+    return problems
+
+
+async def _main(command: str) -> int:
+    from dotenv import load_dotenv
+    from database import Database
+
+    load_dotenv()
+    db = Database(minsize=1, maxsize=1)
+    await db.connect()
+    try:
+        if command == 'status':
+            for m in await status(db):
+                print(f"{m['version']:>3}  {m['name']:<40} {m['applied_at'] or '(pending)'}")
+            return 0
+
+        if command == 'explain':
+            problems = await explain_hot_queries(db)
+            for p in problems:
+                print(f"FULL SCAN: {p['query']} (table={p['table']}, possible_keys={p['possible_keys']})")
+            print("OK: no full scans in hot queries." if not problems else f"NG: {len(problems)} full scan(s).")
+            return 1 if problems else 0
+
+        applied = await migrate(db)
+        print(f"Applied: {applied}" if applied else "Schema is up to date.")
+        return 0
+    finally:
+        await db.close()
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else 'migrate')))
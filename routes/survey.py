@@ -1,14 +1,21 @@
 from quart import Blueprint, render_template, request, redirect, url_for, session, flash, current_app
+import os
+import re
 import json
-from collections import Counter
+import math
 from utils import log_operation
-import csv
-import io
 from quart import make_response
+from services import analytics, answer_store, assets, csv_export, ingest, pubsub, survey_stats
 
 # Blueprintの定義
 survey_bp = Blueprint('survey', __name__)
 
+# フォームが送る idempotency_key（32桁の16進数。submission_id としてそのまま使う）
+_IDEMPOTENCY_KEY_RE = re.compile(r'[0-9a-f]{32}')
+
+_THANKS_HTML = "<h3>回答ありがとうございました！</h3><p>Your response has been recorded.</p>"
+_ANSWERED_HTML = "<h3>回答済みです</h3><p>このアンケートには1人1回まで回答できます。</p>"
+
 # ------------------------------------------------------------------
 #  ヘルパー関数
 # ------------------------------------------------------------------
@@ -33,6 +40,26 @@ def parse_questions(json_str):
     except:
         return []
 
+def _client_key(user):
+    """レート制限のキー（ログイン中はユーザーID、未ログインは送信元IP）"""
+    if user:
+        return f"user:{user['id']}"
+    header = current_app.config['CLIENT_IP_HEADER']
+    ip = request.headers.get(header, '').split(',')[0].strip() if header else ''
+    return f"ip:{ip or request.remote_addr}"
+
+def _question_types(questions):
+    return [q.get('type') for q in questions]
+
+def _form_etag(survey_id, version):
+    template_ver = assets.file_hash(os.path.join(current_app.root_path, current_app.template_folder, 'form.html'))
+    css_ver = assets.file_hash(os.path.join(current_app.static_folder, 'style.css'))
+    return f"form-{survey_id}-{version}-{template_ver}-{css_ver}"
+
+async def get_survey(survey_id):
+    """パース済みのアンケート定義をキャッシュ経由で取得する（無ければ None）"""
+    return await current_app.survey_cache.get(current_app.db_pool, int(survey_id))
+
 # ------------------------------------------------------------------
 #  ルート定義: 作成・編集・管理
 # ------------------------------------------------------------------
@@ -49,7 +76,7 @@ async def create_new():
             sql = "INSERT INTO surveys (owner_id, title, questions, is_active, created_at) VALUES (%s, '無題のアンケート', '[]', FALSE, NOW())"
             await cur.execute(sql, (user['id'],))
             new_id = cur.lastrowid
-            await log_operation(pool, user, "CREATE", f"ID:{new_id} を新規作成")
+            log_operation(current_app.log_sink, user, "CREATE", f"ID:{new_id} を新規作成")
 
     return redirect(url_for('survey.edit_survey', survey_id=new_id))
 
@@ -58,20 +85,13 @@ async def edit_survey(survey_id):
     user = session.get('discord_user')
     if not user: return redirect(url_for('login'))
 
-    pool = current_app.db_pool
-    async with pool.acquire() as conn:
-        async with conn.cursor(current_app.aiomysql.DictCursor) as cur:
-            await cur.execute("SELECT * FROM surveys WHERE id=%s", (survey_id,))
-            survey = await cur.fetchone()
+    cached = await get_survey(survey_id)
 
     # 所有権チェック
-    if not survey or str(survey['owner_id']) != str(user['id']):
+    if not cached or str(cached.survey['owner_id']) != str(user['id']):
         return "Forbidden: あなたのアンケートではありません", 403
 
-    # 安全にJSONパース
-    questions = parse_questions(survey['questions'])
-
-    return await render_template('edit.html', user=user, survey=survey, questions=questions)
+    return await render_template('edit.html', user=user, survey=cached.survey, questions=cached.questions)
 
 @survey_bp.route('/save_survey', methods=['POST'])
 async def save_survey():
@@ -82,17 +102,31 @@ async def save_survey():
     sid = form.get('survey_id')
     title = form.get('title')
     q_json = form.get('questions_json')
+    one_per_user = bool(form.get('one_response_per_user'))
 
     pool = current_app.db_pool
     async with pool.acquire() as conn:
         async with conn.cursor() as cur:
             # 所有権確認
-            await cur.execute("SELECT owner_id FROM surveys WHERE id=%s", (sid,))
+            await cur.execute("SELECT owner_id, questions FROM surveys WHERE id=%s", (sid,))
             row = await cur.fetchone()
             if not row or str(row[0]) != str(user['id']): return "Forbidden", 403
 
-            await cur.execute("UPDATE surveys SET title=%s, questions=%s WHERE id=%s", (title, q_json, sid))
-            await log_operation(pool, user, "UPDATE", f"ID:{sid} を更新")
+            await cur.execute(
+                "UPDATE surveys SET title=%s, questions=%s, one_response_per_user=%s, version=version+1 WHERE id=%s",
+                (title, q_json, one_per_user, sid)
+            )
+            log_operation(current_app.log_sink, user, "UPDATE", f"ID:{sid} を更新")
+    current_app.survey_cache.invalidate(int(sid))
+
+    new_questions = parse_questions(q_json)
+    old_questions = parse_questions(row[1])
+    # 選択肢の並び・タイプが変わると選択肢番号がずれるので、正規化テーブルを JSON から作り直す
+    if answer_store.layout(old_questions) != answer_store.layout(new_questions):
+        await answer_store.reencode(pool, int(sid), new_questions)
+    # 設問タイプが変わった場合は集計の前提が崩れるので作り直す
+    if _question_types(old_questions) != _question_types(new_questions):
+        await survey_stats.rebuild(pool, int(sid), new_questions)
 
     await flash("保存しました", "success")
     return redirect(url_for('index'))
@@ -109,8 +143,9 @@ async def toggle_status(survey_id):
             row = await cur.fetchone()
             if row and str(row['owner_id']) == str(user['id']):
                 new_status = not row['is_active']
-                await cur.execute("UPDATE surveys SET is_active=%s WHERE id=%s", (new_status, survey_id))
-                await log_operation(pool, user, "TOGGLE", f"ID:{survey_id} ステータス -> {new_status}")
+                await cur.execute("UPDATE surveys SET is_active=%s, version=version+1 WHERE id=%s", (new_status, survey_id))
+                log_operation(current_app.log_sink, user, "TOGGLE", f"ID:{survey_id} ステータス -> {new_status}")
+    current_app.survey_cache.invalidate(survey_id)
 
     return redirect(url_for('index'))
 
@@ -124,9 +159,20 @@ async def delete_survey(survey_id):
         async with conn.cursor(current_app.aiomysql.DictCursor) as cur:
             await cur.execute("SELECT owner_id FROM surveys WHERE id=%s", (survey_id,))
             row = await cur.fetchone()
-            if row and str(row['owner_id']) == str(user['id']):
-                await cur.execute("DELETE FROM surveys WHERE id=%s", (survey_id,))
-                await log_operation(pool, user, "DELETE", f"ID:{survey_id} を削除")
+        if row and str(row['owner_id']) == str(user['id']):
+            # アンケート・集計ストア・正規化テーブルをまとめて消す
+            await conn.begin()
+            try:
+                async with conn.cursor() as cur:
+                    await cur.execute("DELETE FROM surveys WHERE id=%s", (survey_id,))
+                    await survey_stats.delete_counts(cur, survey_id)
+                    await answer_store.delete_survey(cur, survey_id)
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+            log_operation(current_app.log_sink, user, "DELETE", f"ID:{survey_id} を削除")
+    current_app.survey_cache.invalidate(survey_id)
 
     return redirect(url_for('index'))
 
@@ -136,25 +182,64 @@ async def delete_survey(survey_id):
 
 @survey_bp.route('/form/<int:survey_id>')
 async def view_form(survey_id):
-    pool = current_app.db_pool
-    async with pool.acquire() as conn:
-        async with conn.cursor(current_app.aiomysql.DictCursor) as cur:
-            await cur.execute("SELECT * FROM surveys WHERE id=%s", (survey_id,))
-            survey = await cur.fetchone()
+    # 定常状態ではキャッシュから返るのでDBアクセスなし
+    cached = await get_survey(survey_id)
 
-    if not survey or not survey['is_active']:
+    if not cached or not cached.survey['is_active']:
         return "<h3>Not Found or Inactive</h3><p>このアンケートは現在受け付けていません。</p>", 404
 
-    # ここでもヘルパーを使って安全に読み込む
-    questions = parse_questions(survey['questions'])
-
-    return await render_template('form.html', survey=survey, questions=questions)
+    # ETag はアンケートの版とテンプレート/CSSの内容から決める（ワーカー間でも同じ値になる）
+    etag = _form_etag(survey_id, cached.version)
+    if request.if_none_match.contains(etag):
+        response = await make_response("", 304)
+    else:
+        key = (survey_id, cached.version)
+        html = current_app.form_page_cache.get(key)
+        if html is None:
+            html = await render_template('form.html', survey=cached.survey, questions=cached.questions)
+            current_app.form_page_cache[key] = html
+        response = await make_response(html)
+
+    response.set_etag(etag)
+    # キャッシュしてよいが、使う前に必ず再検証させる（公開停止をすぐ反映するため）
+    response.headers['Cache-Control'] = 'public, no-cache'
+    return response
 
 @survey_bp.route('/submit_response', methods=['POST'])
 async def submit_response():
     form = await request.form
     survey_id = form.get('survey_id')
+    if not survey_id or not survey_id.isdigit():
+        return "Bad Request", 400
     user = session.get('discord_user')
+
+    # ここから DB に触れるまでの判定はすべてメモリ上で行う（連投でDBを埋めさせない）
+    # ダブルクリック・再送は同じ idempotency_key で届くので、受付済みなら同じ応答を返す
+    submission_id = form.get('idempotency_key', '').lower()
+    if not _IDEMPOTENCY_KEY_RE.fullmatch(submission_id):
+        submission_id = None
+    elif submission_id in current_app.submitted_keys:
+        return _THANKS_HTML
+    else:
+        # 判定から登録までの間に await を挟まない（処理中に届いた再送もここで弾く）。受け付けなかったら外す
+        # ワーカーをまたぐ再送・TTL 切れの再送は ingest.write_records が submission_id で除く
+        current_app.submitted_keys[submission_id] = True
+
+    accepted = False
+    try:
+        accepted, response = await _accept_response(form, user, int(survey_id), submission_id)
+    finally:
+        if submission_id and not accepted:
+            current_app.submitted_keys.pop(submission_id, None)
+    return response
+
+async def _accept_response(form, user, survey_id, submission_id):
+    """回答を受け付ける。(受け付けたか, 応答) を返す"""
+    retry_after = current_app.submit_limiter.acquire(_client_key(user))
+    if retry_after is not None:
+        response = await make_response("<h3>送信が多すぎます</h3><p>しばらく待ってから再度送信してください。</p>", 429)
+        response.headers['Retry-After'] = str(math.ceil(retry_after))
+        return False, response
     
     # ユーザー情報（未ログインならGuest）
     u_id = user['id'] if user else None
@@ -164,7 +249,8 @@ async def submit_response():
     for key in form:
         # q_0, q_1... を取得（_otherは除外）
         if key.startswith('q_') and not key.endswith('_other'):
-            q_idx = key.split('_')[1]
+            # チェックボックスは q_0[] の形で届くので末尾の [] を外す
+            q_idx = key.split('_')[1].removesuffix('[]')
             val = form.getlist(key) if key.endswith('[]') else form.get(key)
             
             # 「その他」の処理ロジック
@@ -181,117 +267,186 @@ async def submit_response():
             
             answers[q_idx] = val
 
-    pool = current_app.db_pool
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(
-                "INSERT INTO survey_responses (survey_id, user_id, user_name, answers, submitted_at) VALUES (%s, %s, %s, %s, NOW())",
-                (survey_id, u_id, u_name, json.dumps(answers, ensure_ascii=False))
-            )
+    cached = await get_survey(survey_id)
+    if not cached or not cached.survey['is_active']:
+        return False, ("<h3>Not Found or Inactive</h3><p>このアンケートは現在受け付けていません。</p>", 404)
+
+    one_per_user = bool(cached.survey.get('one_response_per_user'))
+    if one_per_user:
+        if not u_id:
+            return False, ("<h3>ログインが必要です</h3><p>このアンケートは1人1回答のため、ログインしてから回答してください。</p>", 401)
+        if (survey_id, u_id) in current_app.answered_users:
+            return False, (_ANSWERED_HTML, 409)
+
+    # 集計ストアへ加算する差分もここで計算しておく
+    counts = survey_stats.count_choices(cached.questions, answers)
+    record = ingest.new_record(survey_id, u_id, u_name, answers, counts, cached.questions,
+                               submission_id=submission_id, one_per_user=one_per_user, version=cached.version)
+
+    if current_app.config['SURVEY_INGEST_MODE'] != 'queue':
+        try:
+            async with current_app.db_pool.acquire() as conn:
+                written = await ingest.write_records(conn, [record])
+        except current_app.aiomysql.IntegrityError:
+            # 別ワーカーで同時に受け付けた同じ submission_id / 同じユーザーの回答
+            written = []
+        current_app.results_hub.publish_records(written)
+        if not written and one_per_user:
+            current_app.answered_users[(survey_id, u_id)] = True
+            return False, (_ANSWERED_HTML, 409)
+        if not written:
+            # 書き込み時に公開停止が分かった（別ワーカーで停止され、このワーカーのキャッシュが古かった）か、
+            # 受付済みの再送。キャッシュを捨てて読み直し、どちらかを見分ける
+            current_app.survey_cache.invalidate(survey_id)
+            cached = await get_survey(survey_id)
+            if not cached or not cached.survey['is_active']:
+                return False, ("<h3>Not Found or Inactive</h3><p>このアンケートは現在受け付けていません。</p>", 404)
+    else:
+        # キューモード: ジャーナルに書いた時点で受付完了とし、DB書き込みはまとめて後で行う
+        # （書き込み済みの submission_id・1人1回答の重複は writer が書き込み時に除く）
+        try:
+            await current_app.ingestor.submit(record)
+        except ingest.IngestBusy:
+            return False, ("<h3>ただいま混み合っています</h3><p>少し時間をおいてから再度送信してください。</p>", 503)
 
-    return "<h3>回答ありがとうございました！</h3><p>Your response has been recorded.</p>"
+    if one_per_user:
+        current_app.answered_users[(survey_id, u_id)] = True
+    return True, _THANKS_HTML
 
 @survey_bp.route('/results/<int:survey_id>')
 async def view_results(survey_id):
     user = session.get('discord_user')
     if not user: return redirect(url_for('login'))
 
+    # アンケート取得
+    cached = await get_survey(survey_id)
+    if not cached or str(cached.survey['owner_id']) != str(user['id']): return "Forbidden", 403
+
     pool = current_app.db_pool
     async with pool.acquire() as conn:
         async with conn.cursor(current_app.aiomysql.DictCursor) as cur:
-            # アンケート取得
-            await cur.execute("SELECT * FROM surveys WHERE id=%s", (survey_id,))
-            survey = await cur.fetchone()
-            if not survey or str(survey['owner_id']) != str(user['id']): return "Forbidden", 403
-            
-            # 回答取得
-            await cur.execute("SELECT * FROM survey_responses WHERE survey_id=%s ORDER BY submitted_at DESC", (survey_id,))
-            responses = await cur.fetchall()
+            # 集計ストアから読むだけ（回答の全件走査はしない）
+            stats, response_count = await survey_stats.load_stats(cur, survey_id, cached.questions)
 
-    # 質問データの安全な読み込み
-    questions = parse_questions(survey['questions'])
+    return await render_template('results.html', survey=cached.survey, stats=stats, response_count=response_count)
 
-    # 集計ロジック
-    stats = {}
-    for i, q in enumerate(questions):
-        q_idx = str(i)
-        
-        # .get() で安全に取得（これがクラッシュ防止の肝）
-        q_text = q.get('text', '(無題の質問)')
-        q_type = q.get('type', 'text')
+@survey_bp.route('/results/<int:survey_id>/texts/<int:q_idx>')
+async def view_texts(survey_id, q_idx):
+    """自由記述の続きを JSON で返す（結果ページの「さらに表示」用）"""
+    user = session.get('discord_user')
+    if not user: return {"error": "login required"}, 401
 
-        stats[q_idx] = {'question': q_text, 'type': q_type, 'data': [], 'total': 0}
+    cached = await get_survey(survey_id)
+    if not cached or str(cached.survey['owner_id']) != str(user['id']): return {"error": "forbidden"}, 403
 
-        raw_values = []
-        for r in responses:
-            try:
-                ans_json = json.loads(r['answers'])
-            except:
-                continue # JSON壊れてたらスキップ
-                
-            val = ans_json.get(q_idx)
-            if val:
-                if isinstance(val, list): raw_values.extend(val)
-                else: raw_values.append(val)
-
-        stats[q_idx]['total'] = len(raw_values)
-        
-        if q_type in ['radio', 'checkbox', 'select']:
-            stats[q_idx]['counts'] = dict(Counter(raw_values))
-        else:
-            stats[q_idx]['texts'] = raw_values
+    pool = current_app.db_pool
+    async with pool.acquire() as conn:
+        async with conn.cursor(current_app.aiomysql.DictCursor) as cur:
+            texts, next_cursor = await survey_stats.fetch_texts(cur, survey_id, q_idx, request.args.get('cursor'))
+
+    return {"texts": texts, "next_cursor": next_cursor}
 
-    return await render_template('results.html', survey=survey, stats=stats, response_count=len(responses))
+@survey_bp.route('/results/<int:survey_id>/stream')
+async def stream_results(survey_id):
+    """
+    結果ページのライブ更新（Server-Sent Events）。
+    接続時に現在の票数（snapshot）を1回送り、以降は回答が書き込まれるたびに差分（delta）を送る。
+    """
+    user = session.get('discord_user')
+    if not user: return {"error": "login required"}, 401
+
+    cached = await get_survey(survey_id)
+    if not cached or str(cached.survey['owner_id']) != str(user['id']): return {"error": "forbidden"}, 403
+
+    hub = current_app.results_hub
+    try:
+        sub = hub.subscribe(survey_id)
+    except pubsub.HubFull:
+        return {"error": "too many streams"}, 503
+
+    pool = current_app.db_pool
+    questions = cached.questions
+    dict_cursor = current_app.aiomysql.DictCursor
+
+    async def events():
+        try:
+            # 購読を始めてから現在値を読む（その間に書き込まれた回答は二重に数えることがあるが、再接続で直る）
+            async with pool.acquire() as conn:
+                async with conn.cursor(dict_cursor) as cur:
+                    counts, response_count = await survey_stats.load_counts(cur, survey_id, questions)
+            yield pubsub.format_event('snapshot', {
+                'responses': response_count,
+                'counts': {str(i): list(c.items()) for i, c in counts.items()},
+            })
+            while not sub.closed:
+                delta = await sub.next(hub.heartbeat)
+                if delta is not None:
+                    yield pubsub.format_event('delta', delta)
+                elif not sub.closed:
+                    yield pubsub.HEARTBEAT
+        finally:
+            hub.unsubscribe(sub)
+
+    response = await make_response(events())
+    response.timeout = None  # 閲覧中はつなぎっぱなし（切断は heartbeat と reaper で検出する）
+    response.headers["Content-Type"] = "text/event-stream"
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # リバースプロキシでバッファさせない
+    return response
+
+@survey_bp.route('/results/<int:survey_id>/analytics')
+async def view_analytics(survey_id):
+    """
+    票数・割合・クロス集計・回答数の推移を JSON で返す。
+    ?cross=1,2（Q番号2つ） / ?freq=H|D|W|M / ?since=2026-01-01
+    """
+    user = session.get('discord_user')
+    if not user: return {"error": "login required"}, 401
+
+    cached = await get_survey(survey_id)
+    if not cached or str(cached.survey['owner_id']) != str(user['id']): return {"error": "forbidden"}, 403
+
+    questions = cached.questions
+    freq = request.args.get('freq', 'D').upper()
+    try:
+        since = csv_export.parse_since(request.args.get('since'))
+        cross = None
+        if request.args.get('cross'):
+            cross = tuple(csv_export.parse_columns(request.args.get('cross'), len(questions)))
+            if len(cross) != 2:
+                raise ValueError("cross needs two questions")
+            if cross[0] == cross[1]:
+                raise ValueError("cross needs two different questions")
+        if freq not in analytics.FREQS:
+            raise ValueError(f"unknown freq: {freq}")
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    # 読み出しながら pandas の処理をスレッドで行う（集計中も他のリクエストを止めない）
+    return await analytics.analyze_survey(current_app.db_pool, survey_id, questions, since=since, cross=cross, freq=freq)
 
 @survey_bp.route('/download_csv/<int:survey_id>')
 async def download_csv(survey_id):
     user = session.get('discord_user')
     if not user: return redirect(url_for('login'))
 
+    # アンケート情報取得
+    cached = await get_survey(survey_id)
+    if not cached or str(cached.survey['owner_id']) != str(user['id']): return "Forbidden", 403
+
     pool = current_app.db_pool
-    async with pool.acquire() as conn:
-        async with conn.cursor(current_app.aiomysql.DictCursor) as cur:
-            # アンケート情報取得
-            await cur.execute("SELECT * FROM surveys WHERE id=%s", (survey_id,))
-            survey = await cur.fetchone()
-            if not survey or str(survey['owner_id']) != str(user['id']): return "Forbidden", 403
-            
-            # 全回答取得
-            await cur.execute("SELECT * FROM survey_responses WHERE survey_id=%s ORDER BY submitted_at DESC", (survey_id,))
-            responses = await cur.fetchall()
-
-    # 質問定義をパース（ヘルパー関数を使用）
-    questions = parse_questions(survey['questions'])
-
-    # CSVデータをメモリ上で作成
-    si = io.StringIO()
-    writer = csv.writer(si)
-
-    # 1行目: ヘッダー
-    header = ['回答日時', '回答者']
-    for i, q in enumerate(questions):
-        q_text = q.get('text', f'Q{i+1}')
-        header.append(f"Q{i+1}: {q_text}")
-    writer.writerow(header)
-
-    # 2行目以降: データ
-    for r in responses:
-        row = [str(r['submitted_at']), r['user_name']]
-        try:
-            ans_json = json.loads(r['answers'])
-        except:
-            ans_json = {}
-
-        for i in range(len(questions)):
-            val = ans_json.get(str(i), '')
-            if isinstance(val, list):
-                val = ", ".join(val)
-            row.append(val)
-        
-        writer.writerow(row)
+    questions = cached.questions
 
-    # レスポンス作成 (★ここを修正: await を追加！)
-    output = await make_response(si.getvalue())
+    # 部分出力: ?since=2026-01-01 / ?columns=1,3
+    try:
+        since = csv_export.parse_since(request.args.get('since'))
+        columns = csv_export.parse_columns(request.args.get('columns'), len(questions))
+    except ValueError:
+        return "Bad Request: since / columns の指定が不正です", 400
+
+    # 回答はバッチ単位で読みながらチャンクで送り出す（全件をメモリに載せない）
+    output = await make_response(csv_export.stream_csv(pool, survey_id, questions, columns, since))
+    output.timeout = None  # 大きなアンケートでも途中で打ち切られないように
     output.headers["Content-Disposition"] = f"attachment; filename=survey_{survey_id:03}_results.csv"
     output.headers["Content-Type"] = "text/csv; charset=utf-8-sig"
     return output
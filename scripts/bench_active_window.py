@@ -0,0 +1,79 @@
+"""
+稼働時間判定のベンチマーク
+- 従来: is_active_time（呼ぶたびに datetime.now(tz) と境界の正規化）
+- 新方式: ActiveWindow.is_active（次の切り替わりまで結果を使い回す）
+
+--check を付けると、ランダムな時刻で ActiveWindow.evaluate が is_active_time と一致するか、
+返した切り替わり時刻の直前・直後で状態が正しく変わるかを確認する
+（日跨ぎ、start==end、end=24、範囲外の値、夏時間のあるタイムゾーンを含む）。
+境界の時刻を網羅した同じ確認は tests/test_active_window.py にもある（pytest で実行される）。
+
+使い方:
+    python scripts/bench_active_window.py -n 1000000
+    python scripts/bench_active_window.py --check --samples 200000
+"""
+
+import os
+import sys
+import random
+import timeit
+import argparse
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.time_utils import ActiveWindow, is_active_time
+
+TIMEZONES = ["Asia/Tokyo", "America/New_York", "Europe/London"]
+
+
+def bench(n: int) -> None:
+    tz = ZoneInfo("Asia/Tokyo")
+    window = ActiveWindow.from_hours(1, 6, tz)
+    window.is_active()  # 初回の組み立てを除く
+
+    legacy = timeit.timeit(lambda: is_active_time(1, 6, tz), number=n)
+    cached = timeit.timeit(window.is_active, number=n)
+    print(f"is_active_time        {legacy / n * 1e9:8.1f} ns/call")
+    print(f"ActiveWindow.is_active {cached / n * 1e9:7.1f} ns/call  (x{legacy / cached:.1f})")
+
+
+def check(samples: int, seed: int) -> int:
+    rng = random.Random(seed)
+    base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    failures = 0
+    for i in range(samples):
+        tz = ZoneInfo(rng.choice(TIMEZONES))
+        start, end = rng.randint(-2, 27), rng.randint(-2, 27)
+        window = ActiveWindow.from_hours(start, end, tz)
+        at = base + timedelta(seconds=rng.randrange(0, 400 * 86400))
+
+        active, until = window.evaluate(at)
+        ok = active == is_active_time(start, end, tz, at) and until > at
+        ok = ok and window.evaluate(until - timedelta(seconds=1))[0] == active
+        if until - at < timedelta(days=7):  # 全時間稼働・停止でなければ切り替わる
+            ok = ok and window.evaluate(until)[0] != active
+        if not ok:
+            failures += 1
+            if failures <= 10:
+                print(f"NG tz={tz.key} start={start} end={end} at={at.isoformat()} -> active={active} until={until.isoformat()}")
+    print(f"checked {samples} samples, failures={failures}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=1_000_000)
+    parser.add_argument('--check', action='store_true')
+    parser.add_argument('--samples', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(1 if check(args.samples, args.seed) else 0)
+    bench(args.number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+結果集計のベンチマーク（DB には接続しない）
+
+合成した N 件の回答（選択式・チェックボックス・自由記述）について、
+- 従来: 設問ごとに全回答の JSON を読み直して Counter で数えるループ（変更前の view_results）
+- 新方式: services.analytics.analyze（DataFrame を1回作って列演算で集計）
+の所要時間を比較し、両者の票数が一致することを確認する。
+新方式はクロス集計と日別の回答数の推移も含めた時間。
+
+使い方:
+    python scripts/bench_analytics.py -n 100000
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import analytics
+
+QUESTIONS = [
+    {'text': '参加頻度', 'type': 'radio', 'options': ['毎日', '週数回', '週1', 'たまに']},
+    {'text': '好きな企画', 'type': 'checkbox', 'options': ['雑談', 'ゲーム', '作業', '歌', '企画']},
+    {'text': '地域', 'type': 'select', 'options': ['北海道', '関東', '関西', '四国', '九州', '海外']},
+    {'text': 'ひとこと', 'type': 'text', 'options': []},
+    {'text': '満足度', 'type': 'radio', 'options': ['1', '2', '3', '4', '5']},
+]
+
+
+def synthesize(n: int, seed: int):
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    rows = []
+    for _ in range(n):
+        answers = {}
+        for i, q in enumerate(QUESTIONS):
+            if rng.random() < 0.1:
+                continue  # 未回答
+            if q['type'] == 'checkbox':
+                answers[str(i)] = rng.sample(q['options'], rng.randint(1, 3))
+            elif q['type'] == 'text':
+                answers[str(i)] = f"コメント{rng.randint(0, 999)}"
+            else:
+                answers[str(i)] = rng.choice(q['options'])
+        rows.append((start + timedelta(seconds=rng.randrange(0, 90 * 86400)), json.dumps(answers, ensure_ascii=False)))
+    return rows
+
+
+def legacy_stats(rows, questions):
+    """変更前の view_results の集計ループ"""
+    stats = {}
+    for i, q in enumerate(questions):
+        q_idx = str(i)
+        raw_values = []
+        for _, raw in rows:
+            try:
+                ans_json = json.loads(raw)
+            except Exception:
+                continue
+            val = ans_json.get(q_idx)
+            if val:
+                if isinstance(val, list):
+                    raw_values.extend(val)
+                else:
+                    raw_values.append(val)
+        if q.get('type') in ['radio', 'checkbox', 'select']:
+            stats[q_idx] = dict(Counter(raw_values))
+        else:
+            stats[q_idx] = len(raw_values)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--responses', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rows = synthesize(args.responses, args.seed)
+    print(f"responses={len(rows)} questions={len(QUESTIONS)}")
+
+    t0 = time.perf_counter()
+    legacy = legacy_stats(rows, QUESTIONS)
+    t_legacy = time.perf_counter() - t0
+
+    analytics.build_frame(rows[:10], len(QUESTIONS))  # pandas の import を計測から除く
+    t0 = time.perf_counter()
+    df = analytics.build_frame(rows, len(QUESTIONS))
+    t_frame = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    counts = {str(i): analytics.question_counts(df, i) for i, q in enumerate(QUESTIONS) if q['type'] != 'text'}
+    t_counts = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    analytics.crosstab(df, 0, 1)
+    analytics.timeline(df, 'D')
+    t_extra = time.perf_counter() - t0
+
+    for q_idx, c in counts.items():
+        got = {a['answer']: a['count'] for a in c['answers']}
+        assert got == legacy[q_idx], f"mismatch in q_{q_idx}"
+
+    print(f"legacy loop        {t_legacy:7.2f}s")
+    print(f"analytics frame    {t_frame:7.2f}s  (JSON 解析を含む、1回だけ)")
+    print(f"analytics counts   {t_counts:7.2f}s")
+    print(f"crosstab+timeline  {t_extra:7.2f}s")
+    print(f"speedup (frame+counts vs legacy): x{t_legacy / (t_frame + t_counts):.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+FilterCog の削除処理のベンチマーク（Discord には接続しない）
+
+レート制限付きの偽 HTTP 層の上で、荒らしを想定して短時間に N 件の違反メッセージを流し、
+- 従来: on_message ごとに message.delete()
+- 新方式: DeletionPipeline（チャンネルごとにまとめて delete_messages）
+の API 呼び出し回数と、最後のメッセージが消えるまでの時間を比較する。
+
+使い方:
+    python scripts/bench_filter_delete.py -n 300 --burst 3
+    python scripts/bench_filter_delete.py -n 300 --single-rate 5 --bulk-rate 1 --latency 0.05
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+
+from cogs.filter.services import DeletionPipeline
+
+
+class RouteBucket:
+    """1ルート分のレート制限（rate 回/秒）。超えた呼び出しは空きが出るまで待たされる"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class FakeAPI:
+    def __init__(self, single_rate: float, bulk_rate: float, latency: float):
+        self.single = RouteBucket(single_rate)
+        self.bulk = RouteBucket(bulk_rate)
+        self.latency = latency
+        self.calls = {'single': 0, 'bulk': 0}
+        self.deleted = 0
+        self.last_delete = 0.0
+
+    async def call(self, route: str, count: int):
+        await (self.single if route == 'single' else self.bulk).acquire()
+        await asyncio.sleep(self.latency)
+        self.calls[route] += 1
+        self.deleted += count
+        self.last_delete = time.monotonic()
+
+
+class FakeChannel:
+    def __init__(self, api: FakeAPI, channel_id: int = 1):
+        self.api = api
+        self.id = channel_id
+        self.name = "code"
+
+    async def delete_messages(self, messages, *, reason=None):
+        await self.api.call('bulk', len(messages))
+
+
+class FakeMessage:
+    def __init__(self, channel: FakeChannel, message_id: int, created_at: datetime.datetime):
+        self.channel = channel
+        self.id = message_id
+        self.created_at = created_at
+
+    async def delete(self):
+        await self.channel.api.call('single', 1)
+
+
+async def run(mode: str, args) -> None:
+    api = FakeAPI(args.single_rate, args.bulk_rate, args.latency)
+    channel = FakeChannel(api)
+    pipeline = DeletionPipeline(window=args.window)
+    now = discord.utils.utcnow()
+    tasks = []
+
+    t0 = time.monotonic()
+    gap = args.burst / args.messages
+    for i in range(args.messages):
+        msg = FakeMessage(channel, i, now)
+        if mode == 'sequential':
+            # 従来の on_message: イベントごとに1件ずつ削除を待つ
+            tasks.append(asyncio.create_task(msg.delete()))
+        else:
+            pipeline.submit(msg)
+        await asyncio.sleep(gap)
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    while api.deleted < args.messages:
+        await asyncio.sleep(0.01)
+
+    calls = api.calls['single'] + api.calls['bulk']
+    print(f"{mode:<10} api_calls={calls:>4} (single={api.calls['single']}, bulk={api.calls['bulk']}) "
+          f"all_deleted_after={api.last_delete - t0:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--messages', type=int, default=300)
+    parser.add_argument('--burst', type=float, default=3.0, help='N 件を流し込む秒数')
+    parser.add_argument('--single-rate', type=float, default=5.0, help='単体削除のレート制限（回/秒）')
+    parser.add_argument('--bulk-rate', type=float, default=1.0, help='一括削除のレート制限（回/秒）')
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--window', type=float, default=1.0, help='DeletionPipeline のまとめ時間（秒）')
+    args = parser.parse_args()
+
+    print(f"messages={args.messages} burst={args.burst}s single_rate={args.single_rate}/s "
+          f"bulk_rate={args.bulk_rate}/s latency={args.latency * 1000:.0f}ms")
+    asyncio.run(run('sequential', args))
+    asyncio.run(run('pipeline', args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+OAuth /callback のイベントループ遅延ベンチマーク
+
+モックの Discord API（aiohttp.web, 応答遅延つき）を立てて、
+- 旧実装: requests による同期呼び出し x3（ループをブロック）
+- 新実装: DiscordOAuthClient（aiohttp, ギルド/ユーザー取得を並行）
+で N 件のログインを同時に流し、その間のイベントループ遅延を測る。
+
+使い方:
+    python scripts/bench_oauth_callback.py --logins 20 --latency 0.15
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+
+import requests
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.discord_oauth import DiscordOAuthClient  # noqa: E402
+
+
+def make_mock_discord(latency: float) -> web.Application:
+    async def token(request):
+        await asyncio.sleep(latency)
+        return web.json_response({'access_token': 'dummy'})
+
+    async def guilds(request):
+        await asyncio.sleep(latency)
+        return web.json_response([{'id': '1'}])
+
+    async def me(request):
+        await asyncio.sleep(latency)
+        return web.json_response({'id': '42', 'username': 'bench', 'avatar': 'x'})
+
+    app = web.Application()
+    app.router.add_post('/oauth2/token', token)
+    app.router.add_get('/users/@me/guilds', guilds)
+    app.router.add_get('/users/@me', me)
+    return app
+
+
+async def measure_lag(stop: asyncio.Event, samples: list, interval: float = 0.01):
+    """interval ごとに起きて、予定より何秒遅れたかを記録する"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        t0 = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - t0 - interval)
+
+
+async def login_blocking(base: str):
+    # 旧 webapp.callback と同じ呼び出し方（async ハンドラ内で同期 I/O）
+    r = requests.post(f'{base}/oauth2/token', data={'code': 'x'})
+    auth = {'Authorization': f"Bearer {r.json()['access_token']}"}
+    requests.get(f'{base}/users/@me/guilds', headers=auth)
+    requests.get(f'{base}/users/@me', headers=auth)
+
+
+async def login_async(client: DiscordOAuthClient):
+    _, token = await client.exchange_code('x', 'id', 'secret', 'uri')
+    await asyncio.gather(client.get_guilds(token['access_token']), client.get_user(token['access_token']))
+
+
+async def run_case(name: str, make_login, logins: int):
+    samples: list = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_lag(stop, samples))
+    t0 = time.perf_counter()
+    await asyncio.gather(*(make_login() for _ in range(logins)))
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await lag_task
+
+    samples.sort()
+    p99 = samples[int(len(samples) * 0.99) - 1] if samples else 0.0
+    print(f"{name:10s} logins={logins} wall={elapsed:.3f}s "
+          f"loop_lag p50={statistics.median(samples or [0]) * 1000:.1f}ms "
+          f"p99={p99 * 1000:.1f}ms max={max(samples or [0]) * 1000:.1f}ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.15, help='モックAPIの応答遅延（秒）')
+    parser.add_argument('--port', type=int, default=18080)
+    args = parser.parse_args()
+
+    # モックは別スレッドのループで動かす（同期 requests がメインループを止めても応答できるように）
+    ready = threading.Event()
+    mock_loop = asyncio.new_event_loop()
+
+    def serve():
+        asyncio.set_event_loop(mock_loop)
+        runner = web.AppRunner(make_mock_discord(args.latency))
+        mock_loop.run_until_complete(runner.setup())
+        mock_loop.run_until_complete(web.TCPSite(runner, '127.0.0.1', args.port).start())
+        ready.set()
+        mock_loop.run_forever()
+
+    threading.Thread(target=serve, daemon=True).start()
+    ready.wait()
+    base = f'http://127.0.0.1:{args.port}'
+
+    await run_case('blocking', lambda: login_blocking(base), args.logins)
+
+    client = DiscordOAuthClient(api_base=base)
+    await client.start()
+    try:
+        await run_case('aiohttp', lambda: login_async(client), args.logins)
+    finally:
+        await client.close()
+        mock_loop.call_soon_threadsafe(mock_loop.stop)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,158 @@
+"""
+VoiceKeeper の一括切断のベンチマーク（Discord には接続しない）
+
+偽の VC（N 人）とレート制限付きの偽 move_to の上で、
+- 従来: 1人ずつ順番に move_to(None)
+- 新方式: VoiceKeeperService.kick_all_non_bots（並行 + 2パス目）
+の所要時間と、切断中に入り直したメンバーの取りこぼしを比較する。
+429 は discord.py の HTTP クライアントと同じく、Retry-After だけ待って再試行する（5回まで）。
+
+使い方:
+    python scripts/bench_voice_kick.py -n 25
+    python scripts/bench_voice_kick.py -n 40 --rate 10 --latency 0.15 --rejoin 3
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+
+from cogs.voice_keeper.services import VoiceKeeperService
+
+
+class RateLimitedAPI:
+    """
+    1秒あたり rate 回まで受け付け、超えたら 429 を返す偽 API（固定ウィンドウ）。
+    応答には latency 秒かかる。429 は discord.py と同じく Retry-After 待って再試行し、
+    max_tries 回とも 429 なら HTTPException を送出する。
+    """
+    max_tries = 5
+
+    def __init__(self, rate: int, latency: float):
+        self.rate = rate
+        self.latency = latency
+        self.window_start = time.monotonic()
+        self.count = 0
+        self.calls = 0
+        self.rate_limited = 0
+
+    async def request(self):
+        for attempt in range(self.max_tries):
+            await asyncio.sleep(self.latency)
+            self.calls += 1
+            now = time.monotonic()
+            if now - self.window_start >= 1.0:
+                self.window_start, self.count = now, 0
+            self.count += 1
+            if self.count <= self.rate:
+                return
+            self.rate_limited += 1
+            retry_after = max(1.0 - (now - self.window_start), 0.05)
+            if attempt + 1 < self.max_tries:
+                await asyncio.sleep(retry_after)
+        resp = SimpleNamespace(status=429, reason="Too Many Requests", headers={"Retry-After": f"{retry_after:.3f}"})
+        raise discord.HTTPException(resp, {"message": "You are being rate limited.", "code": 0})
+
+
+class FakeVoiceChannel(discord.VoiceChannel):
+    def __init__(self, channel_id: int = 1):  # 親の __init__ は呼ばない
+        self.id = channel_id
+        self.name = "配信VC"
+        self._members = {}
+
+    @property
+    def members(self):
+        return list(self._members.values())
+
+
+class FakeMember:
+    def __init__(self, member_id: int, channel: FakeVoiceChannel, api: RateLimitedAPI):
+        self.id = member_id
+        self.bot = False
+        self.name = f"user{member_id}"
+        self._channel = channel
+        self._api = api
+        self.voice = SimpleNamespace(channel=channel)
+
+    def join(self):
+        self.voice = SimpleNamespace(channel=self._channel)
+        self._channel._members[self.id] = self
+
+    async def move_to(self, channel, *, reason=None):
+        await self._api.request()
+        self.voice = None
+        self._channel._members.pop(self.id, None)
+
+
+async def sequential_kick(channel) -> int:
+    """変更前の実装（1人ずつ await）"""
+    count = 0
+    for m in [m for m in channel.members if not m.bot]:
+        try:
+            await m.move_to(None)
+            count += 1
+        except discord.HTTPException:
+            pass
+    return count
+
+
+async def run(mode: str, args) -> None:
+    random.seed(args.seed)
+    api = RateLimitedAPI(args.rate, args.latency)
+    channel = FakeVoiceChannel()
+    members = [FakeMember(i, channel, api) for i in range(args.members)]
+    for m in members:
+        m.join()
+
+    async def rejoiners():
+        # 切断中に何人かが入り直す
+        await asyncio.sleep(args.rejoin_after)
+        gone = [m for m in members if m.voice is None]
+        for m in random.sample(gone, min(args.rejoin, len(gone))):
+            m.join()
+
+    rejoin_task = asyncio.create_task(rejoiners())
+    t0 = time.monotonic()
+    if mode == 'sequential':
+        kicked = await sequential_kick(channel)
+        extra = ""
+    else:
+        result = await VoiceKeeperService().kick_all_non_bots(
+            channel, max_concurrency=args.concurrency, recheck_delay=args.recheck_delay
+        )
+        kicked = result.kicked_count
+        extra = f" failed={len(result.failed)} skipped={len(result.skipped)} passes={result.passes}"
+    wall = time.monotonic() - t0
+    await rejoin_task
+
+    print(f"{mode:<10} wall={wall:.2f}s kicked={kicked} left_in_vc={len(channel.members)} "
+          f"api_calls={api.calls} rate_limited={api.rate_limited}{extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--members', type=int, default=25)
+    parser.add_argument('--rate', type=int, default=10, help='偽 API が受け付ける回数/秒（超えると 429）')
+    parser.add_argument('--latency', type=float, default=0.15, help='move_to 1回の応答時間（秒）')
+    parser.add_argument('--concurrency', type=int, default=5)
+    parser.add_argument('--rejoin', type=int, default=3, help='切断中に入り直す人数')
+    parser.add_argument('--rejoin-after', type=float, default=0.3)
+    parser.add_argument('--recheck-delay', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"members={args.members} rate={args.rate}/s latency={args.latency * 1000:.0f}ms "
+          f"concurrency={args.concurrency} rejoin={args.rejoin}")
+    asyncio.run(run('sequential', args))
+    asyncio.run(run('concurrent', args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+/submit_response の負荷試験
+
+ローカルで起動した webapp（ローカルの MySQL / MariaDB に接続）に対して、
+N 件の回答を同時実行数 C で送り、レイテンシの p50 / p99 とスループットを表示する。
+SURVEY_INGEST_MODE=direct / queue を切り替えて比較する想定。
+送信元が1つなのでレート制限に掛かる。webapp は SUBMIT_RATE_PER_MIN=0（制限なし）で起動すること。
+
+使い方:
+    python scripts/loadtest_submit.py --url http://127.0.0.1:5000 --survey-id 1 -n 1000 -c 200
+    python scripts/loadtest_submit.py --survey-id 1 --field q_0=はい --field "q_1[]=A" --field "q_1[]=B"
+"""
+
+import argparse
+import asyncio
+import time
+from collections import Counter
+from typing import List, Tuple
+
+import aiohttp
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = max(int(round(len(values) * p)) - 1, 0)
+    return values[min(k, len(values) - 1)]
+
+
+async def submit_once(session: aiohttp.ClientSession, url: str, fields: List[Tuple[str, str]]) -> Tuple[float, int]:
+    t0 = time.perf_counter()
+    try:
+        async with session.post(url, data=fields) as r:
+            await r.read()
+            status = r.status
+    except aiohttp.ClientError:
+        status = 0
+    return time.perf_counter() - t0, status
+
+
+async def run(args) -> None:
+    url = f"{args.url.rstrip('/')}/submit_response"
+    fields = [('survey_id', str(args.survey_id))]
+    for f in args.field:
+        k, _, v = f.partition('=')
+        fields.append((k, v))
+
+    sem = asyncio.Semaphore(args.concurrency)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async def one():
+            async with sem:
+                return await submit_once(session, url, fields)
+
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(args.requests)))
+        wall = time.perf_counter() - t0
+
+    latencies = [lat for lat, status in results if status == 200]
+    statuses = Counter(status for _, status in results)
+    print(f"requests={args.requests} concurrency={args.concurrency} wall={wall:.2f}s "
+          f"rps={args.requests / wall:.1f}")
+    print(f"status={dict(statuses)}")
+    print(f"latency(ok) p50={percentile(latencies, 0.50) * 1000:.1f}ms "
+          f"p99={percentile(latencies, 0.99) * 1000:.1f}ms "
+          f"max={max(latencies or [0]) * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--survey-id', type=int, required=True)
+    parser.add_argument('-n', '--requests', type=int, default=500)
+    parser.add_argument('-c', '--concurrency', type=int, default=100)
+    parser.add_argument('--field', action='append', default=[], help='送信するフォーム項目 (name=value)。複数指定可')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
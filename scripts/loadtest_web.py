@@ -0,0 +1,133 @@
+"""
+Webダッシュボード全体の負荷試験（ワーカー数ごとのスループット比較用）
+
+serve.py で起動した webapp に対して、次のシナリオを重み付きで混ぜたリクエストを
+同時実行数 C で D 秒間送り続け、シナリオごとの件数・rps・p50 / p99 と全体の rps を表示する。
+- dashboard: GET /              （ログイン Cookie が必要）
+- form     : GET /form/<id>
+- submit   : POST /submit_response（毎回別の idempotency_key）
+- results  : GET /results/<id>   （アンケート所有者のログイン Cookie が必要）
+Cookie を指定しない場合、ログインが必要なシナリオは除く。
+
+事前準備:
+- webapp は SUBMIT_RATE_PER_MIN=0（レート制限なし）で起動する（送信元が1つのため）
+- 対象のアンケートは公開中・1人1回答はオフにしておく
+- Cookie はブラウザでログインした後の session Cookie の値を --cookie に渡す
+
+使い方:
+    WEB_WORKERS=1 python serve.py   # 別ターミナルで。2, 4 ... と変えて同じコマンドを流す
+    python scripts/loadtest_web.py --survey-id 1 -d 30 -c 100 --cookie "<session>" --field q_0=はい
+    python scripts/loadtest_web.py --survey-id 1 --mix form=8,submit=2   # 未ログインのシナリオだけ
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+import aiohttp
+
+DEFAULT_MIX = 'dashboard=1,form=6,submit=2,results=1'
+LOGIN_SCENARIOS = ('dashboard', 'results')
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = max(int(round(len(values) * p)) - 1, 0)
+    return values[min(k, len(values) - 1)]
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = int(weight or 1)
+    unknown = set(mix) - {'dashboard', 'form', 'submit', 'results'}
+    if unknown:
+        raise SystemExit(f"unknown scenario: {', '.join(sorted(unknown))}")
+    return mix
+
+
+async def request_once(session: aiohttp.ClientSession, scenario: str, args, fields: List[Tuple[str, str]]) -> Tuple[float, int]:
+    base = args.url.rstrip('/')
+    t0 = time.perf_counter()
+    try:
+        if scenario == 'submit':
+            data = fields + [('idempotency_key', uuid.uuid4().hex)]
+            ctx = session.post(f"{base}/submit_response", data=data, allow_redirects=False)
+        elif scenario == 'form':
+            ctx = session.get(f"{base}/form/{args.survey_id}", allow_redirects=False)
+        elif scenario == 'results':
+            ctx = session.get(f"{base}/results/{args.survey_id}", allow_redirects=False)
+        else:
+            ctx = session.get(f"{base}/", allow_redirects=False)
+        async with ctx as r:
+            await r.read()
+            status = r.status
+    except aiohttp.ClientError:
+        status = 0
+    return time.perf_counter() - t0, status
+
+
+async def run(args) -> None:
+    mix = parse_mix(args.mix)
+    if not args.cookie:
+        for name in LOGIN_SCENARIOS:
+            if mix.pop(name, None):
+                print(f"skip {name}: --cookie が無いため")
+    if not mix:
+        raise SystemExit("no scenario to run")
+    names, weights = list(mix), list(mix.values())
+
+    fields = [('survey_id', str(args.survey_id))]
+    for f in args.field:
+        k, _, v = f.partition('=')
+        fields.append((k, v))
+
+    results: Dict[str, List[Tuple[float, int]]] = defaultdict(list)
+    cookies = {'session': args.cookie} if args.cookie else None
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector, cookies=cookies) as session:
+        deadline = time.perf_counter() + args.duration
+        rng = random.Random(args.seed)
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                scenario = rng.choices(names, weights)[0]
+                results[scenario].append(await request_once(session, scenario, args, fields))
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        wall = time.perf_counter() - t0
+
+    total = sum(len(r) for r in results.values())
+    print(f"url={args.url} duration={wall:.1f}s concurrency={args.concurrency} requests={total} rps={total / wall:.1f}")
+    for name in names:
+        rows = results.get(name, [])
+        ok = [lat for lat, status in rows if 200 <= status < 400]
+        statuses = Counter(status for _, status in rows)
+        print(f"  {name:<9} n={len(rows):<7} rps={len(rows) / wall:7.1f} "
+              f"p50={percentile(ok, 0.50) * 1000:7.1f}ms p99={percentile(ok, 0.99) * 1000:7.1f}ms "
+              f"status={dict(statuses)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--survey-id', type=int, required=True)
+    parser.add_argument('-d', '--duration', type=float, default=30.0, help='計測する秒数')
+    parser.add_argument('-c', '--concurrency', type=int, default=100)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'シナリオの重み（既定: {DEFAULT_MIX}）')
+    parser.add_argument('--cookie', help='ログイン済みの session Cookie の値')
+    parser.add_argument('--field', action='append', default=[], help='送信するフォーム項目 (name=value)。複数指定可')
+    parser.add_argument('--seed', type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# serve.py
+"""
+Webダッシュボードの本番起動（Hypercorn のマルチワーカー）
+- WEB_BIND のソケットを親プロセスで開き、WEB_WORKERS 個のワーカープロセスで共有する
+- DB接続プールはワーカーごとに作られるので、WEB_DB_POOL_TOTAL（全ワーカー合計の上限）を
+  ワーカー数で割った値を各ワーカーの DB_POOL_MAX にする
+- SIGHUP でワーカーを入れ替える（コードの再読み込み）。ソケットは開いたままなので、入れ替え中の接続はバックログで待つ
+  SIGINT / SIGTERM で停止。どちらも処理中のリクエストは WEB_GRACEFUL_TIMEOUT 秒まで待つ
+- セッションは署名付き Cookie なので、全ワーカーが同じ SECRET_KEY を使えばどのワーカーでも読める
+  （未設定・既定値のままでは起動しない）
+- 結果ページのライブ更新・レート制限・受付済みキー・アンケート定義キャッシュはワーカーごとに持つ。
+  ワーカー間で同期しないので既定は 1 ワーカー（2 以上にしたときの違いは README を参照）
+- 開発時は従来どおり python webapp.py（単一プロセス）
+
+使い方:
+    python serve.py
+    WEB_WORKERS=4 WEB_DB_POOL_TOTAL=40 python serve.py   # ワーカーごとの状態に注意
+    kill -HUP $(cat webapp.pid)    # WEB_PID_FILE=webapp.pid のとき
+"""
+
+import os
+import sys
+import logging
+
+from dotenv import load_dotenv
+from hypercorn.config import Config
+from hypercorn.run import run
+
+logger = logging.getLogger('serve')
+
+# webapp.Config の既定値（これのままだと Cookie を誰でも偽造できる）
+INSECURE_SECRET_KEYS = {'', 'default_insecure_key'}
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+def prepare_env(workers: int) -> None:
+    """ワーカーに引き継ぐ環境変数を整える（ワーカーは spawn で起動し、親の環境変数を受け継ぐ）"""
+    os.environ['WEB_WORKERS'] = str(workers)  # queue モードのジャーナルをワーカーごとに分ける
+
+    total = os.getenv('WEB_DB_POOL_TOTAL')
+    if total:
+        per_worker = max(1, int(total) // workers)
+        os.environ['DB_POOL_MAX'] = str(per_worker)
+        os.environ['DB_POOL_MIN'] = str(min(_env_int('DB_POOL_MIN', 1), per_worker))
+
+    # アンケート定義キャッシュの無効化は保存したワーカーにしか効かないので、
+    # 他のワーカーで古いフォームを出す時間（TTL）を短くしておく（回答の書き込み時には版を確かめる）
+    os.environ.setdefault('SURVEY_CACHE_TTL', '30')
+
+def build_config(workers: int) -> Config:
+    config = Config()
+    config.application_path = 'webapp:app'
+    config.bind = [b.strip() for b in os.getenv('WEB_BIND', '0.0.0.0:5000').split(',') if b.strip()]
+    config.workers = workers
+    config.graceful_timeout = float(os.getenv('WEB_GRACEFUL_TIMEOUT', '10'))
+    config.pid_path = os.getenv('WEB_PID_FILE') or None
+    config.accesslog = os.getenv('WEB_ACCESS_LOG') or None
+    return config
+
+def main() -> int:
+    # webapp:app を読み込めるよう、リポジトリ直下で動かす（ジャーナル等の相対パスもここ基準）
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    if os.getenv('SECRET_KEY', '') in INSECURE_SECRET_KEYS:
+        logger.critical("SECRET_KEY is not set. All workers must share a non-default SECRET_KEY to sign session cookies.")
+        return 1
+
+    workers = max(1, _env_int('WEB_WORKERS', 1))
+    prepare_env(workers)
+    config = build_config(workers)
+    if workers > 1:
+        logger.warning("live result streams, the submit rate limit and idempotency keys are per worker; "
+                       "streams only see submissions handled by the same worker and the rate limit applies %s times", workers)
+    logger.info("starting %s workers on %s (DB_POOL_MAX=%s per worker)",
+                workers, ", ".join(config.bind), os.getenv('DB_POOL_MAX', '10'))
+    return run(config)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
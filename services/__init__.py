@@ -0,0 +1 @@
+# services/__init__.py
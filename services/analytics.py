@@ -0,0 +1,200 @@
+"""
+アンケート回答の分析（pandas）
+- 回答を1回だけ読み込み、設問ごとの列（q_0, q_1, ...）を持つ DataFrame にする
+  チェックボックスの列はリストのまま持ち、集計時に explode する
+- 単純集計（票数・割合）、2設問のクロス集計、回答数の推移を列演算で求める
+- pandas の処理は同期なので、Quart からは analyze_survey() を使う。イベントループ側は回答を一定行数ずつ読んで
+  キューに渡すだけで、JSON の解析と DataFrame の組み立てはスレッド側で読みながら進める（全件をループ側に溜めない）
+- pandas は使うときに初めて import する（Bot・通常ページの起動を重くしない）
+"""
+
+import json
+import queue
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import aiomysql
+
+from services.survey_stats import CHOICE_TYPES
+
+# 回答数の推移の集計単位（?freq= で指定）
+FREQS = {'H': 'h', 'D': 'D', 'W': 'W-MON', 'M': 'MS'}
+
+# 1回の fetchmany で読む行数
+FETCH_BATCH_SIZE = 2000
+# 読み出し側が先行してよいバッチ数（スレッドの処理が遅ければ読み出しを待つ）
+STREAM_QUEUE_BATCHES = 4
+
+# キューの終端（_END: 読み終わり、_ABORT: 読み出しに失敗したので集計しない）
+_END = object()
+_ABORT = object()
+
+Row = Tuple[datetime, Optional[str]]
+
+
+def _rows_sql(survey_id: int, since: Optional[datetime]) -> Tuple[str, list]:
+    sql = "SELECT submitted_at, answers FROM survey_responses WHERE survey_id=%s"
+    params: list = [survey_id]
+    if since is not None:
+        sql += " AND submitted_at >= %s"
+        params.append(since)
+    return sql, params
+
+async def _put(batches: queue.Queue, item: Any, worker: asyncio.Future) -> None:
+    """スレッド側のキューに渡す（満杯なら空くまで待つ。スレッドが落ちていれば諦める）"""
+    while True:
+        try:
+            batches.put_nowait(item)
+            return
+        except queue.Full:
+            if worker.done():
+                return
+            await asyncio.sleep(0.01)
+
+async def analyze_survey(pool, survey_id: int, questions: List[Dict[str, Any]], *,
+                         since: Optional[datetime] = None,
+                         cross: Optional[Tuple[int, int]] = None, freq: str = 'D') -> Dict[str, Any]:
+    """
+    回答を FETCH_BATCH_SIZE 行ずつ読みながらスレッド側で DataFrame にし、analyze と同じ結果を返す。
+    イベントループ側が持つのはキューに入っている STREAM_QUEUE_BATCHES バッチ分まで。
+    """
+    batches: queue.Queue = queue.Queue(maxsize=STREAM_QUEUE_BATCHES)
+    worker = asyncio.ensure_future(asyncio.to_thread(_analyze_batches, batches, questions, cross, freq))
+    sql, params = _rows_sql(survey_id, since)
+    try:
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.SSCursor) as cur:
+                await cur.execute(sql, params)
+                while not worker.done():
+                    batch = await cur.fetchmany(FETCH_BATCH_SIZE)
+                    if not batch:
+                        break
+                    await _put(batches, batch, worker)
+    except BaseException:
+        await _put(batches, _ABORT, worker)
+        raise
+    await _put(batches, _END, worker)
+    return await worker
+
+def _analyze_batches(batches: queue.Queue, questions: List[Dict[str, Any]],
+                     cross: Optional[Tuple[int, int]], freq: str) -> Optional[Dict[str, Any]]:
+    """キューからバッチを受け取って DataFrame を組み立て、読み終わったら集計する（スレッド側）"""
+    import pandas as pd
+
+    frames = []
+    while True:
+        batch = batches.get()
+        if batch is _ABORT:
+            return None
+        if batch is _END:
+            break
+        frames.append(build_frame(batch, len(questions)))
+    df = pd.concat(frames, ignore_index=True) if frames else build_frame([], len(questions))
+    return analyze_frame(df, questions, cross=cross, freq=freq)
+
+
+def _loads(raw: Optional[str]) -> Dict[str, Any]:
+    try:
+        data = json.loads(raw)
+    except Exception:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def _loads_all(raws: List[Optional[str]]) -> List[Dict[str, Any]]:
+    """全行を1つの JSON 配列として一度に解析する（壊れた行があれば1行ずつ解析し直す）"""
+    try:
+        data = json.loads('[' + ','.join(raws) + ']')
+        if len(data) == len(raws):
+            return [d if isinstance(d, dict) else {} for d in data]
+    except Exception:
+        pass
+    return [_loads(raw) for raw in raws]
+
+def build_frame(rows: Sequence[Row], question_count: int):
+    """
+    回答を submitted_at と q_<idx> 列の DataFrame にする。
+    未回答・空回答は NaN。旧形式の 'N[]' キーも同じ列にまとめる。
+    """
+    import pandas as pd
+
+    records = pd.DataFrame.from_records(_loads_all([raw for _, raw in rows]))
+    df = pd.DataFrame({'submitted_at': pd.to_datetime([ts for ts, _ in rows])})
+    for i in range(question_count):
+        col = None
+        for key in (str(i), f'{i}[]'):
+            if key in records.columns:
+                col = records[key] if col is None else col.combine_first(records[key])
+        if col is None:
+            df[f'q_{i}'] = pd.Series([None] * len(df), dtype=object)
+        else:
+            # 空文字・空リストは未回答として扱う
+            df[f'q_{i}'] = col.where(col.map(bool, na_action='ignore').eq(True))
+    return df
+
+def _values(df, q_idx: int):
+    """設問の回答を1票1行の Series にする（チェックボックスは explode）"""
+    s = df[f'q_{q_idx}'].dropna().explode()
+    s = s[s.astype(bool)].astype(str)
+    return s
+
+def question_counts(df, q_idx: int) -> Dict[str, Any]:
+    s = _values(df, q_idx)
+    counts = s.value_counts()
+    respondents = int(df[f'q_{q_idx}'].notna().sum())
+    votes = int(counts.sum())
+    return {
+        'respondents': respondents,
+        'votes': votes,
+        'answers': [
+            {
+                'answer': answer,
+                'count': int(n),
+                'percent': round(n / votes * 100, 1) if votes else 0.0,                  # 票数に対する割合（結果ページと同じ）
+                'respondent_percent': round(n / respondents * 100, 1) if respondents else 0.0,  # 回答者に対する割合
+            }
+            for answer, n in counts.items()
+        ],
+    }
+
+def crosstab(df, q_a: int, q_b: int) -> Dict[str, Any]:
+    """2設問のクロス集計（チェックボックスは選んだ選択肢ごとに1票）"""
+    import pandas as pd
+
+    if q_a == q_b:
+        raise ValueError("crosstab needs two different questions")
+    pairs = df[[f'q_{q_a}', f'q_{q_b}']].dropna().explode(f'q_{q_a}').explode(f'q_{q_b}').dropna()
+    table = pd.crosstab(pairs[f'q_{q_a}'].astype(str), pairs[f'q_{q_b}'].astype(str))
+    return {
+        'rows': [str(v) for v in table.index],
+        'columns': [str(v) for v in table.columns],
+        'counts': table.to_numpy().tolist(),
+    }
+
+def timeline(df, freq: str = 'D') -> List[Dict[str, Any]]:
+    """回答数の推移（freq は FREQS のキー）"""
+    if df.empty:
+        return []
+    counts = df.set_index('submitted_at').resample(FREQS[freq]).size()
+    return [{'t': ts.isoformat(), 'count': int(n)} for ts, n in counts.items()]
+
+def analyze(rows: Sequence[Row], questions: List[Dict[str, Any]], *,
+            cross: Optional[Tuple[int, int]] = None, freq: str = 'D') -> Dict[str, Any]:
+    """
+    結果ページ用の分析をまとめて返す（同期処理。読み込み済みの行から集計するとき用）。
+    選択式の設問は票数・割合、自由記述は回答者数のみ。
+    """
+    return analyze_frame(build_frame(rows, len(questions)), questions, cross=cross, freq=freq)
+
+def analyze_frame(df, questions: List[Dict[str, Any]], *,
+                  cross: Optional[Tuple[int, int]] = None, freq: str = 'D') -> Dict[str, Any]:
+    """build_frame 済みの DataFrame から analyze と同じ結果を作る"""
+    result: Dict[str, Any] = {'response_count': len(df), 'questions': {}, 'timeline': timeline(df, freq)}
+    for i, q in enumerate(questions):
+        if q.get('type') in CHOICE_TYPES:
+            result['questions'][str(i)] = question_counts(df, i)
+        else:
+            result['questions'][str(i)] = {'respondents': int(df[f'q_{i}'].notna().sum())}
+    if cross is not None:
+        result['crosstab'] = crosstab(df, *cross)
+    return result
@@ -0,0 +1,162 @@
+"""
+正規化した回答テーブル
+- survey_answers     : 選択肢の回答。(survey_id, response_id, q_idx, seq) ごとに選択肢番号（options の添字）を1行
+- survey_answer_texts: 自由記述と、選択式で定義外の値（「その他」の記述など）。本文は別テーブルに分ける
+  seq はチェックボックスで複数選んだときの並び順（単一の値は 0）。2テーブルで同じ番号を共有する
+- 移行期間中は survey_responses.answers（JSON）にも書き続け、JSON を正とする
+  選択肢を並べ替え・削除したときは reencode で JSON から作り直す（選択肢番号がずれるため）
+- 集計（survey_stats.rebuild）と自由記述のページ送り（survey_stats.fetch_texts）はこのテーブルを読む
+"""
+
+import json
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from services import survey_stats
+from services.survey_stats import CHOICE_TYPES, answer_for, answer_values, load_answers
+
+logger = logging.getLogger(__name__)
+
+INSERT_OPTION_SQL = (
+    "INSERT IGNORE INTO survey_answers (survey_id, response_id, q_idx, seq, option_id) "
+    "VALUES (%s, %s, %s, %s, %s)"
+)
+INSERT_TEXT_SQL = (
+    "INSERT IGNORE INTO survey_answer_texts (survey_id, response_id, q_idx, seq, body) "
+    "VALUES (%s, %s, %s, %s, %s)"
+)
+
+# バックフィル・再エンコードで1回に読む回答数
+ENCODE_BATCH_SIZE = 1000
+
+OptionCell = Tuple[int, int, int]  # (q_idx, seq, option_id)
+TextCell = Tuple[int, int, str]    # (q_idx, seq, body)
+
+# ------------------------------------------------------------------
+#  純粋関数
+# ------------------------------------------------------------------
+def load_questions(raw: Optional[str]) -> List[Dict[str, Any]]:
+    """surveys.questions を設問のリストとして読み込む（壊れていれば空）"""
+    try:
+        data = json.loads(raw)
+    except Exception:
+        return []
+    return [q for q in data if isinstance(q, dict)] if isinstance(data, list) else []
+
+def layout(questions: List[Dict[str, Any]]) -> List[Tuple[Any, List[str]]]:
+    """選択肢番号の割り当てを決める部分（設問タイプと選択肢）。これが変わったら reencode が要る"""
+    return [(q.get('type'), list(q.get('options') or [])) for q in questions]
+
+def encode_answers(questions: List[Dict[str, Any]], answers: Dict[str, Any]) -> Tuple[List[OptionCell], List[TextCell]]:
+    """1件の回答を選択肢番号の行と本文の行に分ける"""
+    options: List[OptionCell] = []
+    texts: List[TextCell] = []
+    for i, q in enumerate(questions):
+        values = answer_values(answer_for(answers, str(i)))
+        if not values:
+            continue
+        if q.get('type') in CHOICE_TYPES:
+            index: Dict[str, int] = {}
+            for n, label in enumerate(q.get('options') or []):
+                index.setdefault(str(label), n)
+            for seq, v in enumerate(values):
+                if v in index:
+                    options.append((i, seq, index[v]))
+                else:
+                    texts.append((i, seq, v))
+        else:
+            texts.extend((i, seq, v) for seq, v in enumerate(values))
+    return options, texts
+
+# ------------------------------------------------------------------
+#  DB操作
+# ------------------------------------------------------------------
+async def _insert(cur, option_rows: List[tuple], text_rows: List[tuple]) -> None:
+    if option_rows:
+        await cur.executemany(INSERT_OPTION_SQL, option_rows)
+    if text_rows:
+        await cur.executemany(INSERT_TEXT_SQL, text_rows)
+
+async def write(cur, records: Sequence[Dict[str, Any]]) -> None:
+    """
+    ingest.write_records と同じトランザクションで、INSERT 済みの回答を正規化テーブルにも書く。
+    response_id は submission_id から引き直す。
+    変更前のジャーナルから再投入されたレコード（options を持たない）は書かない。
+    """
+    records = [r for r in records if 'options' in r]
+    if not records:
+        return
+
+    placeholders = ", ".join(["%s"] * len(records))
+    await cur.execute(
+        f"SELECT submission_id, id FROM survey_responses WHERE submission_id IN ({placeholders})",
+        [r['submission_id'] for r in records]
+    )
+    ids = dict(await cur.fetchall())
+
+    option_rows, text_rows = [], []
+    for r in records:
+        rid = ids.get(r['submission_id'])
+        if rid is None:
+            continue
+        option_rows.extend((r['survey_id'], rid, q_idx, seq, opt) for q_idx, seq, opt in r['options'])
+        text_rows.extend((r['survey_id'], rid, q_idx, seq, body) for q_idx, seq, body in r['texts'])
+    await _insert(cur, option_rows, text_rows)
+
+async def encode_survey(cur, survey_id: int, questions: List[Dict[str, Any]]) -> int:
+    """
+    survey_responses.answers（JSON）から正規化テーブルを埋める（既にある行は INSERT IGNORE で残す）。
+    id 順に ENCODE_BATCH_SIZE 件ずつ読むのでメモリは一定。戻り値は読んだ回答数。
+    """
+    last_id = 0
+    total = 0
+    while True:
+        await cur.execute(
+            "SELECT id, answers FROM survey_responses WHERE survey_id=%s AND id > %s ORDER BY id LIMIT %s",
+            (survey_id, last_id, ENCODE_BATCH_SIZE)
+        )
+        rows = await cur.fetchall()
+        if not rows:
+            return total
+
+        option_rows, text_rows = [], []
+        for rid, raw in rows:
+            options, texts = encode_answers(questions, load_answers(raw))
+            option_rows.extend((survey_id, rid, q_idx, seq, opt) for q_idx, seq, opt in options)
+            text_rows.extend((survey_id, rid, q_idx, seq, body) for q_idx, seq, body in texts)
+        await _insert(cur, option_rows, text_rows)
+
+        total += len(rows)
+        last_id = rows[-1][0]
+
+async def delete_survey(cur, survey_id: int) -> None:
+    """アンケートの正規化テーブルの行をすべて消す（アンケートの削除・作り直しで使う）"""
+    await cur.execute("DELETE FROM survey_answers WHERE survey_id=%s", (survey_id,))
+    await cur.execute("DELETE FROM survey_answer_texts WHERE survey_id=%s", (survey_id,))
+
+async def reencode(pool, survey_id: int, questions: List[Dict[str, Any]]) -> int:
+    """
+    選択肢が変わったアンケートの正規化テーブルを JSON から1トランザクションで作り直す。
+    アンケートの行をロックするので、その間の回答の書き込みは作り直しの後に続く。
+    """
+    async with pool.acquire() as conn:
+        await conn.begin()
+        try:
+            async with conn.cursor() as cur:
+                await survey_stats.lock_survey(cur, survey_id)
+                await delete_survey(cur, survey_id)
+                total = await encode_survey(cur, survey_id, questions)
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            raise
+    return total
+
+async def backfill(cur) -> None:
+    """既存の全回答を正規化テーブルに移す（マイグレーションから呼ばれる。途中で落ちても再実行できる）"""
+    await cur.execute("SELECT id, questions FROM surveys")
+    surveys = await cur.fetchall()
+    for survey_id, raw in surveys:
+        total = await encode_survey(cur, survey_id, load_questions(raw))
+        if total:
+            logger.info("[Migrate] backfilled survey_answers for survey %s (%s responses)", survey_id, total)
@@ -0,0 +1,21 @@
+"""
+静的ファイル・テンプレートの内容ハッシュ
+- 静的ファイルの URL に ?v=<hash> を付けて長期キャッシュさせる
+- 公開フォームの ETag にテンプレートのハッシュを含める
+ファイルはデプロイ時（プロセス再起動）にしか変わらないので、ハッシュは初回だけ計算する。
+"""
+
+import hashlib
+from functools import lru_cache
+
+# ?v= 付きの静的ファイルに付ける Cache-Control
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+@lru_cache(maxsize=None)
+def file_hash(path: str) -> str:
+    """ファイル内容の短いハッシュ（読めなければ '0'）"""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()[:12]
+    except OSError:
+        return '0'
@@ -0,0 +1,98 @@
+"""
+アンケート回答のCSVストリーミング出力
+- サーバーサイドカーソル（SSDictCursor）で回答を少しずつ読み、
+  CSVをチャンク単位で送り出す（回答数が増えてもメモリは一定）
+"""
+
+import csv
+import io
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiomysql
+
+from services.survey_stats import answer_for, load_answers
+
+# 1回の fetchmany で読む行数（= 1チャンクあたりの行数）
+CSV_BATCH_SIZE = 500
+
+def parse_since(value: Optional[str]) -> Optional[datetime]:
+    """?since= の値を datetime にする（YYYY-MM-DD / YYYY-MM-DDTHH:MM[:SS]）"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value)
+
+def parse_columns(value: Optional[str], question_count: int) -> List[int]:
+    """
+    ?columns= の値（Q番号のカンマ区切り、例: "1,3"）を設問インデックスのリストにする。
+    未指定なら全設問。範囲外の番号は ValueError。
+    """
+    if not value:
+        return list(range(question_count))
+    indexes = []
+    for part in value.split(','):
+        n = int(part.strip().lstrip('Qq'))
+        if not 1 <= n <= question_count:
+            raise ValueError(f"column out of range: {n}")
+        indexes.append(n - 1)
+    return indexes
+
+def build_header(questions: List[Dict[str, Any]], columns: List[int]) -> List[str]:
+    header = ['回答日時', '回答者']
+    for i in columns:
+        header.append(f"Q{i+1}: {questions[i].get('text', f'Q{i+1}')}")
+    return header
+
+def build_row(r: Dict[str, Any], columns: List[int]) -> List[Any]:
+    row = [str(r['submitted_at']), r['user_name']]
+    ans_json = load_answers(r['answers'])
+    for i in columns:
+        val = answer_for(ans_json, str(i))
+        if val is None:
+            val = ''
+        if isinstance(val, list):
+            val = ", ".join(val)
+        row.append(val)
+    return row
+
+async def stream_csv(pool, survey_id: int, questions: List[Dict[str, Any]], columns: List[int],
+                     since: Optional[datetime] = None, batch_size: int = CSV_BATCH_SIZE) -> AsyncIterator[str]:
+    """回答をCSV文字列のチャンクとして順次返す非同期ジェネレータ"""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+
+    def take() -> str:
+        chunk = buf.getvalue()
+        buf.seek(0)
+        buf.truncate(0)
+        return chunk
+
+    writer.writerow(build_header(questions, columns))
+    yield take()
+
+    sql = "SELECT submitted_at, user_name, answers FROM survey_responses WHERE survey_id=%s"
+    params = [survey_id]
+    if since is not None:
+        sql += " AND submitted_at >= %s"
+        params.append(since)
+    sql += " ORDER BY submitted_at DESC"
+
+    async with pool.acquire() as conn:
+        cur = await conn.cursor(aiomysql.SSDictCursor)
+        finished = False
+        try:
+            await cur.execute(sql, params)
+            while True:
+                rows = await cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                for r in rows:
+                    writer.writerow(build_row(r, columns))
+                yield take()
+            finished = True
+        finally:
+            if finished:
+                await cur.close()
+            else:
+                # 途中で切断された場合は読み残しがあるので、接続ごと破棄してプールに戻さない
+                conn.close()
@@ -0,0 +1,34 @@
+"""
+ダッシュボードの一覧（アンケート・操作ログ）の取得
+どちらも (created_at, id) のキーセットでページ送りし、1ページ分だけを読む。
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.pagination import after_clause, decode_cursor, split_page
+
+SURVEY_PAGE_SIZE = 20
+LOG_PAGE_SIZE = 30
+
+Page = Tuple[List[Dict[str, Any]], Optional[str]]
+
+
+async def fetch_surveys(cur, owner_id: str, cursor: Optional[str] = None, limit: int = SURVEY_PAGE_SIZE) -> Page:
+    """自分のアンケートを新しい順に1ページ分返す（cur は DictCursor）"""
+    cond, params = after_clause('created_at', decode_cursor(cursor))
+    await cur.execute(
+        "SELECT id, title, is_active, created_at FROM surveys "
+        f"WHERE owner_id = %s AND {cond} ORDER BY created_at DESC, id DESC LIMIT %s",
+        (owner_id, *params, limit + 1)
+    )
+    return split_page(await cur.fetchall(), limit, 'created_at')
+
+async def fetch_logs(cur, user_id: str, cursor: Optional[str] = None, limit: int = LOG_PAGE_SIZE) -> Page:
+    """自分の操作ログを新しい順に1ページ分返す（cur は DictCursor）"""
+    cond, params = after_clause('created_at', decode_cursor(cursor))
+    await cur.execute(
+        "SELECT id, user_name, command, detail, created_at FROM operation_logs "
+        f"WHERE user_id = %s AND {cond} ORDER BY created_at DESC, id DESC LIMIT %s",
+        (user_id, *params, limit + 1)
+    )
+    return split_page(await cur.fetchall(), limit, 'created_at')
@@ -0,0 +1,99 @@
+"""
+Discord OAuth2 / REST 用の非同期HTTPクライアント
+- before_serving で1つだけ作り、全リクエストで使い回す（Keep-Alive で接続をプール）
+- タイムアウトと 429 (Retry-After) の再試行を一箇所で扱う
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+DISCORD_API_BASE = 'https://discord.com/api'
+
+
+class DiscordOAuthClient:
+    def __init__(
+        self,
+        *,
+        api_base: str = DISCORD_API_BASE,
+        timeout_seconds: float = 10.0,
+        pool_limit: int = 20,
+        max_retries: int = 2,
+        max_retry_after: float = 5.0,
+    ):
+        self.api_base = api_base.rstrip('/')
+        self.timeout = aiohttp.ClientTimeout(total=timeout_seconds)
+        self.pool_limit = pool_limit
+        self.max_retries = max_retries
+        # これより長い Retry-After はリクエスト中に待たずにそのまま返す
+        self.max_retry_after = max_retry_after
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self) -> None:
+        connector = aiohttp.TCPConnector(limit=self.pool_limit, keepalive_timeout=30, ttl_dns_cache=300)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self) -> None:
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    async def _request(self, method: str, path: str, **kwargs) -> Tuple[int, Any]:
+        """(status, body) を返す。body は JSON ならパース済み、そうでなければ文字列"""
+        if self._session is None:
+            raise RuntimeError("DiscordOAuthClient is not started")
+
+        url = f"{self.api_base}{path}"
+        for attempt in range(self.max_retries + 1):
+            async with self._session.request(method, url, **kwargs) as r:
+                if r.content_type == 'application/json':
+                    body = await r.json()
+                else:
+                    body = await r.text()
+
+                if r.status != 429 or attempt == self.max_retries:
+                    return r.status, body
+
+                retry_after = _retry_after(r.headers, body)
+                if retry_after > self.max_retry_after:
+                    return r.status, body
+
+            logger.warning("[OAuth] 429 on %s %s, retry after %.2fs", method, path, retry_after)
+            await asyncio.sleep(retry_after)
+
+    async def exchange_code(self, code: str, client_id: str, client_secret: str, redirect_uri: str) -> Tuple[int, Any]:
+        payload = {
+            'client_id': client_id,
+            'client_secret': client_secret,
+            'grant_type': 'authorization_code',
+            'code': code,
+            'redirect_uri': redirect_uri
+        }
+        return await self._request('POST', '/oauth2/token', data=payload)
+
+    async def get_user(self, access_token: str) -> Tuple[int, Any]:
+        return await self._request('GET', '/users/@me', headers=_bearer(access_token))
+
+    async def get_guilds(self, access_token: str) -> Tuple[int, Any]:
+        return await self._request('GET', '/users/@me/guilds', headers=_bearer(access_token))
+
+
+def _bearer(access_token: str) -> Dict[str, str]:
+    return {'Authorization': f'Bearer {access_token}'}
+
+def _retry_after(headers, body: Any) -> float:
+    """Retry-After ヘッダ（秒）→ JSON の retry_after → 1秒 の順で待ち時間を決める"""
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        pass
+    if isinstance(body, dict):
+        try:
+            return float(body.get('retry_after'))
+        except (TypeError, ValueError):
+            pass
+    return 1.0
@@ -0,0 +1,147 @@
+"""
+Gateway イベントの計測と事前フィルタ（bot.metrics）
+- MyBot._schedule_event から呼ばれ、リスナーごとの呼び出し回数・処理時間（p50/p99）・
+  スケジュールから実行開始までの待ち時間を記録する
+- Cog は add_prefilter で「このイベントは処理するか」の軽い判定（チャンネルIDの集合など）を登録でき、
+  False ならコルーチンを作らずに捨てる
+- イベントループの遅延（sleep の予定時刻からのずれ）をバックグラウンドで測る
+- 集計は /metrics（cogs/metrics.py）で確認する
+"""
+
+import time
+import asyncio
+import logging
+from collections import Counter, deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+Prefilter = Callable[..., bool]
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * q), len(sorted_values) - 1)]
+
+
+class ListenerStats:
+    def __init__(self, keep: int):
+        self.calls = 0
+        self.filtered = 0
+        self.max = 0.0
+        self.durations: Deque[float] = deque(maxlen=keep)
+        self.delays: Deque[float] = deque(maxlen=keep)
+
+    def record(self, delay: float, duration: float) -> None:
+        self.calls += 1
+        self.max = max(self.max, duration)
+        self.durations.append(duration)
+        self.delays.append(delay)
+
+
+class EventMetrics:
+    def __init__(self, *, keep: int = 1000, lag_interval: float = 0.5):
+        self.keep = keep
+        self.lag_interval = lag_interval
+
+        self.events: Counter = Counter()  # dispatch されたイベント名ごとの件数
+        self.listeners: Dict[str, ListenerStats] = {}
+        self._prefilters: Dict[Callable, Prefilter] = {}
+
+        self._lag: Deque[float] = deque(maxlen=keep)
+        self._lag_max = 0.0
+        self._lag_task: Optional[asyncio.Task] = None
+
+    # --- 事前フィルタ ---
+    def add_prefilter(self, listener: Callable, predicate: Prefilter) -> None:
+        """
+        listener（Cog のリスナーのバインドメソッド）に渡すイベントの判定を登録する。
+        predicate はイベントの引数をそのまま受け取り、処理しない場合は False を返す。
+        判定はイベントごとにループ上で同期的に呼ばれるので、辞書・集合の参照程度に留めること。
+        """
+        self._prefilters[listener] = predicate
+
+    def remove_prefilters(self, owner: Any) -> None:
+        """owner（Cog）のリスナーに登録した事前フィルタをすべて外す（cog_unload で呼ぶ）"""
+        for listener in [l for l in self._prefilters if getattr(l, '__self__', None) is owner]:
+            del self._prefilters[listener]
+
+    def accepts(self, listener: Callable, event_name: str, args: tuple) -> bool:
+        predicate = self._prefilters.get(listener)
+        if predicate is None:
+            return True
+        try:
+            if predicate(*args):
+                return True
+        except Exception:
+            # 判定に失敗したら通常どおり処理させる（取りこぼさない側に倒す）
+            logger.exception("[Metrics] prefilter failed for %s", event_name)
+            return True
+        self._stats_for(listener, event_name).filtered += 1
+        return False
+
+    # --- リスナーの計測 ---
+    def _stats_for(self, listener: Callable, event_name: str) -> ListenerStats:
+        name = getattr(listener, '__qualname__', event_name)
+        stats = self.listeners.get(name)
+        if stats is None:
+            stats = self.listeners[name] = ListenerStats(self.keep)
+        return stats
+
+    async def run_timed(self, runner, scheduled: float, listener: Callable, event_name: str, *args, **kwargs) -> None:
+        """runner（Client._run_event）を実行し、scheduled（perf_counter）からの待ち時間と処理時間を記録する"""
+        started = time.perf_counter()
+        try:
+            await runner(listener, event_name, *args, **kwargs)
+        finally:
+            self._stats_for(listener, event_name).record(started - scheduled, time.perf_counter() - started)
+
+    # --- イベントループの遅延 ---
+    def start(self) -> None:
+        if self._lag_task is None or self._lag_task.done():
+            self._lag_task = asyncio.create_task(self._measure_lag())
+
+    async def stop(self) -> None:
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            try:
+                await self._lag_task
+            except asyncio.CancelledError:
+                pass
+            self._lag_task = None
+
+    async def _measure_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.lag_interval)
+            lag = max(loop.time() - t0 - self.lag_interval, 0.0)
+            self._lag.append(lag)
+            self._lag_max = max(self._lag_max, lag)
+
+    # --- 集計 ---
+    def stats(self) -> Dict[str, Any]:
+        listeners = []
+        for name, s in self.listeners.items():
+            durations = sorted(s.durations)
+            delays = sorted(s.delays)
+            listeners.append({
+                'listener': name,
+                'calls': s.calls,
+                'filtered': s.filtered,
+                'p50_ms': round(_percentile(durations, 0.50) * 1000, 2),
+                'p99_ms': round(_percentile(durations, 0.99) * 1000, 2),
+                'max_ms': round(s.max * 1000, 2),
+                'delay_p99_ms': round(_percentile(delays, 0.99) * 1000, 2),
+            })
+        listeners.sort(key=lambda r: r['p99_ms'], reverse=True)
+
+        lag = sorted(self._lag)
+        return {
+            'events': dict(self.events.most_common()),
+            'listeners': listeners,
+            'loop_lag_p50_ms': round(_percentile(lag, 0.50) * 1000, 2),
+            'loop_lag_p99_ms': round(_percentile(lag, 0.99) * 1000, 2),
+            'loop_lag_max_ms': round(self._lag_max * 1000, 2),
+        }
@@ -0,0 +1,516 @@
+"""
+アンケート回答の書き込み（direct / queue モード）
+- direct: リクエストごとに INSERT（従来どおり）
+- queue : 受け付けた回答をジャーナル（追記専用ファイル）に書いてから即応答し、
+          バックグラウンドの writer がまとめて1トランザクションで INSERT する
+ジャーナルには commit 済みの位置（ack）も追記し、起動時に未反映分を再投入する。
+接続断などの一時的なエラーは再試行し、一意制約違反・データ不正など再試行しても通らないエラーは
+バッチを二分して書き直し、それでも通らない1件はデッドレターファイルに移して ack する（writer を止めない）。
+壊れたジャーナル行は書き込む前に validate_record で弾いてデッドレターに移す。
+それ以外の例外（コードの不具合）は捨てずに再試行を続け、ログに残す。
+（二重登録は survey_responses.submission_id で除外。再投入分も通常の送信も同じく書き込み時に判定する）
+複数ワーカーで動かす場合は、ワーカーごとに番号付きのジャーナルをロックして使う（claim_journal）。
+"""
+
+import os
+import json
+import uuid
+import asyncio
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import aiomysql
+
+from services import answer_store, survey_stats
+
+logger = logging.getLogger(__name__)
+
+INSERT_RESPONSE_SQL = (
+    "INSERT INTO survey_responses (survey_id, user_id, user_name, answers, submitted_at, submission_id, dedupe_user_id) "
+    "VALUES (%s, %s, %s, %s, %s, %s, %s)"
+)
+
+
+# 再試行しても通らないDBのエラー（行の内容が原因）
+NON_RETRYABLE_ERRORS = (aiomysql.IntegrityError, aiomysql.DataError)
+
+
+class IngestBusy(Exception):
+    """キューが埋まっていて受け付けられない（呼び出し側は 503 を返す）"""
+
+
+class InvalidRecord(Exception):
+    """レコードの形が壊れていて書き込めない（壊れたジャーナル行など）"""
+
+
+def new_record(survey_id: int, user_id: Optional[str], user_name: str,
+               answers: Dict[str, Any], counts: Counter, questions: List[Dict[str, Any]], *,
+               submission_id: Optional[str] = None, one_per_user: bool = False,
+               version: Optional[int] = None) -> Dict[str, Any]:
+    """
+    1件の回答を書き込み用のレコードにする（正規化テーブル用の行もここで作る）。
+    submission_id はフォームの idempotency_key（無ければ採番）。
+    one_per_user なら dedupe_user_id に user_id を入れ、(survey_id, dedupe_user_id) の一意制約で2回目を弾く。
+    version は questions を読んだときの surveys.version（書き込み時に今の版と比べる）。
+    """
+    options, texts = answer_store.encode_answers(questions, answers)
+    return {
+        'version': version,
+        'submission_id': submission_id or uuid.uuid4().hex,
+        'survey_id': survey_id,
+        'user_id': user_id,
+        'user_name': user_name,
+        'dedupe_user_id': user_id if one_per_user else None,
+        'answers': json.dumps(answers, ensure_ascii=False),
+        'submitted_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'counts': [[q_idx, answer, n] for (q_idx, answer), n in counts.items()],
+        'options': [list(c) for c in options],
+        'texts': [list(c) for c in texts],
+    }
+
+# new_record が作るキーと型（None を許すものは別に確かめる）
+_RECORD_FIELDS = {
+    'submission_id': str,
+    'survey_id': int,
+    'user_name': str,
+    'answers': str,
+    'submitted_at': str,
+    'counts': list,
+}
+# 正規化テーブル用のセル（変更前のジャーナルには無い）
+_CELL_FIELDS = {
+    'counts': (int, str, int),
+    'options': (int, int, int),
+    'texts': (int, int, str),
+}
+
+def _is(value: Any, typ: type) -> bool:
+    return isinstance(value, typ) and not (typ is int and isinstance(value, bool))
+
+def validate_record(record: Any) -> None:
+    """書き込む前にレコードの形を確かめる（ジャーナルから読んだ行は壊れていることがある）"""
+    if not isinstance(record, dict):
+        raise InvalidRecord(f"record is {type(record).__name__}")
+    for key, typ in _RECORD_FIELDS.items():
+        if not _is(record.get(key), typ):
+            raise InvalidRecord(f"{key} is {type(record.get(key)).__name__}")
+    for key, typ in (('user_id', (str, int)), ('dedupe_user_id', (str, int)), ('version', int)):
+        if record.get(key) is not None and not _is(record[key], typ):
+            raise InvalidRecord(f"{key} is {type(record[key]).__name__}")
+    for key, types in _CELL_FIELDS.items():
+        cells = record.get(key, [])
+        if not isinstance(cells, list):
+            raise InvalidRecord(f"{key} is {type(cells).__name__}")
+        for cell in cells:
+            if not (isinstance(cell, list) and len(cell) == len(types) and all(map(_is, cell, types))):
+                raise InvalidRecord(f"{key} has a malformed cell: {cell!r}")
+    try:
+        answers = json.loads(record['answers'])
+    except ValueError:
+        raise InvalidRecord("answers is not JSON")
+    if not isinstance(answers, dict):
+        raise InvalidRecord(f"answers is {type(answers).__name__}")
+
+async def _check_surveys(cur, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    アンケートの行を共有ロックし（書き込み中に選択肢番号の作り直し・再集計が割り込まないように）、
+    受付時の版が今の版と違うレコードを今の定義で扱い直す。
+    定義キャッシュはワーカーごとなので、別ワーカーでの保存・公開停止はここで初めて分かることがある。
+    - 公開停止・削除されたアンケートへの回答は除く
+    - 設問が変わっていれば、選択肢番号と票数を今の設問で作り直す（回答の JSON はそのまま）
+    """
+    ids = sorted({r['survey_id'] for r in records})
+    placeholders = ", ".join(["%s"] * len(ids))
+    await cur.execute(
+        f"SELECT id, version, is_active, questions FROM surveys WHERE id IN ({placeholders}) LOCK IN SHARE MODE", ids
+    )
+    surveys = {row[0]: row[1:] for row in await cur.fetchall()}
+
+    kept = []
+    for r in records:
+        current = surveys.get(r['survey_id'])
+        if current is None:
+            logger.warning("[Ingest] dropped submission %s: survey %s was deleted", r['submission_id'], r['survey_id'])
+            continue
+        version, is_active, raw_questions = current
+        if r.get('version') != version:
+            # 版を持たないのは変更前のジャーナルから再投入されたレコード（公開状態は判定できないので書く）
+            if not is_active and r.get('version') is not None:
+                logger.warning("[Ingest] dropped submission %s: survey %s is closed", r['submission_id'], r['survey_id'])
+                continue
+            questions = answer_store.load_questions(raw_questions)
+            answers = survey_stats.load_answers(r['answers'])
+            options, texts = answer_store.encode_answers(questions, answers)
+            counts = survey_stats.count_choices(questions, answers)
+            r = dict(
+                r, version=version,
+                counts=[[q_idx, answer, n] for (q_idx, answer), n in counts.items()],
+                options=[list(c) for c in options],
+                texts=[list(c) for c in texts],
+            )
+        kept.append(r)
+    return kept
+
+async def _skip_duplicates(cur, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    既に書き込み済みのレコードを除く（同じバッチ内の2件目も除く）。
+    - submission_id が登録済み（再送・ジャーナルからの再投入・別ワーカーで受け付けた同じ送信）
+    - 1人1回答のアンケートで回答済みのユーザー
+    INSERT の一意制約違反でバッチ全体がロールバックされないよう、INSERT の前に判定する。
+    """
+    placeholders = ", ".join(["%s"] * len(records))
+    await cur.execute(
+        f"SELECT submission_id FROM survey_responses WHERE submission_id IN ({placeholders})",
+        [r['submission_id'] for r in records]
+    )
+    seen_ids = {row[0] for row in await cur.fetchall()}
+
+    keyed = [r for r in records if r.get('dedupe_user_id')]
+    seen_users = set()
+    if keyed:
+        conds = " OR ".join(["(survey_id=%s AND dedupe_user_id=%s)"] * len(keyed))
+        params = [v for r in keyed for v in (r['survey_id'], r['dedupe_user_id'])]
+        await cur.execute(f"SELECT survey_id, dedupe_user_id FROM survey_responses WHERE {conds}", params)
+        seen_users = {(sid, uid) for sid, uid in await cur.fetchall()}
+
+    kept = []
+    for r in records:
+        if r['submission_id'] in seen_ids:
+            continue
+        if r.get('dedupe_user_id'):
+            key = (r['survey_id'], r['dedupe_user_id'])
+            if key in seen_users:
+                continue
+            seen_users.add(key)
+        seen_ids.add(r['submission_id'])
+        kept.append(r)
+    return kept
+
+async def write_records(conn, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    回答の INSERT（JSON と正規化テーブルの両方）と集計ストアへの加算を1トランザクションで行う。
+    戻り値は実際に書き込んだレコード（書き込み済みの submission_id・1人1回答で回答済み・
+    公開停止されたアンケートへの回答は含まない。設問が変わっていたものは今の設問で作り直したもの）。
+    判定と INSERT の間に別ワーカーが同じ値を書いた場合は IntegrityError になる（呼び出し側で扱う）。
+    """
+    if not records:
+        return []
+
+    await conn.begin()
+    try:
+        async with conn.cursor() as cur:
+            records = await _check_surveys(cur, records)
+            if records:
+                records = await _skip_duplicates(cur, records)
+            if records:
+                await cur.executemany(INSERT_RESPONSE_SQL, [
+                    (r['survey_id'], r['user_id'], r['user_name'], r['answers'], r['submitted_at'],
+                     r['submission_id'], r.get('dedupe_user_id'))
+                    for r in records
+                ])
+                await answer_store.write(cur, records)
+
+                per_survey_counts: Dict[int, Counter] = defaultdict(Counter)
+                per_survey_total: Counter = Counter()
+                for r in records:
+                    per_survey_total[r['survey_id']] += 1
+                    for q_idx, answer, n in r['counts']:
+                        per_survey_counts[r['survey_id']][(q_idx, answer)] += n
+                for survey_id, total in per_survey_total.items():
+                    await survey_stats.apply_counts(cur, survey_id, per_survey_counts[survey_id], total)
+        await conn.commit()
+    except Exception:
+        await conn.rollback()
+        raise
+    return records
+
+
+def claim_journal(base_path: str, slots: int) -> Tuple[str, Any]:
+    """
+    空いている番号のジャーナルをロックして (パス, ロック用ファイル) を返す。ロックはファイルを閉じるまで続く。
+    番号 0 は base_path そのもの（1ワーカー運用から切り替えても未反映分を引き継ぐ）。
+    """
+    import fcntl
+
+    for i in range(slots):
+        path = base_path if i == 0 else f"{base_path}.{i}"
+        lock_file = open(f"{path}.lock", 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            continue
+        return path, lock_file
+    raise RuntimeError(f"no free ingest journal slot for {base_path} ({slots} slots)")
+
+
+class ResponseIngestor:
+    def __init__(
+        self,
+        pool,
+        *,
+        max_pending: int = 5000,
+        batch_size: int = 200,
+        flush_interval: float = 0.2,
+        put_timeout: float = 2.0,
+        journal_path: Optional[str] = None,
+        fsync: Optional[bool] = None,
+        journal_slots: int = 1,
+        dead_letter_path: Optional[str] = None,
+        on_written: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    ):
+        self.pool = pool
+        self.on_written = on_written  # commit 済みのレコードを受け取る（結果ページのライブ更新など）
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.journal_path = journal_path or os.getenv('INGEST_JOURNAL_PATH', 'survey_ingest.journal')
+        self.fsync = fsync if fsync is not None else os.getenv('INGEST_FSYNC', '1') == '1'
+        self.journal_slots = journal_slots  # 同時に動くワーカー数（1 なら journal_path をそのまま使う）
+        self._dead_letter_path = dead_letter_path or os.getenv('INGEST_DEAD_LETTER_PATH')
+        self._slot_file = None
+
+        # 受付枠（未コミットの件数の上限）。埋まっていれば put_timeout まで待ってから 503
+        self._slots = asyncio.Semaphore(max_pending)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._journal_lock = asyncio.Lock()
+        self._seq = 0
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        self._accepted = 0
+        self._written = 0
+        self._rejected = 0
+        self._batches = 0
+        self._duplicates = 0  # 書き込み時に除いた件数（書き込み済みの submission_id・1人1回答・公開停止）
+        self._dead_letters = 0  # 書き込めずにデッドレターへ移した件数
+
+    @property
+    def dead_letter_path(self) -> str:
+        # 既定はジャーナルの隣（ワーカーごとのジャーナルなら、それぞれの隣）
+        return self._dead_letter_path or f"{self.journal_path}.dead"
+
+    # --- ライフサイクル ---
+    async def start(self) -> None:
+        if self.journal_slots > 1:
+            self.journal_path, self._slot_file = await asyncio.to_thread(claim_journal, self.journal_path, self.journal_slots)
+            logger.info("[Ingest] using journal %s", self.journal_path)
+
+        # 前回終了時に未反映だった回答を先頭に積み直す（DBが落ちていても writer が再試行する）
+        pending, broken, self._seq = await asyncio.to_thread(self._read_journal)
+        for entry in broken:
+            await self._dead_letter(entry, InvalidRecord("journal entry has no seq"))
+        for r in pending:
+            r['replayed'] = True
+            self._queue.put_nowait(r)
+            self._accepted += 1
+        if pending:
+            logger.info("[Ingest] %s journaled responses queued for replay", len(pending))
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """キューを書き切ってから停止する"""
+        self._closing = True
+        if self._task is not None:
+            await self._queue.put(None)
+            await self._task
+            self._task = None
+        if self._slot_file is not None:
+            self._slot_file.close()
+            self._slot_file = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'pending': self._queue.qsize(),
+            'accepted': self._accepted,
+            'written': self._written,
+            'rejected': self._rejected,
+            'batches': self._batches,
+            'duplicates': self._duplicates,
+            'dead_letters': self._dead_letters,
+        }
+
+    # --- 受付 ---
+    async def submit(self, record: Dict[str, Any]) -> None:
+        """ジャーナルに書いてからキューに積む（DBの完了は待たない）"""
+        if self._closing:
+            raise IngestBusy()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.put_timeout)
+        except asyncio.TimeoutError:
+            self._rejected += 1
+            raise IngestBusy()
+
+        try:
+            async with self._journal_lock:
+                self._seq += 1
+                record = dict(record, seq=self._seq)
+                await asyncio.to_thread(self._append_journal, record)
+                self._queue.put_nowait(record)
+                self._accepted += 1
+        except Exception:
+            self._slots.release()
+            raise
+
+    # --- writer ---
+    async def _run(self) -> None:
+        while True:
+            first = await self._queue.get()
+            batch = [] if first is None else [first]
+            stopping = first is None
+
+            if not stopping:
+                await asyncio.sleep(self.flush_interval)
+                while not self._queue.empty() and len(batch) < self.batch_size:
+                    item = self._queue.get_nowait()
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+
+            if batch and not await self._write_batch(batch):
+                return
+
+            if stopping:
+                # 停止要求の後ろに残っている分も書き切る
+                rest = [r for r in self._drain() if r is not None]
+                for i in range(0, len(rest), self.batch_size):
+                    if not await self._write_batch(rest[i:i + self.batch_size]):
+                        return
+                return
+
+    def _drain(self) -> List[Any]:
+        items = []
+        while not self._queue.empty():
+            items.append(self._queue.get_nowait())
+        return items
+
+    async def _write_batch(self, batch: List[Dict[str, Any]]) -> bool:
+        """1バッチを書き込んで ack する。停止中に書けなかった場合は False"""
+        valid = []
+        for r in batch:
+            try:
+                validate_record(r)
+            except InvalidRecord as e:
+                await self._dead_letter(r, e)
+            else:
+                valid.append(r)
+
+        try:
+            written = await self._write_with_retry(valid) if valid else []
+        except NON_RETRYABLE_ERRORS as e:
+            if len(batch) > 1:
+                # どの行が原因か分からないので半分ずつ書き直す（通る行はそのまま書かれる）
+                mid = len(batch) // 2
+                return await self._write_batch(batch[:mid]) and await self._write_batch(batch[mid:])
+            written = await self._write_single(batch[0], e)
+        if written is False:
+            return False
+
+        if written is not None:
+            self._duplicates += len(valid) - len(written)
+            if self.on_written is not None:
+                try:
+                    self.on_written(written)
+                except Exception:
+                    logger.exception("[Ingest] on_written callback failed")
+
+        self._written += len(batch)
+        self._batches += 1
+        for r in batch:
+            if not r.get('replayed'):
+                self._slots.release()
+
+        async with self._journal_lock:
+            await asyncio.to_thread(self._append_journal, {'ack': batch[-1]['seq']})
+            # すべて反映済みならジャーナルを空にする
+            if self._queue.empty() and self._written == self._accepted:
+                await asyncio.to_thread(self._truncate_journal)
+        return True
+
+    async def _write_single(self, record: Dict[str, Any], error: Exception):
+        """
+        1件だけで失敗した回答をもう一度書き、それでも通らなければデッドレターに移して None を返す。
+        （別ワーカーと同時に書いた重複なら、書き直すと write_records の判定で除かれる）
+        """
+        try:
+            return await self._write_with_retry([record])
+        except NON_RETRYABLE_ERRORS as e:
+            error = e
+        await self._dead_letter(record, error)
+        return None
+
+    async def _dead_letter(self, record: Any, error: Exception) -> None:
+        logger.error("[Ingest] moving submission %s to %s: %s",
+                     record.get('submission_id') if isinstance(record, dict) else None, self.dead_letter_path, error)
+        await asyncio.to_thread(self._append_dead_letter, record, error)
+        self._dead_letters += 1
+
+    async def _write_with_retry(self, batch: List[Dict[str, Any]]):
+        """
+        一時的なエラーは DB が戻るまで再試行する。書き込んだレコードを返し、停止中に諦めた場合は False。
+        NON_RETRYABLE_ERRORS はそのまま送出する。
+        """
+        delay = 0.5
+        while True:
+            try:
+                async with self.pool.acquire() as conn:
+                    return await write_records(conn, batch)
+            except NON_RETRYABLE_ERRORS:
+                raise
+            except Exception as e:
+                # ジャーナルに残っているので失われはしない。DBが戻るまで再試行する
+                # （DB以外の例外はコードの不具合なので、トレースバックを残して気付けるようにする）
+                logger.warning("[Ingest] batch write failed (%s rows), retry in %.1fs: %s", len(batch), delay, e,
+                               exc_info=not isinstance(e, aiomysql.Error))
+                if self._closing and delay >= 8:
+                    # 以降は ack しないので、次回起動時にジャーナルから再投入される
+                    logger.error("[Ingest] giving up on shutdown; unwritten rows remain in %s", self.journal_path)
+                    return False
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    # --- ジャーナル ---
+    def _append_journal(self, entry: Dict[str, Any]) -> None:
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def _append_dead_letter(self, record: Any, error: Exception) -> None:
+        entry = dict(record if isinstance(record, dict) else {'record': record},
+                     error=f"{type(error).__name__}: {error}",
+                     failed_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _truncate_journal(self) -> None:
+        with open(self.journal_path, 'w', encoding='utf-8'):
+            pass
+
+    def _read_journal(self) -> Tuple[List[Dict[str, Any]], List[Any], int]:
+        """未 ack のレコード、seq を持たない壊れた行、ジャーナル内の最大 seq を返す"""
+        if not os.path.exists(self.journal_path):
+            return [], [], 0
+        records: Dict[int, Dict[str, Any]] = {}
+        broken: List[Any] = []
+        acked = 0
+        with open(self.journal_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # 書きかけの行（クラッシュ時）は捨てる
+                if isinstance(entry, dict) and _is(entry.get('ack'), int):
+                    acked = max(acked, entry['ack'])
+                elif isinstance(entry, dict) and _is(entry.get('seq'), int):
+                    records[entry['seq']] = entry
+                else:
+                    broken.append(entry)
+        last_seq = max([acked, *records.keys()])
+        return [r for seq, r in sorted(records.items()) if seq > acked], broken, last_seq
@@ -0,0 +1,221 @@
+"""
+管理者DM通知の送信サービス（bot.notifier）
+- DMチャンネルは初回だけ取得してキャッシュする（送信ごとの fetch_user をやめる）
+- notify / send はキューに積むだけで待たない。送信はバックグラウンドタスクが1件ずつ行う
+- notify は同じ (category, key) の通知を window 秒間まとめ、1つの Embed にして送る
+  例: 「#code で直近30秒に 12 件のメッセージを削除」
+- カテゴリごとに1時間あたりの送信上限を設け、超えた分は件数だけ数えて次の通知に添える
+"""
+
+import time
+import asyncio
+import logging
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Hashable, List, Optional, Tuple
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# まとめた通知に載せる明細の最大行数
+MAX_DETAIL_LINES = 10
+
+# カテゴリごとの1時間あたり送信上限（未指定のカテゴリは default_cap）
+DEFAULT_CAPS = {
+    'filter': 20,
+    'mass_mute': 20,
+    'system': 10,
+}
+
+
+@dataclass
+class _Bucket:
+    title: str
+    color: int
+    count: int = 0
+    lines: List[str] = field(default_factory=list)
+    started: float = field(default_factory=time.monotonic)
+
+
+class AdminNotifier:
+    def __init__(
+        self,
+        bot: discord.Client,
+        owner_id: Optional[int],
+        *,
+        window: float = 30.0,
+        max_queue: int = 500,
+        caps: Optional[Dict[str, int]] = None,
+        default_cap: int = 30,
+    ):
+        self.bot = bot
+        self.owner_id = owner_id
+        self.window = window
+        self.caps = dict(DEFAULT_CAPS, **(caps or {}))
+        self.default_cap = default_cap
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._buckets: Dict[Tuple[str, Hashable], _Bucket] = {}
+        self._timers: Dict[Tuple[str, Hashable], asyncio.TimerHandle] = {}
+        self._sent_at: Dict[str, Deque[float]] = {}
+        self._suppressed_pending: Counter = Counter()
+        self._dm: Optional[discord.DMChannel] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # メトリクス
+        self.enqueued = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
+        self.suppressed: Counter = Counter()
+        self.dm_lookups = 0
+
+    # --- ライフサイクル ---
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """まとめ中の通知も含めて送り切ってから止める（timeout 秒で打ち切り）"""
+        for key in list(self._buckets):
+            self._flush_bucket(key)
+        if self._task is None:
+            return
+        if not self.bot.is_ready():
+            self._task.cancel()
+            self._task = None
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("[Notifier] %s notifications left unsent on shutdown", self._queue.qsize())
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'queued': self._queue.qsize(),
+            'buckets': len(self._buckets),
+            'enqueued': self.enqueued,
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'suppressed': dict(self.suppressed),
+            'dm_lookups': self.dm_lookups,
+        }
+
+    # --- 受付 ---
+    def send(self, category: str, *, content: Optional[str] = None, embed: Optional[discord.Embed] = None) -> None:
+        """まとめずにそのまま送る（完了報告など）"""
+        self._enqueue(category, content, embed)
+
+    def notify(self, category: str, title: str, line: str, *, key: Hashable = None, color: int = 0xff9800) -> None:
+        """
+        同じ (category, key) の通知を window 秒間まとめて送る。
+        1件だけなら line をそのまま、複数なら件数と明細（先頭 MAX_DETAIL_LINES 行）を送る。
+        """
+        if self.window <= 0:
+            self._enqueue(category, None, discord.Embed(title=title, description=line, color=color))
+            return
+
+        bkey = (category, key)
+        bucket = self._buckets.get(bkey)
+        if bucket is None:
+            bucket = self._buckets[bkey] = _Bucket(title=title, color=color)
+            loop = asyncio.get_running_loop()
+            self._timers[bkey] = loop.call_later(self.window, self._flush_bucket, bkey)
+        else:
+            self.coalesced += 1
+        bucket.count += 1
+        if len(bucket.lines) < MAX_DETAIL_LINES:
+            bucket.lines.append(line)
+
+    # --- 内部処理 ---
+    def _flush_bucket(self, bkey: Tuple[str, Hashable]) -> None:
+        timer = self._timers.pop(bkey, None)
+        if timer is not None:
+            timer.cancel()
+        bucket = self._buckets.pop(bkey, None)
+        if bucket is None:
+            return
+
+        if bucket.count == 1:
+            embed = discord.Embed(title=bucket.title, description=bucket.lines[0], color=bucket.color)
+        else:
+            elapsed = max(int(time.monotonic() - bucket.started), 1)
+            desc = [f"直近 {elapsed} 秒で **{bucket.count} 件**"] + bucket.lines
+            if bucket.count > len(bucket.lines):
+                desc.append(f"…ほか {bucket.count - len(bucket.lines)} 件")
+            embed = discord.Embed(title=f"{bucket.title}（{bucket.count}件）", description="\n".join(desc), color=bucket.color)
+        self._enqueue(bkey[0], None, embed)
+
+    def _enqueue(self, category: str, content: Optional[str], embed: Optional[discord.Embed]) -> None:
+        if not self._allow(category):
+            self.suppressed[category] += 1
+            self._suppressed_pending[category] += 1
+            return
+
+        # 上限で抑制していた分があれば件数を添える（キューに積めたときだけ消す）
+        skipped = self._suppressed_pending.get(category, 0)
+        if skipped:
+            note = f"（上限のため {skipped} 件の通知を省略しました）"
+            if embed is not None:
+                embed.set_footer(text=note)
+            else:
+                content = f"{content}\n{note}"
+
+        try:
+            self._queue.put_nowait((content, embed))
+        except asyncio.QueueFull:
+            # 送らなかったので上限の枠は使わない（省略件数も次の通知に持ち越す）
+            self.dropped += 1
+            return
+        self.enqueued += 1
+        self._suppressed_pending.pop(category, None)
+        self._sent_at[category].append(time.monotonic())
+
+    def _allow(self, category: str) -> bool:
+        """カテゴリごとの直近1時間の送信数が上限未満か（枠はキューに積めたときに _enqueue が使う）"""
+        cap = self.caps.get(category, self.default_cap)
+        now = time.monotonic()
+        sent = self._sent_at.setdefault(category, deque())
+        while sent and now - sent[0] > 3600:
+            sent.popleft()
+        return len(sent) < cap
+
+    async def _dm_channel(self) -> Optional[discord.DMChannel]:
+        if self._dm is not None:
+            return self._dm
+        if self.owner_id is None:
+            return None
+        self.dm_lookups += 1
+        user = self.bot.get_user(self.owner_id) or await self.bot.fetch_user(self.owner_id)
+        self._dm = user.dm_channel or await user.create_dm()
+        return self._dm
+
+    async def _run(self) -> None:
+        await self.bot.wait_until_ready()
+        while True:
+            content, embed = await self._queue.get()
+            try:
+                dm = await self._dm_channel()
+                if dm is None:
+                    continue
+                await dm.send(content=content, embed=embed)
+                self.sent += 1
+            except discord.Forbidden:
+                self.failed += 1
+                logger.warning("[Notifier] Failed to send DM (Forbidden).")
+            except Exception as e:
+                self.failed += 1
+                self._dm = None  # 次回は取り直す
+                logger.warning("[Notifier] Failed to send DM: %s", e)
+            finally:
+                self._queue.task_done()
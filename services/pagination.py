@@ -0,0 +1,43 @@
+"""
+キーセット（カーソル）方式のページ送り
+- 並び順は (時刻列 DESC, id DESC)。OFFSET を使わないので何ページ目でもコストが一定
+- カーソルは最後に表示した行の (時刻, id) を "YYYY-MM-DDTHH:MM:SS_id" にした文字列
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+CURSOR_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+def encode_cursor(ts: datetime, row_id: int) -> str:
+    """(時刻, id) をページ送り用のカーソル文字列にする"""
+    return f"{ts.strftime(CURSOR_TIME_FORMAT)}_{row_id}"
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """カーソル文字列を (時刻, id) に戻す（不正なら None）"""
+    if not cursor:
+        return None
+    try:
+        ts, rid = cursor.rsplit('_', 1)
+        return datetime.strptime(ts, CURSOR_TIME_FORMAT), int(rid)
+    except ValueError:
+        return None
+
+def after_clause(ts_column: str, after: Optional[Tuple[datetime, int]]) -> Tuple[str, tuple]:
+    """カーソルより後ろ（古い側）の行に絞る WHERE 条件とパラメータを返す"""
+    if after is None:
+        return "1=1", ()
+    ts, rid = after
+    return f"({ts_column} < %s OR ({ts_column} = %s AND id < %s))", (ts, ts, rid)
+
+def split_page(rows: List[Dict[str, Any]], limit: int, ts_key: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    limit + 1 件取得した結果を、表示する limit 件と次ページのカーソルに分ける。
+    続きがなければカーソルは None。
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last[ts_key], last['id'])
@@ -0,0 +1,181 @@
+"""
+結果ページのライブ更新（/results/<id>/stream の Server-Sent Events）
+- ResultsHub はプロセス内の pub/sub。回答が書き込まれるたびに publish_records で
+  票数の差分をそのアンケートを見ている購読者へ配る（購読者がいなければ何もしない）
+- 差分は購読者ごとに溜めておき、ストリーム側が取り出すときに1つのイベントにまとめる
+  （送信が遅い閲覧者がいてもキューが伸びず、回答が集中しても送るイベント数は増えない）
+- ストリームは heartbeat 秒ごとにコメント行を送り、切断を検出する。
+  heartbeat の数倍のあいだ取り出しのない購読者は reaper が閉じる
+"""
+
+import json
+import time
+import asyncio
+import logging
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# 1回の差分イベントに載せる自由記述の最大件数（超えた分は古いものから捨てる）
+MAX_TEXTS_PER_EVENT = 50
+
+
+class HubFull(Exception):
+    """購読者数が上限に達している（呼び出し側は 503 を返す）"""
+
+
+# 切断検出用のコメント行（EventSource は無視する）
+HEARTBEAT = ": ping\n\n"
+
+
+def format_event(event: str, data: Dict[str, Any]) -> str:
+    """SSE の1イベント分の文字列"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class Subscription:
+    def __init__(self, survey_id: int):
+        self.survey_id = survey_id
+        self.closed = False
+        self.last_seen = time.monotonic()
+
+        self._responses = 0
+        self._counts: Counter = Counter()
+        self._texts: Deque[list] = deque(maxlen=MAX_TEXTS_PER_EVENT)
+        self._wakeup = asyncio.Event()
+
+    def _push(self, responses: int, counts: Counter, texts: Iterable[list]) -> None:
+        self._responses += responses
+        self._counts.update(counts)
+        self._texts.extend(texts)
+        self._wakeup.set()
+
+    def _take(self) -> Optional[Dict[str, Any]]:
+        if not self._responses:
+            return None
+        delta = {
+            'responses': self._responses,
+            'counts': [[q_idx, answer, n] for (q_idx, answer), n in self._counts.items()],
+            'texts': list(self._texts),
+        }
+        self._responses = 0
+        self._counts.clear()
+        self._texts.clear()
+        return delta
+
+    def close(self) -> None:
+        self.closed = True
+        self._wakeup.set()
+
+    async def next(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        溜まった差分をまとめて返す。timeout 秒のあいだ何もなければ None（heartbeat を送る合図）。
+        閉じられた場合も None を返すので、呼び出し側は closed を確認すること。
+        """
+        self.last_seen = time.monotonic()
+        delta = self._take()
+        if delta is not None or self.closed:
+            return delta
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.last_seen = time.monotonic()
+        return self._take()
+
+
+class ResultsHub:
+    def __init__(self, *, max_subscribers: int = 1000, heartbeat: float = 15.0, idle_factor: float = 4.0):
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        self.idle_timeout = heartbeat * idle_factor
+
+        self._subs: Dict[int, Set[Subscription]] = {}
+        self._count = 0
+        self._reaper: Optional[asyncio.Task] = None
+
+        self.published = 0  # 配った回答数（購読者のいないアンケートは数えない）
+        self.rejected = 0
+        self.reaped = 0
+
+    # --- ライフサイクル ---
+    def start(self) -> None:
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_loop())
+
+    async def stop(self) -> None:
+        """購読者をすべて閉じる（開いているストリームはそれぞれ終了する）"""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+            self._reaper = None
+        for subs in list(self._subs.values()):
+            for sub in list(subs):
+                sub.close()
+
+    # --- 購読 ---
+    def subscribe(self, survey_id: int) -> Subscription:
+        if self._count >= self.max_subscribers:
+            self.rejected += 1
+            raise HubFull()
+        sub = Subscription(survey_id)
+        self._subs.setdefault(survey_id, set()).add(sub)
+        self._count += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        sub.close()
+        subs = self._subs.get(sub.survey_id)
+        if subs is None or sub not in subs:
+            return
+        subs.discard(sub)
+        self._count -= 1
+        if not subs:
+            del self._subs[sub.survey_id]
+
+    # --- 配信 ---
+    def publish_records(self, records: Iterable[Dict[str, Any]]) -> None:
+        """
+        書き込み済みの回答レコード（ingest.new_record）の差分を購読者に配る。
+        texts には自由記述と定義外の選択肢の値が入る（表示する設問はクライアント側で選ぶ）。
+        """
+        for r in records:
+            subs = self._subs.get(r['survey_id'])
+            if not subs:
+                continue
+            counts = Counter({(q_idx, answer): n for q_idx, answer, n in r['counts']})
+            texts = [[q_idx, body] for q_idx, _, body in r.get('texts', [])]
+            for sub in subs:
+                sub._push(1, counts, texts)
+            self.published += 1
+
+    # --- 掃除 ---
+    async def _reap_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            self.reap()
+
+    def reap(self) -> int:
+        """idle_timeout を過ぎても取り出しのない購読者（切断に気づけなかったストリーム）を外す"""
+        cutoff = time.monotonic() - self.idle_timeout
+        stale = [sub for subs in self._subs.values() for sub in subs if sub.last_seen < cutoff]
+        for sub in stale:
+            self.unsubscribe(sub)
+        if stale:
+            self.reaped += len(stale)
+            logger.info("[ResultsHub] reaped %s idle streams", len(stale))
+        return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'subscribers': self._count,
+            'surveys': len(self._subs),
+            'published': self.published,
+            'rejected': self.rejected,
+            'reaped': self.reaped,
+        }
@@ -0,0 +1,70 @@
+"""
+回答送信のレート制限（トークンバケット）
+- キーごと（ログインユーザー / 送信元IP）に burst 個までトークンを貯め、rate 個/秒で補充する
+- 送信1件でトークンを1つ使い、足りなければ拒否して次に送れるまでの秒数を返す
+- バケットはプロセス内の辞書に持ち、evict_interval 秒ごとに満タンに戻ったもの（しばらく送っていないキー）を捨てる
+- DB を使わないので、拒否はコネクションを取得する前に判定できる
+"""
+
+import time
+from typing import Dict, Hashable, List, Optional
+
+
+class TokenBucketLimiter:
+    def __init__(self, rate: float, burst: int, *, evict_interval: float = 60.0, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.evict_interval = evict_interval
+        self._clock = clock
+
+        # key -> [残りトークン, 最終更新時刻]
+        self._buckets: Dict[Hashable, List[float]] = {}
+        self._next_evict = clock() + evict_interval
+
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def acquire(self, key: Hashable) -> Optional[float]:
+        """
+        トークンを1つ使う。送ってよければ None、拒否する場合は次に送れるまでの秒数を返す。
+        rate が 0 以下なら制限しない。
+        """
+        if self.rate <= 0:
+            return None
+        now = self._clock()
+        if now >= self._next_evict:
+            self.evict(now)
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.burst), now]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            self.allowed += 1
+            return None
+        self.rejected += 1
+        return (1 - bucket[0]) / self.rate
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """満タンまで回復しているバケットを捨てる（次に来たときは新しいバケットで同じ結果になる）"""
+        now = self._clock() if now is None else now
+        refill = self.burst / self.rate if self.rate > 0 else 0
+        stale = [k for k, (_, updated) in self._buckets.items() if now - updated >= refill]
+        for k in stale:
+            del self._buckets[k]
+        self._next_evict = now + self.evict_interval
+        self.evicted += len(stale)
+        return len(stale)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'keys': len(self._buckets),
+            'allowed': self.allowed,
+            'rejected': self.rejected,
+            'evicted': self.evicted,
+        }
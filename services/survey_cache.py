@@ -0,0 +1,92 @@
+"""
+パース済みアンケート定義のプロセス内キャッシュ (TTL + LRU)
+- キーは survey_id、値は surveys の行・parse_questions 済みの設問・version
+- save_survey / toggle_status / delete_survey で明示的に無効化する
+- 同じIDの読み込みが重なった場合はDBアクセスを1回にまとめる
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import aiomysql
+from cachetools import TTLCache
+
+
+@dataclass(frozen=True)
+class CachedSurvey:
+    survey: Dict[str, Any]           # surveys の行（書き換えないこと）
+    questions: List[Dict[str, Any]]  # parse_questions 済み
+    version: int
+
+
+class SurveyCache:
+    def __init__(self, parse_questions: Callable[[str], List[Dict[str, Any]]], *, maxsize: int = 1024, ttl: float = 300):
+        self._parse = parse_questions
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight: Dict[int, asyncio.Future] = {}
+        # 読み込み中に無効化されたID（読み込み中のIDだけを持つので、_inflight より大きくならない）
+        self._stale: Set[int] = set()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # 読み込み中の同じIDを待ち合わせた回数
+        self.invalidations = 0
+
+    async def get(self, pool, survey_id: int) -> Optional[CachedSurvey]:
+        entry = self._cache.get(survey_id)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        inflight = self._inflight.get(survey_id)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[survey_id] = fut
+        try:
+            entry = await self._load(pool, survey_id)
+            # 読み込み中に無効化されていたら古い可能性があるので保存しない
+            if entry is not None and survey_id not in self._stale:
+                self._cache[survey_id] = entry
+            fut.set_result(entry)
+            return entry
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # 待ち手がいなくても警告を出さない
+            raise
+        finally:
+            self._inflight.pop(survey_id, None)
+            self._stale.discard(survey_id)
+
+    def invalidate(self, survey_id: int) -> None:
+        self._cache.pop(survey_id, None)
+        if survey_id in self._inflight:
+            self._stale.add(survey_id)
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._cache),
+            'maxsize': self._cache.maxsize,
+            'ttl': self._cache.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            'invalidations': self.invalidations,
+        }
+
+    async def _load(self, pool, survey_id: int) -> Optional[CachedSurvey]:
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                await cur.execute("SELECT * FROM surveys WHERE id=%s", (survey_id,))
+                survey = await cur.fetchone()
+        if not survey:
+            return None
+        return CachedSurvey(survey=survey, questions=self._parse(survey['questions']), version=survey.get('version') or 1)
@@ -0,0 +1,224 @@
+"""
+アンケート集計ストア
+- survey_answer_counts: (survey_id, q_idx, answer) ごとの票数（選択式の設問のみ）
+- survey_stats: survey_id ごとの回答総数
+submit_response で回答を INSERT するたびに差分を加算し、
+結果ページは事前集計済みの件数を読むだけにする（回答数に依存しない）。
+作り直し（rebuild）と自由記述の読み出しは正規化テーブル（services/answer_store.py）を使う。
+"""
+
+import json
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+# 件数を集計する設問タイプ（それ以外は自由記述としてページ送りで表示）
+CHOICE_TYPES = ('radio', 'checkbox', 'select')
+
+# 自由記述の1ページあたりの件数
+TEXT_PAGE_SIZE = 50
+
+# answer 列はインデックスに載せるため utf8mb4 で 191 文字まで
+ANSWER_MAX_LEN = 191
+
+# ------------------------------------------------------------------
+#  純粋関数
+# ------------------------------------------------------------------
+def answer_for(answers: Dict[str, Any], q_idx: str) -> Any:
+    """回答JSONから設問の値を取り出す（旧形式の 'N[]' キーにも対応）"""
+    val = answers.get(q_idx)
+    if val is None:
+        val = answers.get(f'{q_idx}[]')
+    return val
+
+def answer_values(val: Any) -> List[str]:
+    """回答値を空でない文字列のリストに揃える"""
+    if not val:
+        return []
+    if isinstance(val, list):
+        return [str(v) for v in val if v]
+    return [str(val)]
+
+def count_choices(questions: List[Dict[str, Any]], answers: Dict[str, Any]) -> Counter:
+    """1件の回答から (q_idx, answer) ごとの票数を数える"""
+    counts = Counter()
+    for i, q in enumerate(questions):
+        if q.get('type') not in CHOICE_TYPES:
+            continue
+        for v in answer_values(answer_for(answers, str(i))):
+            counts[(i, v[:ANSWER_MAX_LEN])] += 1
+    return counts
+
+def load_answers(raw: Optional[str]) -> Dict[str, Any]:
+    """answers 列を辞書として読み込む（壊れていれば空）"""
+    try:
+        data = json.loads(raw)
+    except Exception:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+# ------------------------------------------------------------------
+#  DB操作
+# ------------------------------------------------------------------
+async def apply_counts(cur, survey_id: int, counts: Counter, responses: int = 1):
+    """集計ストアに差分を加算する（回答 INSERT と同じ接続で呼ぶ）"""
+    if counts:
+        await cur.executemany(
+            "INSERT INTO survey_answer_counts (survey_id, q_idx, answer, cnt) VALUES (%s, %s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE cnt = cnt + VALUES(cnt)",
+            [(survey_id, q_idx, answer, n) for (q_idx, answer), n in counts.items()]
+        )
+    await cur.execute(
+        "INSERT INTO survey_stats (survey_id, response_count) VALUES (%s, %s) "
+        "ON DUPLICATE KEY UPDATE response_count = response_count + VALUES(response_count)",
+        (survey_id, responses)
+    )
+
+async def lock_survey(cur, survey_id: int) -> None:
+    """
+    surveys の行を排他ロックする（トランザクション内で使う）。
+    回答の書き込み（ingest.write_records）は同じ行を共有ロックするので、作り直しの間は待たされ、
+    作り直しが読む回答と加算済みの票数がずれない。
+    """
+    await cur.execute("SELECT id FROM surveys WHERE id=%s FOR UPDATE", (survey_id,))
+    await cur.fetchall()
+
+async def delete_counts(cur, survey_id: int):
+    """アンケート削除時に集計も消す"""
+    await cur.execute("DELETE FROM survey_answer_counts WHERE survey_id=%s", (survey_id,))
+    await cur.execute("DELETE FROM survey_stats WHERE survey_id=%s", (survey_id,))
+
+async def count_answers(cur, survey_id: int, questions: List[Dict[str, Any]]) -> Counter:
+    """
+    正規化テーブル（services/answer_store.py）を GROUP BY して (q_idx, answer) ごとの票数を数える。
+    選択肢は option_id を現在の options の文字列に戻し、定義外の値は本文ごとに数える。
+    """
+    choice = [i for i, q in enumerate(questions) if q.get('type') in CHOICE_TYPES]
+    counts = Counter()
+    if not choice:
+        return counts
+
+    await cur.execute(
+        "SELECT q_idx, option_id, COUNT(*) FROM survey_answers WHERE survey_id=%s GROUP BY q_idx, option_id",
+        (survey_id,)
+    )
+    for q_idx, option_id, n in await cur.fetchall():
+        if q_idx not in choice:
+            continue
+        options = questions[q_idx].get('options') or []
+        if option_id < len(options):
+            counts[(q_idx, str(options[option_id])[:ANSWER_MAX_LEN])] += n
+
+    placeholders = ", ".join(["%s"] * len(choice))
+    await cur.execute(
+        f"SELECT q_idx, LEFT(body, {ANSWER_MAX_LEN}), COUNT(*) FROM survey_answer_texts "
+        f"WHERE survey_id=%s AND q_idx IN ({placeholders}) GROUP BY q_idx, LEFT(body, {ANSWER_MAX_LEN})",
+        (survey_id, *choice)
+    )
+    for q_idx, answer, n in await cur.fetchall():
+        counts[(q_idx, answer)] += n
+    return counts
+
+async def rebuild(pool, survey_id: int, questions: List[Dict[str, Any]]) -> int:
+    """
+    正規化テーブルの GROUP BY から集計ストアを作り直す（回答の JSON は読まない）。
+    読み出しから書き戻しまでアンケートの行をロックし、その間の回答の書き込みを待たせる。
+    戻り値は再集計した回答数。
+    """
+    async with pool.acquire() as conn:
+        await conn.begin()
+        try:
+            async with conn.cursor() as cur:
+                await lock_survey(cur, survey_id)
+                counts = await count_answers(cur, survey_id, questions)
+                await cur.execute("SELECT COUNT(*) FROM survey_responses WHERE survey_id=%s", (survey_id,))
+                (total,) = await cur.fetchone()
+                await delete_counts(cur, survey_id)
+                await apply_counts(cur, survey_id, counts, total)
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            raise
+    return total
+
+async def load_counts(cur, survey_id: int, questions: List[Dict[str, Any]]) -> Tuple[Dict[int, Dict[str, int]], int]:
+    """
+    事前集計済みの票数を選択式の設問ごとに表示順で返す（cur は DictCursor）。
+    並びは選択肢の定義順 → 定義外（「その他」の記述など）は票数順。戻り値の2つ目は回答総数。
+    """
+    await cur.execute("SELECT response_count FROM survey_stats WHERE survey_id=%s", (survey_id,))
+    row = await cur.fetchone()
+    response_count = row['response_count'] if row else 0
+
+    await cur.execute("SELECT q_idx, answer, cnt FROM survey_answer_counts WHERE survey_id=%s AND cnt > 0", (survey_id,))
+    per_question: Dict[int, Dict[str, int]] = {}
+    for r in await cur.fetchall():
+        per_question.setdefault(r['q_idx'], {})[r['answer']] = r['cnt']
+
+    counts: Dict[int, Dict[str, int]] = {}
+    for i, q in enumerate(questions):
+        if q.get('type', 'text') not in CHOICE_TYPES:
+            continue
+        found = per_question.get(i, {})
+        ordered = {o: found[o] for o in q.get('options', []) if o in found}
+        for answer, cnt in sorted(found.items(), key=lambda kv: -kv[1]):
+            ordered.setdefault(answer, cnt)
+        counts[i] = ordered
+    return counts, response_count
+
+async def load_stats(cur, survey_id: int, questions: List[Dict[str, Any]]) -> Tuple[Dict[str, Dict[str, Any]], int]:
+    """
+    事前集計済みの票数から結果ページ用の stats を組み立てる（cur は DictCursor）。
+    自由記述は先頭1ページだけ読み、続きは fetch_texts でページ送りする。
+    """
+    counts, response_count = await load_counts(cur, survey_id, questions)
+
+    stats = {}
+    for i, q in enumerate(questions):
+        q_idx = str(i)
+        q_type = q.get('type', 'text')
+        stats[q_idx] = {'question': q.get('text', '(無題の質問)'), 'type': q_type, 'data': [], 'total': 0}
+
+        if i in counts:
+            stats[q_idx]['counts'] = counts[i]
+            stats[q_idx]['total'] = sum(counts[i].values())
+        else:
+            texts, next_cursor = await fetch_texts(cur, survey_id, i)
+            stats[q_idx]['texts'] = texts
+            stats[q_idx]['total'] = len(texts)
+            stats[q_idx]['next_cursor'] = next_cursor
+
+    return stats, response_count
+
+def _decode_text_cursor(cursor: Optional[str]) -> Optional[Tuple[int, int]]:
+    """自由記述のカーソル "response_id_seq" を戻す（不正なら None = 先頭から）"""
+    if not cursor:
+        return None
+    try:
+        rid, seq = cursor.split('_', 1)
+        return int(rid), int(seq)
+    except ValueError:
+        return None
+
+async def fetch_texts(cur, survey_id: int, q_idx: int, cursor: Optional[str] = None,
+                      limit: int = TEXT_PAGE_SIZE) -> Tuple[List[str], Optional[str]]:
+    """
+    自由記述の回答を新しい順に limit 件ずつ返す（cur は DictCursor）。
+    survey_answer_texts の (response_id, seq) のキーセットでページ送りし、続きがなければ next_cursor は None。
+    """
+    after = _decode_text_cursor(cursor)
+    cond, params = "1=1", ()
+    if after is not None:
+        cond = "(response_id < %s OR (response_id = %s AND seq < %s))"
+        params = (after[0], after[0], after[1])
+
+    await cur.execute(
+        "SELECT response_id, seq, body FROM survey_answer_texts "
+        f"WHERE survey_id=%s AND q_idx=%s AND {cond} ORDER BY response_id DESC, seq DESC LIMIT %s",
+        (survey_id, q_idx, *params, limit + 1)
+    )
+    rows = await cur.fetchall()
+    if len(rows) <= limit:
+        return [r['body'] for r in rows], None
+    rows = rows[:limit]
+    last = rows[-1]
+    return [r['body'] for r in rows], f"{last['response_id']}_{last['seq']}"
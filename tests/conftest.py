@@ -0,0 +1,18 @@
+import os
+import sys
+import importlib.machinery
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# リポジトリ直下のモジュール（migrations, database, cogs ...）を import できるようにする
+sys.path.insert(0, ROOT)
+
+# config.py が無い環境（CI など）では config.py.example を config として読み込む（cogs の import 用）
+if not os.path.exists(os.path.join(ROOT, 'config.py')):
+    _loader = importlib.machinery.SourceFileLoader('config', os.path.join(ROOT, 'config.py.example'))
+    _config = importlib.util.module_from_spec(importlib.util.spec_from_loader('config', _loader))
+    _loader.exec_module(_config)
+    # bot.py が読む GUILD_ID は config.py.example に無い（未設定ならグローバル同期）
+    _config.__dict__.setdefault('GUILD_ID', None)
+    sys.modules['config'] = _config
@@ -0,0 +1,71 @@
+"""
+ActiveWindow.from_hours が is_active_time と同じ判定をするか（日跨ぎ・start==end・end==24・時間の境界）
+"""
+
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from common.time_utils import ActiveWindow, is_active_time
+
+TOKYO = ZoneInfo("Asia/Tokyo")
+NEW_YORK = ZoneInfo("America/New_York")
+
+# 範囲外の値（負・24超）も含めた start / end の全組み合わせ
+HOURS = range(-1, 27)
+
+
+def _boundary_times(tz, day):
+    """その日の各時刻の 0分0秒・59分59秒（切り替わりの直前・直後）"""
+    for hour in range(24):
+        at = datetime(day.year, day.month, day.day, hour, tzinfo=tz)
+        yield at
+        yield at + timedelta(minutes=59, seconds=59)
+
+
+@pytest.mark.parametrize("start", HOURS)
+def test_matches_is_active_time_at_every_boundary(start):
+    day = datetime(2026, 3, 4)
+    for end in HOURS:
+        window = ActiveWindow.from_hours(start, end, TOKYO)
+        for at in _boundary_times(TOKYO, day):
+            active, until = window.evaluate(at)
+            assert active == is_active_time(start, end, TOKYO, at), (start, end, at)
+            assert until > at
+
+
+@pytest.mark.parametrize("start, end, active_hours", [
+    (22, 6, {22, 23, 0, 1, 2, 3, 4, 5}),  # 日跨ぎ
+    (23, 0, {23}),                         # 日跨ぎで終わりが0時
+    (5, 5, set(range(24))),                # start == end は全時間
+    (0, 24, set(range(24))),
+    (20, 24, {20, 21, 22, 23}),            # end == 24
+    (24, 0, set()),                        # 一度も稼働しない
+    (0, 1, {0}),
+])
+def test_named_cases(start, end, active_hours):
+    window = ActiveWindow.from_hours(start, end, TOKYO)
+    for at in _boundary_times(TOKYO, datetime(2026, 3, 4)):
+        assert window.evaluate(at)[0] == (at.hour in active_hours), (start, end, at)
+
+
+@pytest.mark.parametrize("start, end", [(22, 6), (1, 3), (20, 24), (0, 2)])
+def test_transition_time_flips_state(start, end):
+    window = ActiveWindow.from_hours(start, end, TOKYO)
+    at = datetime(2026, 3, 4, 12, 30, tzinfo=TOKYO)
+    for _ in range(6):
+        active, until = window.evaluate(at)
+        assert window.evaluate(until - timedelta(seconds=1))[0] == active
+        assert window.evaluate(until)[0] != active
+        at = until
+
+
+@pytest.mark.parametrize("day", [datetime(2026, 3, 8), datetime(2026, 11, 1)])  # 夏時間の開始・終了日
+def test_matches_is_active_time_across_dst(day):
+    for start, end in [(1, 3), (22, 2), (2, 24), (0, 2)]:
+        window = ActiveWindow.from_hours(start, end, NEW_YORK)
+        at = datetime(day.year, day.month, day.day, tzinfo=timezone.utc) - timedelta(hours=6)
+        for _ in range(24 * 4):
+            assert window.evaluate(at)[0] == is_active_time(start, end, NEW_YORK, at), (start, end, at)
+            at += timedelta(minutes=15)
@@ -0,0 +1,58 @@
+"""
+MyBot._schedule_event（discord.py の非公開メソッドの置き換え）がライブラリの実装と噛み合っているか。
+discord.py を更新してこのテストが落ちたら、MyBot._schedule_event を新しい実装に合わせること。
+"""
+
+import asyncio
+import inspect
+from types import SimpleNamespace
+
+import discord
+
+from bot import MyBot
+
+# (名前, 種類) の並び。Client.dispatch は _schedule_event(coro, method, *args, **kwargs) と呼ぶ
+EXPECTED_PARAMS = [
+    ('self', inspect.Parameter.POSITIONAL_OR_KEYWORD),
+    ('coro', inspect.Parameter.POSITIONAL_OR_KEYWORD),
+    ('event_name', inspect.Parameter.POSITIONAL_OR_KEYWORD),
+    ('args', inspect.Parameter.VAR_POSITIONAL),
+    ('kwargs', inspect.Parameter.VAR_KEYWORD),
+]
+
+
+def _params(func):
+    return [(p.name, p.kind) for p in inspect.signature(func).parameters.values()]
+
+
+def test_client_methods_keep_their_signature():
+    assert _params(discord.Client._schedule_event) == EXPECTED_PARAMS
+    assert _params(discord.Client._run_event) == EXPECTED_PARAMS
+    assert _params(MyBot._schedule_event) == EXPECTED_PARAMS
+
+
+def test_dispatch_goes_through_prefilter_and_timing():
+    class Listener:
+        def __init__(self):
+            self.seen = []
+
+        async def on_message(self, message):
+            self.seen.append(message.id)
+
+    async def main():
+        bot = MyBot()
+        bot.loop = asyncio.get_running_loop()
+        listener = Listener()
+        bot.add_listener(listener.on_message, 'on_message')
+        bot.metrics.add_prefilter(listener.on_message, lambda message: message.id % 2 == 0)
+
+        for i in range(4):
+            bot.dispatch('message', SimpleNamespace(id=i))
+        await asyncio.sleep(0.05)
+        return bot, listener
+
+    bot, listener = asyncio.run(main())
+
+    assert listener.seen == [0, 2]
+    stats = bot.metrics.listeners[Listener.on_message.__qualname__]
+    assert stats.calls == 2 and stats.filtered == 2
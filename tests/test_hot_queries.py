@@ -0,0 +1,68 @@
+"""
+migrations.HOT_QUERIES が想定したインデックスを使っているかを EXPLAIN で確かめる。
+DB_HOST が設定されているときだけ実行する（接続先に未適用のマイグレーションがあれば先に適用する）。
+データが数件しかないとオプティマイザがフルスキャンを選ぶことがあるので、本番相当のデータが入ったDBで実行すること。
+
+    DB_HOST=127.0.0.1 DB_NAME=bot_db_test pytest tests/test_hot_queries.py
+"""
+
+import os
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiomysql")
+if not os.getenv('DB_HOST'):
+    pytest.skip("DB_HOST is not set", allow_module_level=True)
+
+import aiomysql
+
+import migrations
+from database import Database
+
+# クエリ名 -> (テーブル, 使ってよいインデックス)
+EXPECTED_KEYS = {
+    "dashboard surveys": ("surveys", {"idx_surveys_owner_created"}),
+    "active surveys": ("surveys", {"idx_surveys_active_created"}),
+    "my active surveys": ("surveys", {"idx_surveys_owner_created", "idx_surveys_active_created"}),
+    "csv export": ("survey_responses", {"idx_responses_survey_submitted"}),
+    "free-text page": ("survey_answer_texts", {"idx_survey_answer_texts_page"}),
+    "operation logs": ("operation_logs", {"idx_operation_logs_user_created"}),
+    "answer counts": ("survey_answer_counts", {"PRIMARY"}),
+    "option counts": ("survey_answers", {"idx_survey_answers_option", "PRIMARY"}),
+}
+
+
+async def _explain_all():
+    db = Database(minsize=1, maxsize=1)
+    await db.connect()
+    try:
+        await migrations.migrate(db)
+        plans = {}
+        async with db.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                for label, sql, params in migrations.HOT_QUERIES:
+                    await cur.execute("EXPLAIN " + sql, params)
+                    plans[label] = await cur.fetchall()
+        return plans
+    finally:
+        await db.close()
+
+
+@pytest.fixture(scope="module")
+def plans():
+    return asyncio.run(_explain_all())
+
+
+def test_every_hot_query_has_an_expectation():
+    assert {label for label, _, _ in migrations.HOT_QUERIES} == set(EXPECTED_KEYS)
+
+
+@pytest.mark.parametrize("label", [label for label, _, _ in migrations.HOT_QUERIES])
+def test_hot_query_uses_index(plans, label):
+    table, keys = EXPECTED_KEYS[label]
+    rows = [r for r in plans[label] if r.get('table') == table]
+    assert rows, f"{label}: {table} not in plan {plans[label]}"
+    for row in rows:
+        assert (row.get('type') or '').upper() != 'ALL', f"{label}: full scan on {table}: {row}"
+        assert row.get('key') in keys, f"{label}: {table} uses {row.get('key')!r}, expected one of {sorted(keys)}"
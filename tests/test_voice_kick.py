@@ -0,0 +1,130 @@
+"""
+VoiceKeeperService.kick_all_non_bots（並行切断 + 2パス目）を偽の VC で確かめる（Discord には接続しない）
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+from cogs.voice_keeper.services import VoiceKeeperService
+
+
+class FakeVoiceChannel(discord.VoiceChannel):
+    def __init__(self, channel_id: int = 1):  # 親の __init__ は呼ばない
+        self.id = channel_id
+        self.name = "配信VC"
+        self._members = {}
+
+    @property
+    def members(self):
+        return list(self._members.values())
+
+
+def _http_error(status: int, cls=discord.HTTPException):
+    return cls(SimpleNamespace(status=status, reason="error"), {"message": "error", "code": 0})
+
+
+class FakeMember:
+    def __init__(self, member_id: int, channel: FakeVoiceChannel, *, bot: bool = False, errors=()):
+        self.id = member_id
+        self.bot = bot
+        self._channel = channel
+        self._errors = list(errors)  # move_to で順に送出する例外
+        self.calls = 0
+        self.on_move = None
+        self.join()
+
+    def join(self):
+        self.voice = SimpleNamespace(channel=self._channel)
+        self._channel._members[self.id] = self
+
+    def leave(self):
+        self.voice = None
+        self._channel._members.pop(self.id, None)
+
+    async def move_to(self, channel, *, reason=None):
+        self.calls += 1
+        await asyncio.sleep(0)
+        if self._errors:
+            raise self._errors.pop(0)
+        self.leave()
+        if self.on_move is not None:
+            self.on_move()
+
+
+def _kick(channel, **kwargs):
+    kwargs.setdefault("recheck_delay", 0.01)
+    return asyncio.run(VoiceKeeperService().kick_all_non_bots(channel, **kwargs))
+
+
+def test_kicks_everyone_but_bots():
+    channel = FakeVoiceChannel()
+    humans = [FakeMember(i, channel) for i in range(12)]
+    bot = FakeMember(99, channel, bot=True)
+
+    result = _kick(channel, max_concurrency=3)
+
+    assert result.kicked == [m.id for m in humans]
+    assert result.failed == [] and result.skipped == []
+    assert channel.members == [bot] and bot.calls == 0
+    assert result.passes == 1
+
+
+def test_rejoined_member_is_kicked_in_second_pass():
+    channel = FakeVoiceChannel()
+    members = [FakeMember(i, channel) for i in range(5)]
+    # 1人目が切断された直後に入り直す
+    members[0].on_move = lambda: (setattr(members[0], "on_move", None), members[0].join())
+
+    result = _kick(channel)
+
+    assert channel.members == []
+    assert result.passes == 2 and members[0].calls == 2
+    assert result.kicked == [m.id for m in members]
+
+
+def test_member_who_already_left_is_skipped():
+    channel = FakeVoiceChannel()
+    stays, leaves = FakeMember(1, channel), FakeMember(2, channel)
+    leaves.voice = None  # channel.members にはまだ残っているが、既に自分で抜けている
+
+    result = _kick(channel, max_passes=1)
+
+    assert result.kicked == [stays.id]
+    assert result.skipped == [leaves.id]
+    assert leaves.calls == 0
+
+
+def test_forbidden_is_not_retried():
+    channel = FakeVoiceChannel()
+    member = FakeMember(1, channel, errors=[_http_error(403, discord.Forbidden)] * 3)
+
+    result = _kick(channel)
+
+    assert result.failed == [member.id] and result.kicked == []
+    assert member.calls == 1
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_api_error_is_retried_in_next_pass(status):
+    # discord.py が再試行しきれずに送出した HTTPException は、次のパスでもう一度試す
+    channel = FakeVoiceChannel()
+    flaky = FakeMember(1, channel, errors=[_http_error(status)])
+    other = FakeMember(2, channel)
+
+    result = _kick(channel)
+
+    assert result.kicked == [flaky.id, other.id] and result.failed == []
+    assert flaky.calls == 2
+
+
+def test_api_error_in_last_pass_is_reported_as_failed():
+    channel = FakeVoiceChannel()
+    member = FakeMember(1, channel, errors=[_http_error(500)] * 2)
+
+    result = _kick(channel, max_passes=2)
+
+    assert result.failed == [member.id] and result.kicked == []
+    assert channel.members == [member]
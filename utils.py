@@ -1,15 +1,192 @@
-import aiomysql
-from typing import Dict, Any
-
-async def log_operation(pool: aiomysql.Pool, user: Dict[str, Any], command: str, detail: str):
-    """操作ログをDBに記録する共通関数"""
-    if not pool: return
-    try:
-        async with pool.acquire() as conn:
+import os
+import json
+import shutil
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INSERT_LOG_SQL = (
+    "INSERT INTO operation_logs (user_id, user_name, command, detail, created_at) "
+    "VALUES (%s, %s, %s, %s, %s)"
+)
+
+LogRow = Tuple[str, str, str, str, datetime]
+
+# 停止要求の目印（キューに積んでバックグラウンドタスクを止める）
+_STOP = object()
+
+
+class OperationLogSink:
+    """
+    操作ログの非同期書き込みキュー
+    - log_operation はキューに積むだけで、リクエスト処理は書き込みを待たない
+    - バックグラウンドタスクが flush_interval 秒ごと / batch_size 件ごとにまとめて INSERT
+    - DBが使えないときはローカルファイルに退避し、復旧後に書き戻す
+    """
+
+    def __init__(
+        self,
+        pool,
+        *,
+        max_queue: int = 10000,
+        batch_size: int = 100,
+        flush_interval: float = 0.5,
+        spill_path: Optional[str] = None,
+    ):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path or os.getenv('OPLOG_SPILL_PATH', 'operation_logs.spill.jsonl')
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self._written = 0
+        self._spilled = 0
+        self._dropped = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def put(self, row: LogRow) -> None:
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            # ここで待つとリクエストが詰まるので捨てる（件数は stats で確認）
+            self._dropped += 1
+
+    async def stop(self) -> None:
+        """残っているログを書き切ってから停止する"""
+        if self._task is not None:
+            await self._queue.put(_STOP)
+            await self._task
+            self._task = None
+        await self._flush(self._drain())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'queued': self._queue.qsize(),
+            'written': self._written,
+            'spilled': self._spilled,
+            'dropped': self._dropped,
+        }
+
+    # --- 内部処理 ---
+    def _drain(self, limit: Optional[int] = None) -> List[Any]:
+        rows = []
+        while not self._queue.empty() and (limit is None or len(rows) < limit):
+            rows.append(self._queue.get_nowait())
+        return rows
+
+    async def _run(self) -> None:
+        while True:
+            # 1件目が来るまで待ち、その後 flush_interval の間だけ溜める
+            first = await self._queue.get()
+            if first is _STOP:
+                return
+            await asyncio.sleep(self.flush_interval)
+            rows = [first] + self._drain(self.batch_size - 1)
+
+            # 停止要求の後に積まれた行も捨てずに書く（キューに残った分は stop() が書き切る）
+            stopping = _STOP in rows
+            if stopping:
+                rows = [row for row in rows if row is not _STOP]
+            await self._flush(rows)
+            if stopping:
+                return
+
+    async def _flush(self, rows: List[LogRow]) -> None:
+        if not rows:
+            return
+        try:
+            await self._insert(rows)
+            self._written += len(rows)
+        except Exception as e:
+            logger.warning("Failed to write operation logs (%s rows), spilling to %s: %s", len(rows), self.spill_path, e)
+            await asyncio.to_thread(self._spill, rows)
+            self._spilled += len(rows)
+            return
+
+        # DBが戻っていれば退避分（前回の書き戻し途中で落ちた分を含む）も書き戻す
+        if os.path.exists(self.spill_path) or os.path.exists(self._replay_path):
+            await self._replay_spill()
+
+    async def _insert(self, rows: List[LogRow]) -> None:
+        if not self.pool:
+            raise RuntimeError("database pool is not available")
+        async with self.pool.acquire() as conn:
             async with conn.cursor() as cur:
-                await cur.execute(
-                    "INSERT INTO operation_logs (user_id, user_name, command, detail) VALUES (%s, %s, %s, %s)",
-                    (str(user['id']), user['name'], command, detail)
-                )
-    except Exception as e:
-        print(f"Failed to log operation: {e}")
+                await cur.executemany(INSERT_LOG_SQL, rows)
+
+    def _spill(self, rows: List[LogRow]) -> None:
+        with open(self.spill_path, 'a', encoding='utf-8') as f:
+            for user_id, user_name, command, detail, created_at in rows:
+                f.write(json.dumps([user_id, user_name, command, detail, created_at.isoformat()], ensure_ascii=False) + "\n")
+
+    def _load_spill(self, path: str) -> List[LogRow]:
+        rows = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    user_id, user_name, command, detail, created_at = json.loads(line)
+                    rows.append((user_id, user_name, command, detail, datetime.fromisoformat(created_at)))
+                except Exception:
+                    continue
+        return rows
+
+    @property
+    def _replay_path(self) -> str:
+        return self.spill_path + '.replay'
+
+    def _take_spill(self) -> List[LogRow]:
+        """
+        退避ファイルを書き戻し用ファイルへ移して読み込む
+        前回の書き戻し中に落ちて書き戻し用ファイルが残っていれば、上書きせずに後ろへ追記する
+        （その分は一部が書き込み済みの可能性があるので、重複することがある）
+        """
+        replay_path = self._replay_path
+        if os.path.exists(self.spill_path):
+            if os.path.exists(replay_path):
+                with open(self.spill_path, 'rb') as src, open(replay_path, 'ab+') as dst:
+                    # 書きかけの最終行に続けて書かないよう改行を補う
+                    if dst.tell() > 0:
+                        dst.seek(-1, os.SEEK_END)
+                        if dst.read(1) != b"\n":
+                            dst.write(b"\n")
+                    shutil.copyfileobj(src, dst)
+                os.remove(self.spill_path)
+            else:
+                os.replace(self.spill_path, replay_path)
+        if not os.path.exists(replay_path):
+            return []
+        return self._load_spill(replay_path)
+
+    async def _replay_spill(self) -> None:
+        rows = await asyncio.to_thread(self._take_spill)
+        done = 0
+        try:
+            for done in range(0, len(rows), self.batch_size):
+                await self._insert(rows[done:done + self.batch_size])
+            done = len(rows)
+        except Exception as e:
+            # 書き戻せた分は数え、残りは退避ファイルに戻して次回に回す
+            logger.warning("Failed to replay spilled operation logs (%s of %s rows written): %s", done, len(rows), e)
+            self._written += done
+            await asyncio.to_thread(self._spill, rows[done:])
+            os.remove(self._replay_path)
+            return
+
+        self._written += len(rows)
+        if os.path.exists(self._replay_path):
+            os.remove(self._replay_path)
+        if rows:
+            logger.info("Replayed %s spilled operation logs.", len(rows))
+
+
+def log_operation(sink: Optional[OperationLogSink], user: Dict[str, Any], command: str, detail: str):
+    """操作ログを記録する共通関数（キューに積むだけで待たない）"""
+    if not sink: return
+    sink.put((str(user['id']), user['name'], command, detail, datetime.now()))
@@ -1,12 +1,20 @@
 import os
-import requests
+import asyncio
+import click
 import aiomysql
+from cachetools import LRUCache, TTLCache
 from quart import Quart, render_template, request, redirect, url_for, session
 from quart_cors import cors
 from dotenv import load_dotenv
+from database import Database
+import migrations
+from utils import OperationLogSink
 
 # Blueprintの読み込み
-from routes.survey import survey_bp
+from routes.survey import survey_bp, parse_questions
+from services import answer_store, assets, dashboard, ingest, pubsub, survey_cache, survey_stats
+from services.discord_oauth import DiscordOAuthClient
+from services.rate_limit import TokenBucketLimiter
 
 load_dotenv()
 
@@ -16,23 +24,44 @@ class Config:
     CLIENT_SECRET = os.getenv('DISCORD_CLIENT_SECRET')
     REDIRECT_URI = os.getenv('DISCORD_REDIRECT_URI')
     TARGET_GUILD_ID = os.getenv('DISCORD_GUILD_ID')
-    
-    DB_CONFIG = {
-        'host': os.getenv('DB_HOST', '127.0.0.1'),
-        'user': os.getenv('DB_USER', 'root'),
-        'password': os.getenv('DB_PASS', ''),
-        'db': os.getenv('DB_NAME', 'bot_db'),
-        'charset': 'utf8mb4',
-        'autocommit': True
-    }
 
 app = Quart(__name__, static_folder='static', static_url_path='/static')
 app = cors(app, allow_origin="*")
 app.secret_key = Config.SECRET_KEY
+# 回答の書き込み方式: direct（即時 INSERT）/ queue（ジャーナル＋まとめ書き）
+app.config['SURVEY_INGEST_MODE'] = os.getenv('SURVEY_INGEST_MODE', 'direct')
+# 未ログインの送信者をIPで識別するときに見るヘッダー（Cloudflare Tunnel 経由では接続元が常に cloudflared になるため）
+# 空にすると接続元アドレスをそのまま使う
+app.config['CLIENT_IP_HEADER'] = os.getenv('CLIENT_IP_HEADER', 'CF-Connecting-IP')
 
 # アプリ全体で使えるようにDB設定を保存（survey.pyで使うため）
 app.aiomysql = aiomysql 
 app.db_pool = None
+app.log_sink = None
+app.ingestor = None
+# パース済みアンケート定義のキャッシュ（フォーム表示などでDBを引かないように）
+app.survey_cache = survey_cache.SurveyCache(
+    parse_questions,
+    maxsize=int(os.getenv('SURVEY_CACHE_SIZE', '1024')),
+    ttl=float(os.getenv('SURVEY_CACHE_TTL', '300')),
+)
+# 結果ページのライブ更新（/results/<id>/stream）の配信ハブ
+app.results_hub = pubsub.ResultsHub(
+    max_subscribers=int(os.getenv('SSE_MAX_STREAMS', '1000')),
+    heartbeat=float(os.getenv('SSE_HEARTBEAT', '15')),
+)
+# 公開フォームの描画済みHTML（キーは (survey_id, version) なので古い版は自然に追い出される）
+app.form_page_cache = LRUCache(maxsize=int(os.getenv('FORM_PAGE_CACHE_SIZE', '256')))
+# 回答送信のレート制限（ログインユーザー / 送信元IPごとのトークンバケット。DBを使う前に判定する）
+app.submit_limiter = TokenBucketLimiter(
+    rate=float(os.getenv('SUBMIT_RATE_PER_MIN', '6')) / 60,
+    burst=int(os.getenv('SUBMIT_BURST', '3')),
+)
+# 受付済みの idempotency_key（ダブルクリック・再送を DB に届く前に弾く）
+app.submitted_keys = TTLCache(maxsize=100_000, ttl=3600)
+# 1人1回答のアンケートで受付済みの (survey_id, user_id)。確定は DB の一意制約で行う
+app.answered_users = TTLCache(maxsize=100_000, ttl=86400)
+app.discord = DiscordOAuthClient(timeout_seconds=float(os.getenv('DISCORD_HTTP_TIMEOUT', '10')))
 
 # ★Blueprint（アンケート機能）を登録
 app.register_blueprint(survey_bp)
@@ -40,28 +69,104 @@ app.register_blueprint(survey_bp)
 # --- ライフサイクル ---
 @app.before_serving
 async def startup():
+    await app.discord.start()
+    app.results_hub.start()
     try:
-        # app.db_pool に接続プールを格納
-        app.db_pool = await aiomysql.create_pool(**Config.DB_CONFIG)
+        # app.db_pool に接続プールを格納（Botと共通の database.Database）
+        db = Database()
+        await db.connect()
+        app.db_pool = db
         app.logger.info("✅ Database connection pool created.")
+        # 未適用のスキーマ変更を反映（Botと同時に起動しても migrations 側で排他される）
+        await migrations.migrate(app.db_pool)
+
+        # 前回の未反映分（ジャーナル）があればここで書き戻す
+        app.ingestor = ingest.ResponseIngestor(
+            app.db_pool,
+            max_pending=int(os.getenv('INGEST_MAX_PENDING', '5000')),
+            journal_slots=int(os.getenv('WEB_WORKERS', '1')),  # serve.py で複数ワーカー起動した場合
+            on_written=app.results_hub.publish_records,
+        )
+        await app.ingestor.start()
     except Exception as e:
         app.logger.critical(f"❌ Failed to connect to database: {e}")
 
+    # 操作ログはバックグラウンドでまとめて書き込む（DB未接続の間はファイルに退避）
+    app.log_sink = OperationLogSink(app.db_pool)
+    app.log_sink.start()
+
 @app.after_serving
 async def shutdown():
+    await app.discord.close()
+    await app.results_hub.stop()
+    if app.ingestor:
+        await app.ingestor.stop()
+    if app.log_sink:
+        await app.log_sink.stop()
     if app.db_pool:
-        app.db_pool.close()
-        await app.db_pool.wait_closed()
+        await app.db_pool.close()
+
+# --- 管理コマンド ---
+@app.cli.command('rebuild-stats')
+@click.argument('survey_id', type=int, required=False)
+@click.option('--reencode', is_flag=True, help='正規化テーブル（survey_answers）も回答の JSON から作り直す')
+def rebuild_stats_command(survey_id, reencode):
+    """集計ストアを survey_answers から作り直す（ID省略時は全アンケート）"""
+    asyncio.run(_rebuild_stats(survey_id, reencode))
+
+async def _rebuild_stats(survey_id, reencode=False):
+    pool = Database(minsize=1, maxsize=2)
+    await pool.connect()
+    try:
+        await migrations.migrate(pool)
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                if survey_id is None:
+                    await cur.execute("SELECT id, questions FROM surveys")
+                else:
+                    await cur.execute("SELECT id, questions FROM surveys WHERE id=%s", (survey_id,))
+                surveys = await cur.fetchall()
+
+        for s in surveys:
+            questions = parse_questions(s['questions'])
+            if reencode:
+                await answer_store.reencode(pool, s['id'], questions)
+            total = await survey_stats.rebuild(pool, s['id'], questions)
+            click.echo(f"ID:{s['id']} -> {total} responses")
+    finally:
+        await pool.close()
 
 # --- コンテキストプロセッサ ---
+def static_url(filename):
+    """内容ハッシュ付きの静的ファイルURL（内容が変わればURLも変わる）"""
+    version = assets.file_hash(os.path.join(app.static_folder, filename))
+    return f"{url_for('static', filename=filename)}?v={version}"
+
 @app.context_processor
-def inject_css_version():
-    try:
-        css_path = os.path.join(app.static_folder, 'style.css')
-        version = int(os.path.getmtime(css_path))
-    except:
-        version = 1
-    return dict(css_ver=version)
+def inject_static_url():
+    return dict(static_url=static_url)
+
+@app.after_request
+async def set_static_cache_headers(response):
+    # ハッシュ付きURLで配信した静的ファイルは長期キャッシュさせる
+    if request.path.startswith(app.static_url_path + '/') and request.args.get('v') and response.status_code == 200:
+        response.headers['Cache-Control'] = assets.IMMUTABLE_CACHE_CONTROL
+    return response
+
+# --- ヘルスチェック ---
+@app.route('/healthz')
+async def healthz():
+    db_ok = bool(app.db_pool) and await app.db_pool.ping()
+    body = {
+        'status': 'ok' if db_ok else 'degraded',
+        'db': app.db_pool.stats() if app.db_pool else None,
+        'oplog': app.log_sink.stats() if app.log_sink else None,
+        'ingest': app.ingestor.stats() if app.ingestor else None,
+        'survey_cache': app.survey_cache.stats(),
+        'results_stream': app.results_hub.stats(),
+        'submit_limiter': app.submit_limiter.stats(),
+    }
+    return body, (200 if db_ok else 503)
 
 # --- 認証ルート (Auth) ---
 @app.route('/login')
@@ -78,32 +183,26 @@ async def callback():
     code = request.args.get('code')
     if not code: return "Error: No code provided.", 400
 
-    token_url = 'https://discord.com/api/oauth2/token'
-    payload = {
-        'client_id': Config.CLIENT_ID,
-        'client_secret': Config.CLIENT_SECRET,
-        'grant_type': 'authorization_code',
-        'code': code,
-        'redirect_uri': Config.REDIRECT_URI
-    }
-    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-
     try:
-        r = requests.post(token_url, data=payload, headers=headers)
-        if r.status_code != 200: return f"Auth Failed: {r.text}", 400
-        
-        token_data = r.json()
-        auth_header = {'Authorization': f'Bearer {token_data.get("access_token")}'}
+        status, token_data = await app.discord.exchange_code(code, Config.CLIENT_ID, Config.CLIENT_SECRET, Config.REDIRECT_URI)
+        if status != 200: return f"Auth Failed: {token_data}", 400
 
+        access_token = token_data.get("access_token")
+
+        # ギルド確認とユーザー取得は独立しているので並行で投げる
         if Config.TARGET_GUILD_ID:
-            r_guilds = requests.get('https://discord.com/api/users/@me/guilds', headers=auth_header)
-            if r_guilds.status_code == 200:
-                guild_ids = [g['id'] for g in r_guilds.json()]
+            (guild_status, guilds), (user_status, user_data) = await asyncio.gather(
+                app.discord.get_guilds(access_token),
+                app.discord.get_user(access_token),
+            )
+            if guild_status == 200:
+                guild_ids = [g['id'] for g in guilds]
                 if str(Config.TARGET_GUILD_ID) not in guild_ids:
                     return await render_template('access_denied.html'), 403
+        else:
+            user_status, user_data = await app.discord.get_user(access_token)
 
-        r_user = requests.get('https://discord.com/api/users/@me', headers=auth_header)
-        user_data = r_user.json()
+        if user_status != 200: return f"Auth Failed: {user_data}", 400
 
         session['discord_user'] = {
             'id': user_data['id'],
@@ -126,14 +225,41 @@ async def index():
     user = session.get('discord_user')
     if not user: return redirect(url_for('login'))
     
+    # 一覧は先頭ページだけ描画し、続きは下の JSON エンドポイントから読み込む
+    async with app.db_pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            surveys, next_survey_cursor = await dashboard.fetch_surveys(cur, str(user['id']))
+            logs, next_log_cursor = await dashboard.fetch_logs(cur, str(user['id']))
+
+    return await render_template(
+        'dashboard.html', user=user,
+        surveys=surveys, next_survey_cursor=next_survey_cursor,
+        logs=logs, next_log_cursor=next_log_cursor,
+    )
+
+@app.route('/dashboard/surveys')
+async def dashboard_surveys():
+    """アンケート一覧の続き（描画済みの行HTMLと次のカーソル）"""
+    user = session.get('discord_user')
+    if not user: return {"error": "login required"}, 401
+
+    async with app.db_pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            surveys, next_cursor = await dashboard.fetch_surveys(cur, str(user['id']), request.args.get('cursor'))
+
+    return {"html": await render_template('_survey_rows.html', surveys=surveys), "next_cursor": next_cursor}
+
+@app.route('/dashboard/logs')
+async def dashboard_logs():
+    """自分の操作ログの続き（描画済みの行HTMLと次のカーソル）"""
+    user = session.get('discord_user')
+    if not user: return {"error": "login required"}, 401
+
     async with app.db_pool.acquire() as conn:
         async with conn.cursor(aiomysql.DictCursor) as cur:
-            await cur.execute("SELECT * FROM surveys WHERE owner_id = %s ORDER BY created_at DESC", (user['id'],))
-            surveys = await cur.fetchall()
-            await cur.execute("SELECT * FROM operation_logs ORDER BY created_at DESC LIMIT 30")
-            logs = await cur.fetchall()
+            logs, next_cursor = await dashboard.fetch_logs(cur, str(user['id']), request.args.get('cursor'))
 
-    return await render_template('dashboard.html', user=user, surveys=surveys, logs=logs)
+    return {"html": await render_template('_log_rows.html', logs=logs), "next_cursor": next_cursor}
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)